@@ -0,0 +1,4 @@
+"""Synthetic networks and a timing harness for the simulation engine.
+
+Run ``python -m Services.bench --help`` from the repository root.
+"""
@@ -0,0 +1,289 @@
+"""Deterministic synthetic networks in the config import schema.
+
+Every generator takes the number of devices, flows and firewall rules and a
+seed, and returns a config dict like the YAML/JSON files in ``Tests/``. The
+same arguments always give the same config.
+"""
+
+import math
+import random
+from types import SimpleNamespace
+
+
+PROTOCOLS = ("tcp", "udp")
+PORTS = (22, 53, 80, 443, 445, 3306, 8080)
+
+
+def _device(asset_id, kind, online=True, rate=None, ports=None):
+    device = {"id": asset_id, "name": asset_id, "type": kind, "online": online}
+    if rate is not None:
+        device["attributes"] = {"TrafficRateMbps": rate}
+    if ports:
+        device["ports"] = ports
+    return device
+
+
+def _link(src, dst, bandwidth, latency, **extra):
+    return {"from": src, "to": dst, "bandwidth_mbps": bandwidth, "latency_ms": latency, **extra}
+
+
+def _flows(rnd, sources, destinations, n_flows, vlans=None):
+    profiles = {}
+    for _ in range(n_flows):
+        src = rnd.choice(sources)
+        dst = rnd.choice(destinations)
+        while dst == src and len(destinations) > 1:
+            dst = rnd.choice(destinations)
+        flow = {
+            "to": dst,
+            "protocol": rnd.choice(PROTOCOLS),
+            "dst_port": rnd.choice(PORTS),
+            "rate_mbps": rnd.choice((1, 5, 10, 50, 100)),
+        }
+        if vlans:
+            flow["vlan"] = vlans[src]
+        profiles.setdefault(src, []).append(flow)
+    return [{"device": src, "name": f"{src}-traffic", "flows": flows} for src, flows in profiles.items()]
+
+
+def _rules(rnd, devices, hosts, n_rules):
+    rules = []
+    for _ in range(n_rules):
+        rules.append(
+            {
+                "device": rnd.choice(devices),
+                "action": rnd.choice(("deny", "deny", "allow")),
+                "protocol": rnd.choice((None, "tcp", "udp")),
+                "dst_port": rnd.choice((None,) + PORTS),
+                "src": rnd.choice((None, None, rnd.choice(hosts))),
+                "dst": rnd.choice((None, None, rnd.choice(hosts))),
+            }
+        )
+    return rules
+
+
+def _config(name, devices, links, profiles, rules):
+    return {
+        "system": {"name": name, "version": 1},
+        "devices": devices,
+        "links": links,
+        "traffic_profiles": profiles,
+        "firewall_rules": rules,
+    }
+
+
+def fat_tree(n_devices, n_flows, n_rules, seed=0):
+    """k-ary fat tree with the smallest even k whose switches and hosts reach
+    ``n_devices``; hosts are trimmed to fit."""
+    rnd = random.Random(seed)
+    k = 2
+    while (k // 2) ** 2 + k * k + k ** 3 // 4 < n_devices:
+        k += 2
+    half = k // 2
+    cores = [f"core-{idx}" for idx in range(half * half)]
+    devices = [_device(name, "switch") for name in cores]
+    links = []
+    edges = []
+    for pod in range(k):
+        aggs = [f"agg-{pod}-{idx}" for idx in range(half)]
+        pod_edges = [f"edge-{pod}-{idx}" for idx in range(half)]
+        devices.extend(_device(name, "switch") for name in aggs + pod_edges)
+        for pos, agg in enumerate(aggs):
+            for core in cores[pos * half:(pos + 1) * half]:
+                links.append(_link(core, agg, 40000, 0.1))
+            for edge in pod_edges:
+                links.append(_link(agg, edge, 10000, 0.1))
+        edges.extend(pod_edges)
+    hosts = []
+    for idx in range(max(n_devices - len(devices), 0)):
+        edge = edges[idx % len(edges)]
+        host = f"host-{idx}"
+        hosts.append(host)
+        devices.append(_device(host, "host"))
+        links.append(_link(edge, host, 1000, 0.05))
+    hosts = hosts or edges
+    profiles = _flows(rnd, hosts, hosts, n_flows)
+    rules = _rules(rnd, edges, hosts, n_rules)
+    return _config(f"fat-tree-{k}", devices, links, profiles, rules)
+
+
+def campus(n_devices, n_flows, n_rules, seed=0):
+    """Two cores, distribution pairs, access switches with VLAN access ports,
+    and a firewalled server block."""
+    rnd = random.Random(seed)
+    vlans_per_block = (10, 20, 30)
+    devices = [_device("core-1", "switch"), _device("core-2", "switch"), _device("dc-fw", "firewall")]
+    links = [
+        _link("core-1", "core-2", 40000, 0.2, trunk=True),
+        _link("core-1", "dc-fw", 10000, 0.5, trunk=True),
+        _link("core-2", "dc-fw", 10000, 0.5, trunk=True),
+    ]
+    n_servers = max(2, n_devices // 50)
+    servers = [f"srv-{idx}" for idx in range(n_servers)]
+    for server in servers:
+        devices.append(_device(server, "host"))
+        links.append(_link("dc-fw", server, 10000, 0.1))
+
+    remaining = max(n_devices - len(devices), 0)
+    # One block is 2 distribution switches, 8 access switches and their hosts.
+    n_blocks = max(1, math.ceil(remaining / 250))
+    hosts = []
+    vlans = {}
+    for block in range(n_blocks):
+        dists = [f"dist-{block}-a", f"dist-{block}-b"]
+        block_vlans = [vlan + 100 * block for vlan in vlans_per_block]
+        for dist in dists:
+            devices.append(_device(dist, "switch"))
+            for core in ("core-1", "core-2"):
+                links.append(_link(core, dist, 10000, 0.5, trunk=True))
+        for access_idx in range(8):
+            access = f"acc-{block}-{access_idx}"
+            devices.append(
+                _device(
+                    access,
+                    "switch",
+                    ports=[
+                        {"name": f"gi{idx}", "access_vlan": vlan}
+                        for idx, vlan in enumerate(block_vlans)
+                    ],
+                )
+            )
+            for dist in dists:
+                links.append(_link(dist, access, 10000, 0.5, trunk=True, allowed_vlans=block_vlans))
+    access_switches = [device["id"] for device in devices if device["id"].startswith("acc-")]
+    for idx in range(max(n_devices - len(devices), 0)):
+        access = access_switches[idx % len(access_switches)]
+        host = f"pc-{idx}"
+        hosts.append(host)
+        devices.append(_device(host, "host", online=rnd.random() > 0.02))
+        links.append(_link(access, host, 1000, 0.2))
+        block = int(access.split("-")[1])
+        vlans[host] = rnd.choice(vlans_per_block) + 100 * block
+    hosts = hosts or servers
+    for server in servers:
+        vlans[server] = None
+    # About two thirds of the flows go to the server block.
+    profiles = _flows(rnd, hosts, servers * max(1, 2 * len(hosts) // len(servers)) + hosts, n_flows, vlans=vlans)
+    rules = _rules(rnd, ["dc-fw"] + [device["id"] for device in devices if device["id"].startswith("dist-")], hosts, n_rules)
+    return _config("campus", devices, links, profiles, rules)
+
+
+def star(n_devices, n_flows, n_rules, seed=0):
+    """One hub switch with every other device attached to it."""
+    rnd = random.Random(seed)
+    devices = [_device("hub", "switch")]
+    links = []
+    hosts = [f"host-{idx}" for idx in range(max(n_devices - 1, 1))]
+    for host in hosts:
+        devices.append(_device(host, "host"))
+        links.append(_link("hub", host, 1000, 0.1))
+    profiles = _flows(rnd, hosts, hosts, n_flows)
+    rules = _rules(rnd, ["hub"], hosts, n_rules)
+    return _config("star", devices, links, profiles, rules)
+
+
+def random_mesh(n_devices, n_flows, n_rules, seed=0):
+    """Random spanning tree plus half as many extra links, with a few
+    offline devices."""
+    rnd = random.Random(seed)
+    names = [f"n{idx}" for idx in range(max(n_devices, 2))]
+    devices = [
+        _device(name, "host" if idx % 3 == 0 else "switch", online=rnd.random() > 0.03, rate=rnd.choice((5, 10, 50)))
+        for idx, name in enumerate(names)
+    ]
+    links = []
+    for idx in range(1, len(names)):
+        links.append(
+            _link(names[rnd.randrange(idx)], names[idx], rnd.choice((100, 1000, 10000)), rnd.choice((0.5, 1, 2)))
+        )
+    for _ in range(len(names) // 2):
+        src, dst = rnd.sample(names, 2)
+        links.append(_link(src, dst, rnd.choice((100, 1000, 10000)), rnd.choice((0.5, 1, 2))))
+    hosts = names[::3]
+    profiles = _flows(rnd, hosts, names, n_flows)
+    rules = _rules(rnd, names, hosts, n_rules)
+    return _config("random", devices, links, profiles, rules)
+
+
+GENERATORS = {
+    "fat_tree": fat_tree,
+    "campus": campus,
+    "star": star,
+    "random": random_mesh,
+}
+
+
+class _Ports(list):
+    def all(self):
+        return self
+
+
+def records(config):
+    """Model-like records of a config, numbered as ``ConfigImportView`` stores them.
+
+    Returns ``(devices, connections, profiles, rules)`` usable wherever the
+    simulator takes querysets.
+    """
+    devices = []
+    by_label = {}
+    for device_id, data in enumerate(config.get("devices", []), 1):
+        device = SimpleNamespace(
+            id=device_id,
+            AssetId=data.get("id") or data.get("name"),
+            AssetName=data.get("name"),
+            DeviceType=data.get("type", "generic"),
+            IsOnline=data.get("online", True),
+            AdditionalAsJson=data.get("attributes") or {},
+            ports=_Ports(
+                SimpleNamespace(
+                    IsTrunk=port.get("trunk", False),
+                    AllowedVlans=port.get("allowed_vlans"),
+                    AccessVlan=port.get("access_vlan"),
+                )
+                for port in data.get("ports", [])
+            ),
+        )
+        devices.append(device)
+        by_label[device.AssetId] = device
+
+    connections = []
+    for link in config.get("links", []):
+        src = by_label.get(link.get("from"))
+        dst = by_label.get(link.get("to"))
+        if not src or not dst:
+            continue
+        connections.append(
+            SimpleNamespace(
+                id=len(connections) + 1,
+                Source_id=src.id,
+                Target_id=dst.id,
+                ConnectionType=link.get("type", "ethernet"),
+                ConnectionDetails=link.get("details"),
+                BandwidthMbps=link.get("bandwidth_mbps"),
+                LatencyMs=link.get("latency_ms"),
+                IsTrunk=link.get("trunk", False),
+                AllowedVlans=link.get("allowed_vlans"),
+                ErrorRate=link.get("error_rate"),
+            )
+        )
+
+    profiles = [
+        SimpleNamespace(Device_id=by_label[profile["device"]].id, Profile=profile)
+        for profile in config.get("traffic_profiles", [])
+        if profile.get("device") in by_label
+    ]
+    rules = [
+        SimpleNamespace(
+            Device_id=by_label[rule["device"]].id,
+            Action=rule.get("action", "allow"),
+            Protocol=rule.get("protocol"),
+            Src=rule.get("src"),
+            Dst=rule.get("dst"),
+            SrcPort=rule.get("src_port"),
+            DstPort=rule.get("dst_port"),
+            Vlan=rule.get("vlan"),
+        )
+        for rule in config.get("firewall_rules", [])
+        if rule.get("device") in by_label
+    ]
+    return devices, connections, profiles, rules
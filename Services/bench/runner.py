@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from ..rest.sim.allocation import allocate
+from ..rest.sim.compiled import compile_system
+from ..rest.sim.engine import assemble_result, carried_rows
+from ..rest.sim.firewall import evaluate_firewall
+from ..rest.sim.flows import ROUTABLE
+from ..rest.sim.routing import build_graph, find_path, route_flows
+from ..rest.simulation import compute_simulation
+from .generators import GENERATORS, records
+
+
+# Legacy BFS lookups per case, on the endpoints of sampled routable flows.
+FIND_PATH_PAIRS = 1000
+
+
+def _measure(phases, fn, name, repeat, memory):
+    """Run ``fn`` ``repeat`` times, then once more under tracemalloc."""
+    seconds = []
+    value = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        seconds.append(time.perf_counter() - started)
+    phase = {"seconds": round(min(seconds), 6), "median_s": round(statistics.median(seconds), 6)}
+    if memory:
+        tracemalloc.start()
+        fn()
+        phase["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+        tracemalloc.stop()
+    phases[name] = phase
+    return value
+
+
+def _engine_phases(phases, inputs, repeat, memory, metric, allocation):
+    system = _measure(phases, lambda: compile_system(*inputs), "compile", repeat, memory)
+    topology, firewall = system.topology, system.firewall
+
+    def route():
+        flows = system.flows.copy()
+        return flows, route_flows(topology, flows, metric=metric)
+
+    flows, routes = _measure(phases, route, "route", repeat, memory)
+    row_blocked = _measure(
+        phases, lambda: evaluate_firewall(topology, flows, routes, firewall), "firewall", repeat, memory
+    )
+    row_rate = flows.rate[routes.flow] * routes.share
+    carried = carried_rows(flows, routes, row_blocked)
+    row_achieved = _measure(
+        phases,
+        lambda: allocate(routes.incidence, row_rate, topology.capacity, carried, allocation),
+        "allocate",
+        repeat,
+        memory,
+    )
+    result = _measure(
+        phases,
+        lambda: assemble_result(topology, flows, routes, row_blocked, row_achieved),
+        "assemble",
+        repeat,
+        memory,
+    )
+    _measure(phases, lambda: json.dumps(result.as_dict()), "render", repeat, memory)
+    _measure(
+        phases,
+        lambda: compute_simulation(*inputs, metric=metric, allocation=allocation),
+        "simulate",
+        repeat,
+        memory,
+    )
+    return system
+
+
+def _find_path_pairs(system, seed):
+    """Device id pairs of up to ``FIND_PATH_PAIRS`` sampled flows.
+
+    Only flows the engine routes are sampled; the others may have no
+    destination (index -1).
+    """
+    flows = system.flows
+    routable = np.flatnonzero(flows.reason == ROUTABLE).tolist()
+    picks = random.Random(seed).sample(routable, min(FIND_PATH_PAIRS, len(routable)))
+    devices = system.topology.devices
+    return [(devices[flows.src[idx]].id, devices[flows.dst[idx]].id) for idx in picks]
+
+
+def _find_path_phase(phases, system, connections, repeat, memory, seed):
+    pairs = _find_path_pairs(system, seed)
+
+    def lookups():
+        graph = build_graph(connections)
+        return [find_path(graph, src, dst) for src, dst in pairs]
+
+    _measure(phases, lookups, "find_path", repeat, memory)
+
+
+def _import_phases(phases, config, repeat, memory):
+    """Time the config import and a database load, rolled back afterwards."""
+    import django
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Services.server.settings")
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from ..rest.models import System
+    from ..rest.config_import import parse_config_text
+    from ..rest.views import ConfigImportView, _simulation_inputs
+
+    raw_text = json.dumps(config)
+    _measure(phases, lambda: parse_config_text("json", raw_text), "parse", repeat, memory)
+    view = ConfigImportView.as_view()
+    factory = APIRequestFactory()
+    with transaction.atomic():
+        user = User.objects.create(username=f"bench-{time.time_ns()}")
+
+        def upload():
+            request = factory.post("/", {"config": raw_text, "format": "json"}, format="json")
+            force_authenticate(request, user=user)
+            response = view(request)
+            if response.status_code >= 400:
+                raise RuntimeError(f"Import failed: {response.data}")
+            return response
+
+        _measure(phases, upload, "import", repeat, memory)
+        system = System.objects.filter(User=user).order_by("-id").first()
+        _measure(
+            phases,
+            lambda: compile_system(*_simulation_inputs(system, system.Version)),
+            "load",
+            repeat,
+            memory,
+        )
+        transaction.set_rollback(True)
+
+
+def run_case(topology, n_devices, n_flows, n_rules, seed, repeat=3, memory=True, db_import=False,
+             metric="hops", allocation="max_min"):
+    config = GENERATORS[topology](n_devices, n_flows, n_rules, seed)
+    phases = {}
+    started = time.perf_counter()
+    _measure(phases, lambda: GENERATORS[topology](n_devices, n_flows, n_rules, seed), "generate", 1, False)
+    inputs = records(config)
+    system = _engine_phases(phases, inputs, repeat, memory, metric, allocation)
+    _find_path_phase(phases, system, inputs[1], repeat, memory, seed)
+    if db_import:
+        _import_phases(phases, config, repeat, memory)
+    return {
+        "topology": topology,
+        "name": config["system"]["name"],
+        "devices": system.topology.n_devices,
+        "links": system.topology.n_links,
+        "flows": len(system.flows),
+        "rules": len(inputs[3]),
+        "seed": seed,
+        "repeat": repeat,
+        "wall_s": round(time.perf_counter() - started, 3),
+        "phases": phases,
+    }
+
+
+def _commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _meta():
+    return {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def compare(report, baseline, threshold):
+    """Phases of ``report`` slower than in ``baseline`` by more than ``threshold``x."""
+    previous = {
+        (case["topology"], case["devices"], case["flows"], case["rules"], case["seed"]): case
+        for case in baseline.get("cases", [])
+    }
+    regressions = []
+    for case in report["cases"]:
+        old = previous.get((case["topology"], case["devices"], case["flows"], case["rules"], case["seed"]))
+        if old is None:
+            continue
+        for name, phase in case["phases"].items():
+            before = old["phases"].get(name, {}).get("seconds")
+            if not before or name == "generate":
+                continue
+            ratio = phase["seconds"] / before
+            if ratio > threshold:
+                regressions.append(
+                    {"topology": case["topology"], "phase": name, "before_s": before, "after_s": phase["seconds"],
+                     "ratio": round(ratio, 2)}
+                )
+    return regressions
+
+
+def _print_case(case):
+    print(
+        f"{case['topology']}: {case['devices']} devices, {case['links']} links, "
+        f"{case['flows']} flows, {case['rules']} rules"
+    )
+    for name, phase in case["phases"].items():
+        peak = f"  {phase['peak_mb']:9.1f} MB" if "peak_mb" in phase else ""
+        print(f"  {name:<10} {phase['seconds'] * 1000:10.1f} ms{peak}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m Services.bench",
+        description="Time the simulation phases on synthetic networks.",
+    )
+    parser.add_argument("--topology", action="append", choices=sorted(GENERATORS),
+                        help="generator to run; repeat for several (default: all)")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--flows", type=int, default=10000)
+    parser.add_argument("--rules", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per phase; the fastest is reported")
+    parser.add_argument("--metric", default="hops")
+    parser.add_argument("--allocation", default="max_min")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--import", dest="db_import", action="store_true",
+                        help="also time ConfigImportView and a database load, rolled back afterwards")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown factor reported as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    report = {"meta": _meta(), "cases": []}
+    for topology in args.topology or list(GENERATORS):
+        case = run_case(
+            topology,
+            args.devices,
+            args.flows,
+            args.rules,
+            args.seed,
+            repeat=max(args.repeat, 1),
+            memory=not args.no_memory,
+            db_import=args.db_import,
+            metric=args.metric,
+            allocation=args.allocation,
+        )
+        _print_case(case)
+        report["cases"].append(case)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            report["regressions"] = compare(report, json.load(handle), args.threshold)
+        for item in report["regressions"]:
+            print(
+                f"REGRESSION {item['topology']}/{item['phase']}: "
+                f"{item['before_s'] * 1000:.1f} ms -> {item['after_s'] * 1000:.1f} ms ({item['ratio']}x)"
+            )
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    return 1 if report.get("regressions") else 0
@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase
+
+from ..rest.sim.compiled import compile_system
+from ..rest.sim.flows import ROUTABLE
+from .generators import GENERATORS, records
+from .runner import _find_path_pairs
+
+
+class FindPathPairsTests(SimpleTestCase):
+    def test_only_routable_flows_are_sampled(self):
+        system = compile_system(*records(GENERATORS["random"](200, 2000, 20, 1)))
+        flows = system.flows
+        self.assertTrue((flows.dst < 0).any())
+
+        routable = {
+            (system.topology.devices[src].id, system.topology.devices[dst].id)
+            for src, dst, reason in zip(flows.src, flows.dst, flows.reason)
+            if reason == ROUTABLE
+        }
+        pairs = _find_path_pairs(system, seed=1)
+        self.assertEqual(len(pairs), 1000)
+        self.assertTrue(set(pairs) <= routable)
+        self.assertEqual(pairs, _find_path_pairs(system, seed=1))
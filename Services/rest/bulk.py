@@ -0,0 +1,29 @@
+# Rows per INSERT statement.
+BATCH_SIZE = 1000
+
+
+class RowCounter:
+    """Counts inserted rows out of ``total`` and reports the fraction done.
+
+    ``progress(fraction)`` is called after every batch; without one the
+    counter only counts.
+    """
+
+    def __init__(self, total, progress=None):
+        self.total = total
+        self.done = 0
+        self.progress = progress
+
+    def add(self, rows):
+        self.done += rows
+        if self.progress is not None and self.total:
+            self.progress(min(self.done / self.total, 1.0))
+
+
+def bulk_insert(model, rows, counter=None):
+    """``bulk_create`` ``rows`` ``BATCH_SIZE`` at a time, counting each batch."""
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        model.objects.bulk_create(batch)
+        if counter is not None:
+            counter.add(len(batch))
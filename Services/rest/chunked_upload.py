@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+# Chunks of unfinished uploads live in one directory per upload here.
+CHUNK_DIR = "uploads/chunks"
+# Bytes copied from a request (or a chunk file) per read.
+COPY_SIZE = 64 * 1024
+# Marker file held while an upload is assembled; its mtime is refreshed per
+# chunk copied, and one untouched for ASSEMBLY_LEASE_S was left by a process
+# that died.
+ASSEMBLING = "assembling"
+ASSEMBLY_LEASE_S = 60
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+_CHUNK_NAME = re.compile(r"\d+")
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadBusy(UploadError):
+    """The upload is being assembled by another job."""
+
+
+def _root():
+    return default_storage.path(CHUNK_DIR)
+
+
+def _directory(upload_id):
+    return os.path.join(_root(), upload_id)
+
+
+def _write_json(path, data):
+    temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(data, handle)
+    os.replace(temporary, path)
+
+
+def create_upload(owner, file_name, size, chunk_size=None):
+    """Start a chunked upload of ``size`` bytes; returns the upload.
+
+    The file arrives as ``ceil(size / chunk_size)`` numbered chunks, in any
+    order and any number of times, and is assembled once all are present.
+    """
+    file_name = os.path.basename(str(file_name or ""))
+    if not file_name:
+        raise UploadError("file_name is required")
+    try:
+        size = int(size)
+        chunk_size = int(chunk_size or settings.UPLOAD_CHUNK_BYTES)
+    except (TypeError, ValueError):
+        raise UploadError("size and chunk_size must be integers")
+    if not 0 < size <= settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f"size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes")
+    if not 0 < chunk_size <= settings.UPLOAD_CHUNK_BYTES:
+        raise UploadError(f"chunk_size must be between 1 and {settings.UPLOAD_CHUNK_BYTES} bytes")
+
+    upload = {
+        "upload_id": uuid.uuid4().hex,
+        "owner": owner,
+        "file_name": file_name,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunks": -(-size // chunk_size),
+        "created_at": time.time(),
+    }
+    directory = _directory(upload["upload_id"])
+    os.makedirs(directory)
+    _write_json(os.path.join(directory, "upload.json"), upload)
+    return upload
+
+
+def _read(upload_id):
+    try:
+        with open(os.path.join(_directory(upload_id), "upload.json")) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def get_upload(upload_id, owner):
+    """The upload ``upload_id`` of ``owner``, or None."""
+    if not _UPLOAD_ID.fullmatch(upload_id or ""):
+        return None
+    upload = _read(upload_id)
+    return upload if upload is not None and upload["owner"] == owner else None
+
+
+def touch_upload(upload):
+    """Restart the idle time after which ``purge_uploads`` drops the upload."""
+    try:
+        os.utime(_directory(upload["upload_id"]))
+    except FileNotFoundError:
+        pass
+
+
+def received_chunks(upload):
+    try:
+        names = os.listdir(_directory(upload["upload_id"]))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if _CHUNK_NAME.fullmatch(name))
+
+
+def upload_record(upload):
+    """Public form of an upload, with the chunks still to send."""
+    record = {key: value for key, value in upload.items() if key != "owner"}
+    record["assembling"] = os.path.exists(os.path.join(_directory(upload["upload_id"]), ASSEMBLING))
+    if "path" in upload:
+        record.update(received=list(range(upload["chunks"])), missing=[], complete=True)
+        return record
+    received = received_chunks(upload)
+    have = set(received)
+    record["received"] = received
+    record["missing"] = [index for index in range(upload["chunks"]) if index not in have]
+    record["complete"] = len(received) == upload["chunks"]
+    return record
+
+
+def _chunk_length(upload, index):
+    return min(upload["chunk_size"], upload["size"] - index * upload["chunk_size"])
+
+
+def write_chunk(upload, index, stream, checksum=None):
+    """Store chunk ``index`` read from ``stream``.
+
+    The chunk must have its exact length and, when ``checksum`` (hex SHA-256)
+    is given, match it; otherwise nothing is kept and ``UploadError`` is
+    raised, so the client can send it again. Resending a stored chunk
+    replaces it.
+    """
+    if "path" in upload:
+        raise UploadError("upload is already assembled")
+    if not 0 <= index < upload["chunks"]:
+        raise UploadError(f"chunk index must be between 0 and {upload['chunks'] - 1}")
+    directory = _directory(upload["upload_id"])
+    if not os.path.isdir(directory):
+        raise UploadError("upload no longer exists")
+    expected = _chunk_length(upload, index)
+    digest = hashlib.sha256()
+    length = 0
+    temporary = os.path.join(directory, f"{index}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temporary, "wb") as handle:
+            # Read one byte past the chunk to catch an oversized body.
+            while length <= expected:
+                data = stream.read(min(COPY_SIZE, expected + 1 - length))
+                if not data:
+                    break
+                length += len(data)
+                digest.update(data)
+                handle.write(data)
+        if length != expected:
+            raise UploadError(f"chunk {index} must be {expected} bytes")
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise UploadError(f"chunk {index} does not match its checksum")
+        os.replace(temporary, os.path.join(directory, str(index)))
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return upload_record(upload)
+
+
+def _owner(marker):
+    """Token of the claimant holding ``marker``, or None if there is none."""
+    try:
+        with open(marker) as handle:
+            return handle.read()
+    except FileNotFoundError:
+        return None
+
+
+def _clear_stale(marker):
+    """Remove ``marker`` if its lease ran out; returns whether a claim may
+    be retried."""
+    owner = _owner(marker)
+    try:
+        stale = time.time() - os.path.getmtime(marker) > ASSEMBLY_LEASE_S
+    except FileNotFoundError:
+        return True
+    if owner is None or not stale:
+        return owner is None
+    moved = f"{marker}.{uuid.uuid4().hex}.stale"
+    try:
+        os.rename(marker, moved)
+    except FileNotFoundError:
+        return True
+    if _owner(moved) != owner:
+        # Another claimant replaced the stale marker first: give its fresh
+        # one back (unless a third claimant got in meanwhile).
+        try:
+            os.link(moved, marker)
+        except FileExistsError:
+            pass
+        os.remove(moved)
+        return False
+    os.remove(moved)
+    return True
+
+
+def _claim(directory):
+    """Create the assembly marker of an upload, holding a token unique to
+    this claim; raises ``UploadBusy`` if it is held.
+
+    A marker whose lease ran out is taken over. Takeovers check the token
+    they removed, so two claimants that both saw it stale cannot both win.
+    """
+    marker = os.path.join(directory, ASSEMBLING)
+    token = uuid.uuid4().hex
+    pending = f"{marker}.{token}"
+    with open(pending, "w") as handle:
+        handle.write(token)
+    try:
+        for _ in range(2):
+            try:
+                # Like O_EXCL, but the marker has its token from the start.
+                os.link(pending, marker)
+                return marker, token
+            except FileExistsError:
+                pass
+            if not _clear_stale(marker):
+                break
+        raise UploadBusy("upload is being assembled by another job")
+    finally:
+        os.remove(pending)
+
+
+def _renew(marker, token):
+    if _owner(marker) != token:
+        raise UploadBusy("upload assembly was taken over by another job")
+    os.utime(marker)
+
+
+def assemble(upload):
+    """Join a complete upload into ``uploads/`` of the default storage.
+
+    Returns the storage name of the file. The chunks are then removed and
+    the upload keeps the name as ``path``, so later calls return it again.
+    Only one caller assembles an upload at a time; the others get
+    ``UploadBusy``.
+    """
+    if "path" in upload:
+        return upload["path"]
+    directory = _directory(upload["upload_id"])
+    marker, token = _claim(directory)
+    try:
+        # Another job may have finished assembling it meanwhile.
+        current = _read(upload["upload_id"]) or upload
+        if "path" in current:
+            upload["path"] = current["path"]
+            return upload["path"]
+        received = received_chunks(upload)
+        if len(received) != upload["chunks"]:
+            raise UploadError(f"upload {upload['upload_id']} is missing {upload['chunks'] - len(received)} chunks")
+        while True:
+            name = default_storage.get_available_name(f"uploads/{upload['file_name']}")
+            try:
+                target = open(default_storage.path(name), "xb")
+                break
+            except FileExistsError:
+                continue
+        try:
+            with target:
+                for index in range(upload["chunks"]):
+                    with open(os.path.join(directory, str(index)), "rb") as chunk:
+                        shutil.copyfileobj(chunk, target, COPY_SIZE)
+                    _renew(marker, token)
+        except BaseException:
+            os.remove(default_storage.path(name))
+            raise
+        upload["path"] = name
+        _write_json(os.path.join(directory, "upload.json"), upload)
+        for index in range(upload["chunks"]):
+            os.remove(os.path.join(directory, str(index)))
+        return name
+    finally:
+        if _owner(marker) == token:
+            os.remove(marker)
+
+
+def delete_upload(upload):
+    shutil.rmtree(_directory(upload["upload_id"]), ignore_errors=True)
+
+
+def purge_uploads(keep=()):
+    """Drop uploads idle for ``UPLOAD_RETENTION_S``, except those in ``keep``.
+
+    ``keep`` holds the ids of uploads that import jobs still have to read.
+    The files of assembled uploads stay in ``uploads/``; only the record
+    goes.
+    """
+    root = _root()
+    if not os.path.isdir(root):
+        return
+    before = time.time() - settings.UPLOAD_RETENTION_S
+    for upload_id in os.listdir(root):
+        if upload_id in keep:
+            continue
+        directory = os.path.join(root, upload_id)
+        try:
+            if os.path.getmtime(directory) < before:
+                shutil.rmtree(directory, ignore_errors=True)
+        except OSError:
+            continue
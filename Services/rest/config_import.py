@@ -0,0 +1,182 @@
+import json
+
+import yaml
+from django.db import transaction
+
+from .bulk import RowCounter, bulk_insert
+from .models import ConfigFile, Connection, Device, FirewallRule, Port, System, TrafficProfile
+
+
+def parse_config_text(format_hint, raw_text):
+    if format_hint == "json":
+        return json.loads(raw_text)
+    return yaml.safe_load(raw_text)
+
+
+class StagedConfig:
+    """Unsaved rows of an Ethernet config, linked to each other by instance.
+
+    Foreign keys point at the staged ``System`` and ``Device`` objects, which
+    get their primary keys as ``write_config`` inserts them.
+    """
+
+    def __init__(self, system, devices, ports, connections, traffic_profiles, firewall_rules, config_file):
+        self.system = system
+        self.devices = devices
+        self.ports = ports
+        self.connections = connections
+        self.traffic_profiles = traffic_profiles
+        self.firewall_rules = firewall_rules
+        self.config_file = config_file
+
+
+def stage_config(config, user, name, version, format_hint, raw_text):
+    """Build the system and every row of a parsed config without writing any.
+
+    Links, traffic profiles and firewall rules naming an unknown device are
+    dropped. ``NodeCount`` and ``EdgeCount`` are set from the staged rows.
+    """
+    system = System(Name=name, User=user, Version=version)
+
+    devices = []
+    ports = []
+    device_map = {}
+    for device_data in config.get("devices", []):
+        asset_id = device_data.get("id") or device_data.get("name")
+        attributes = device_data.get("attributes") or {}
+        device = Device(
+            System=system,
+            SystemVersion=version,
+            AssetId=asset_id,
+            AssetName=device_data.get("name"),
+            Manufacturer=device_data.get("vendor"),
+            ModelNumber=device_data.get("model"),
+            DeviceType=device_data.get("type", "generic"),
+            IpAddress=device_data.get("ip") or attributes.get("ip"),
+            IsOnline=device_data.get("online", True),
+            AdditionalAsJson=attributes,
+        )
+        devices.append(device)
+        device_map[asset_id] = device
+        for idx, port in enumerate(device_data.get("ports", [])):
+            ports.append(
+                Port(
+                    System=system,
+                    SystemVersion=version,
+                    Device=device,
+                    Name=port.get("name", f"eth{idx}"),
+                    Index=port.get("index", idx),
+                    SpeedMbps=port.get("speed_mbps", 1000),
+                    Duplex=port.get("duplex", "full"),
+                    IsTrunk=port.get("trunk", False),
+                    AllowedVlans=port.get("allowed_vlans"),
+                    AccessVlan=port.get("access_vlan"),
+                    AdminUp=port.get("admin_up", True),
+                )
+            )
+
+    connections = []
+    for link_data in config.get("links", []):
+        src = device_map.get(link_data.get("from"))
+        dst = device_map.get(link_data.get("to"))
+        if not src or not dst:
+            continue
+        connections.append(
+            Connection(
+                System=system,
+                SystemVersion=version,
+                Source=src,
+                Target=dst,
+                ConnectionType=link_data.get("type", "ethernet"),
+                ConnectionDetails=link_data.get("details"),
+                BandwidthMbps=link_data.get("bandwidth_mbps"),
+                LatencyMs=link_data.get("latency_ms"),
+                IsTrunk=link_data.get("trunk", False),
+                AllowedVlans=link_data.get("allowed_vlans"),
+                ErrorRate=link_data.get("error_rate"),
+            )
+        )
+
+    traffic_profiles = []
+    for profile in config.get("traffic_profiles", []):
+        device = device_map.get(profile.get("device"))
+        if not device:
+            continue
+        traffic_profiles.append(
+            TrafficProfile(
+                System=system,
+                SystemVersion=version,
+                Device=device,
+                Name=profile.get("name", "default"),
+                Profile=profile,
+            )
+        )
+
+    firewall_rules = []
+    for rule in config.get("firewall_rules", []):
+        device = device_map.get(rule.get("device"))
+        if not device:
+            continue
+        firewall_rules.append(
+            FirewallRule(
+                System=system,
+                SystemVersion=version,
+                Device=device,
+                Action=rule.get("action", "allow"),
+                Protocol=rule.get("protocol"),
+                Src=rule.get("src"),
+                Dst=rule.get("dst"),
+                SrcPort=rule.get("src_port"),
+                DstPort=rule.get("dst_port"),
+                Vlan=rule.get("vlan"),
+            )
+        )
+
+    config_file = ConfigFile(
+        System=system,
+        Name=name,
+        Format=format_hint,
+        RawText=raw_text,
+        ParsedData=config,
+    )
+
+    system.NodeCount = len(devices)
+    system.EdgeCount = len(connections)
+    return StagedConfig(system, devices, ports, connections, traffic_profiles, firewall_rules, config_file)
+
+
+def write_config(staged, progress=None):
+    """Insert a ``StagedConfig`` in dependency order in one transaction.
+
+    Each table is written with batched ``bulk_create`` once the rows it
+    references have their keys; ``progress(fraction)`` follows the rows
+    written. Returns the new ``System``; on any failure nothing is left
+    behind.
+    """
+    tables = (
+        (Device, staged.devices),
+        (Port, staged.ports),
+        (Connection, staged.connections),
+        (TrafficProfile, staged.traffic_profiles),
+        (FirewallRule, staged.firewall_rules),
+    )
+    counter = RowCounter(sum(len(rows) for _, rows in tables), progress)
+    with transaction.atomic():
+        staged.system.save()
+        for model, rows in tables:
+            bulk_insert(model, rows, counter)
+        staged.config_file.save()
+    return staged.system
+
+
+def import_config(raw_text, format_hint, user, name=None, version=None, progress=None):
+    """Parse a YAML/JSON config and write it as a new system; returns the system.
+
+    The config's own system name and version win over ``name`` and
+    ``version``.
+    """
+    config = parse_config_text(format_hint, raw_text)
+    system_name = config.get("system", {}).get("name") or name or "Ethernet System"
+    version = config.get("system", {}).get("version") or int(version or 1)
+    staged = stage_config(config, user, system_name, version, format_hint, raw_text)
+    return write_config(staged, progress)
@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .chunked_upload import assemble, get_upload
+from .config_import import import_config
+from .models import System
+from .serializers import SystemSerializer
+from .upload_import import parse_uploads, write_uploads
+
+
+IMPORT_MODES = ("upload", "config")
+
+# Job progress is stored at most once per this fraction.
+PROGRESS_STEP = 0.01
+
+
+def _span(progress, start, end):
+    """``progress`` for a phase that covers ``start``..``end`` of the job."""
+    last = start
+
+    def report(fraction):
+        nonlocal last
+        value = start + (end - start) * fraction
+        if value - last >= PROGRESS_STEP or (fraction >= 1 and value > last):
+            last = value
+            progress(value)
+
+    return report
+
+
+def active_uploads(store):
+    """Ids of the uploads that queued or running import jobs still read."""
+    return {upload_id for job in store.active() for upload_id in (job["options"] or {}).get("uploads", ())}
+
+
+def _assemble(uploads, progress):
+    total = sum(upload["size"] for upload in uploads)
+    done = 0
+    stored = []
+    for upload in uploads:
+        stored.append((upload["file_name"], assemble(upload), upload["size"]))
+        done += upload["size"]
+        progress(done / total)
+    return stored
+
+
+def _import_upload(job, stored, progress, workers):
+    options = job["options"]
+    version = options.get("version")
+    parsed = parse_uploads(stored, workers, _span(progress, 0.1, 0.5))
+    with transaction.atomic():
+        system = System.objects.create(User_id=job["owner"], Name=options["name"], Version=version)
+        results, total_nodes, total_edges = write_uploads(parsed, system, version or 1, _span(progress, 0.5, 1.0))
+        if not any(result["status"] == "success" for result in results):
+            errors = "; ".join(f"{result['file_name']}: {result['error']}" for result in results)
+            raise ValueError(f"No files were processed successfully: {errors}")
+        system.NodeCount = total_nodes
+        system.EdgeCount = total_edges
+        system.save()
+    return system, {
+        "message": "Files processed",
+        "files": [
+            {"file_name": file_name, "file_size": size, "file_path": path}
+            for file_name, path, size in stored
+        ],
+        "processing_results": results,
+        "system": SystemSerializer(system).data,
+    }
+
+
+def _import_config(job, stored, progress):
+    options = job["options"]
+    file_name, path, _ = stored[0]
+    format_hint = options.get("format") or ("json" if file_name.endswith(".json") else "yaml")
+    with default_storage.open(path, "rb") as stream:
+        raw_text = stream.read().decode("utf-8")
+    system = import_config(
+        raw_text,
+        format_hint,
+        User.objects.get(id=job["owner"]),
+        name=options.get("name"),
+        version=options.get("version"),
+        progress=_span(progress, 0.1, 1.0),
+    )
+    return system, {"system_id": system.id}
+
+
+def run_import_job(job, progress, workers=0):
+    """Import the chunked uploads of a job; returns ``(result JSON bytes, system)``.
+
+    ``upload`` jobs import their files as the upload endpoint does, ``config``
+    jobs their one file as the config import endpoint does, with the same
+    responses as results. Progress covers assembling the uploads (to 0.1),
+    parsing them (to 0.5 for ``upload`` jobs) and the rows written.
+    """
+    uploads = []
+    for upload_id in job["options"]["uploads"]:
+        upload = get_upload(upload_id, job["owner"])
+        if upload is None:
+            raise ValueError(f"Upload {upload_id} not found")
+        uploads.append(upload)
+    stored = _assemble(uploads, _span(progress, 0.0, 0.1))
+
+    if job["mode"] == "config":
+        system, result = _import_config(job, stored, progress)
+    else:
+        system, result = _import_upload(job, stored, progress, workers)
+    return json.dumps(result).encode(), system
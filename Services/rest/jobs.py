@@ -0,0 +1,435 @@
+import logging
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVE_STATES = ("queued", "running")
+
+# Error of a running job whose process stopped sending heartbeats.
+INTERRUPTED = "Job was interrupted: the server process running it stopped"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLimitError(Exception):
+    pass
+
+
+def job_record(job):
+    """Public form of a job: everything but the owner and heartbeat, with ISO
+    timestamps."""
+    record = {key: value for key, value in job.items() if key not in ("owner", "heartbeat_at")}
+    for key in ("created_at", "started_at", "finished_at"):
+        if record[key] is not None:
+            record[key] = record[key].isoformat()
+    return record
+
+
+class MemoryJobStore:
+    """Jobs in a dict of this process. Jobs are lost on restart."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, owner, system_id, version, mode, options):
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "owner": owner,
+                "system_id": system_id,
+                "version": version,
+                "mode": mode,
+                "options": options,
+                "status": "queued",
+                "progress": 0.0,
+                "error": None,
+                "created_at": timezone.now(),
+                "started_at": None,
+                "finished_at": None,
+                "heartbeat_at": None,
+            }
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def for_owner(self, owner):
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if job["owner"] == owner]
+        return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+    def count(self, owner, statuses):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["owner"] == owner and job["status"] in statuses)
+
+    def running_counts(self):
+        with self._lock:
+            return Counter(job["owner"] for job in self._jobs.values() if job["status"] == "running")
+
+    def active(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["status"] in ACTIVE_STATES]
+
+    def queued(self):
+        """``(job_id, owner)`` of the queued jobs, oldest first."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job["status"] == "queued"]
+        return [(job["job_id"], job["owner"]) for job in sorted(jobs, key=lambda job: job["created_at"])]
+
+    def heartbeat(self, job_ids, now):
+        with self._lock:
+            for job_id in job_ids:
+                job = self._jobs.get(job_id)
+                if job is not None and job["status"] == "running":
+                    job["heartbeat_at"] = now
+
+    def expire(self, before, now):
+        """Fail running jobs without a heartbeat since ``before``."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job["status"] == "running" and (job["heartbeat_at"] is None or job["heartbeat_at"] < before):
+                    job.update(status="failed", error=INTERRUPTED, finished_at=now)
+
+    def update(self, job_id, expect=None, result=None, **fields):
+        """Set ``fields`` (and ``result``) if the job's status is in ``expect``.
+
+        Returns whether the job was updated.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (expect is not None and job["status"] not in expect):
+                return False
+            job.update(fields)
+            if result is not None:
+                self._results[job_id] = result
+            return True
+
+    def result(self, job_id):
+        with self._lock:
+            return self._results.get(job_id)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._results.pop(job_id, None)
+
+    def purge(self, before):
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < before
+            ]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+                self._results.pop(job_id, None)
+
+
+class DatabaseJobStore:
+    """Jobs in the ``model`` table (``SimulationJob`` or ``ImportJob``),
+    visible to every server process.
+    """
+
+    FIELDS = {
+        "system_id": "System_id",
+        "status": "Status",
+        "progress": "Progress",
+        "error": "Error",
+        "started_at": "StartedAt",
+        "finished_at": "FinishedAt",
+        "heartbeat_at": "HeartbeatAt",
+    }
+
+    def __init__(self, model="SimulationJob"):
+        self.model = model
+
+    def _model(self):
+        from django.apps import apps
+
+        return apps.get_model("rest", self.model)
+
+    def _job(self, row):
+        return {
+            "job_id": row.JobId,
+            "owner": row.User_id,
+            "system_id": row.System_id,
+            "version": row.SystemVersion,
+            "mode": row.Mode,
+            "options": row.Options,
+            "status": row.Status,
+            "progress": row.Progress,
+            "error": row.Error,
+            "created_at": row.CreatedAt,
+            "started_at": row.StartedAt,
+            "finished_at": row.FinishedAt,
+            "heartbeat_at": row.HeartbeatAt,
+        }
+
+    def _rows(self):
+        return self._model().objects.defer("Result")
+
+    def create(self, job_id, owner, system_id, version, mode, options):
+        self._model().objects.create(
+            JobId=job_id,
+            User_id=owner,
+            System_id=system_id,
+            SystemVersion=version,
+            Mode=mode,
+            Options=options,
+        )
+
+    def get(self, job_id):
+        row = self._rows().filter(JobId=job_id).first()
+        return self._job(row) if row is not None else None
+
+    def for_owner(self, owner):
+        return [self._job(row) for row in self._rows().filter(User_id=owner).order_by("-CreatedAt")]
+
+    def count(self, owner, statuses):
+        return self._model().objects.filter(User_id=owner, Status__in=statuses).count()
+
+    def running_counts(self):
+        rows = self._model().objects.filter(Status="running").values_list("User_id").annotate(Count("id")).order_by()
+        return Counter(dict(rows))
+
+    def active(self):
+        return [self._job(row) for row in self._rows().filter(Status__in=ACTIVE_STATES)]
+
+    def queued(self):
+        rows = self._model().objects.filter(Status="queued").order_by("CreatedAt", "id")
+        return list(rows.values_list("JobId", "User_id"))
+
+    def heartbeat(self, job_ids, now):
+        self._model().objects.filter(JobId__in=job_ids, Status="running").update(HeartbeatAt=now)
+
+    def expire(self, before, now):
+        stale = Q(HeartbeatAt__lt=before) | Q(HeartbeatAt__isnull=True)
+        self._model().objects.filter(stale, Status="running").update(Status="failed", Error=INTERRUPTED, FinishedAt=now)
+
+    def update(self, job_id, expect=None, result=None, **fields):
+        rows = self._model().objects.filter(JobId=job_id)
+        if expect is not None:
+            rows = rows.filter(Status__in=expect)
+        values = {self.FIELDS[key]: value for key, value in fields.items()}
+        if result is not None:
+            values["Result"] = result.decode()
+        return rows.update(**values) > 0
+
+    def result(self, job_id):
+        value = self._model().objects.filter(JobId=job_id).values_list("Result", flat=True).first()
+        return value.encode() if value is not None else None
+
+    def delete(self, job_id):
+        self._model().objects.filter(JobId=job_id).delete()
+
+    def purge(self, before):
+        self._model().objects.filter(FinishedAt__lt=before).delete()
+
+
+def make_job_store(backend, model="SimulationJob"):
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "database":
+        return DatabaseJobStore(model)
+    raise ValueError(f"Unknown job store: {backend}")
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool in every process, without a broker.
+
+    The store is the queue: a process claims the oldest queued job (moving
+    it to ``running`` only if it is still queued) whenever it has one of its
+    ``workers`` free, so jobs submitted anywhere run anywhere. A user may
+    have ``per_user`` jobs running and ``max_queued`` waiting, counted in
+    the store across all processes. ``runner(job, progress)`` returns the
+    result as JSON bytes and should call ``progress(fraction)`` now and then,
+    which raises ``JobCancelled`` once the job was cancelled. Progress is
+    stored from a separate thread, so it stays visible, and the job
+    cancellable, while the runner holds a transaction open.
+
+    A ticker thread refreshes the heartbeat of the jobs running here every
+    ``heartbeat_s`` seconds, fails running jobs whose heartbeat is older than
+    ``lease_s`` (their process is gone) and claims jobs left queued. Finished
+    jobs are dropped ``retention_s`` seconds after they end.
+    """
+
+    def __init__(
+        self,
+        store,
+        runner,
+        workers=2,
+        per_user=1,
+        max_queued=10,
+        retention_s=3600,
+        name="simulation",
+        heartbeat_s=10,
+        lease_s=60,
+    ):
+        self.name = name
+        self.store = store
+        self.runner = runner
+        self.workers = workers
+        self.per_user = per_user
+        self.max_queued = max_queued
+        self.retention = timedelta(seconds=retention_s)
+        self.heartbeat_s = heartbeat_s
+        self.lease = timedelta(seconds=lease_s)
+        # Jobs running in this process.
+        self.local = set()
+        self.executor = None
+        self.reporter = None
+        self.ticker = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start this process's pool and ticker; later calls do nothing."""
+        with self.lock:
+            if self.ticker is not None:
+                return
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-job")
+            self.reporter = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{self.name}-progress")
+            self.ticker = threading.Thread(target=self._tick, name=f"{self.name}-ticker", daemon=True)
+            self.ticker.start()
+
+    def stop(self):
+        """Stop the ticker and wait for the jobs running here."""
+        self.stopped.set()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.reporter.shutdown()
+
+    def submit(self, owner, system_id, version, mode, options):
+        self.start()
+        self.purge()
+        if self.store.count(owner, ("queued",)) >= self.max_queued:
+            raise JobLimitError(f"At most {self.max_queued} queued {self.name} jobs per user")
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, owner, system_id, version, mode, options)
+        self._dispatch()
+        return self.store.get(job_id)
+
+    def get(self, job_id, owner):
+        self.start()
+        job = self.store.get(job_id)
+        if job is None or job["owner"] != owner:
+            return None
+        return job
+
+    def jobs(self, owner):
+        self.start()
+        self.purge()
+        return self.store.for_owner(owner)
+
+    def result(self, job_id):
+        return self.store.result(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; a running one stops at its next progress call."""
+        return self.store.update(
+            job_id, expect=ACTIVE_STATES, status="cancelled", finished_at=timezone.now()
+        )
+
+    def delete(self, job_id):
+        self.store.delete(job_id)
+
+    def purge(self):
+        """Fail jobs whose process is gone and drop expired finished ones."""
+        now = timezone.now()
+        self.store.expire(now - self.lease, now)
+        self.store.purge(now - self.retention)
+
+    def _tick(self):
+        while not self.stopped.wait(self.heartbeat_s):
+            try:
+                close_old_connections()
+                with self.lock:
+                    running = list(self.local)
+                if running:
+                    self.store.heartbeat(running, timezone.now())
+                self.purge()
+                self._dispatch()
+            except Exception:
+                logger.exception("%s job ticker failed", self.name)
+
+    def _dispatch(self):
+        """Claim queued jobs from the store while this process has free workers."""
+        with self.lock:
+            if self.stopped.is_set() or len(self.local) >= self.workers:
+                return
+            running = self.store.running_counts()
+            for job_id, owner in self.store.queued():
+                if len(self.local) >= self.workers:
+                    return
+                if running[owner] >= self.per_user:
+                    continue
+                now = timezone.now()
+                if not self.store.update(
+                    job_id, expect=("queued",), status="running", started_at=now, heartbeat_at=now
+                ):
+                    # Claimed by another process, or cancelled.
+                    continue
+                # Another process may have claimed a job of the same user at
+                # the same time; the one over the limit goes back.
+                if self.store.count(owner, ("running",)) > self.per_user:
+                    self.store.update(job_id, expect=("running",), status="queued", started_at=None, heartbeat_at=None)
+                    running[owner] = self.per_user
+                    continue
+                running[owner] += 1
+                self.local.add(job_id)
+                self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            self._execute(job_id)
+        finally:
+            close_old_connections()
+            with self.lock:
+                self.local.discard(job_id)
+            self._dispatch()
+
+    def _execute(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job["status"] != "running":
+            return
+
+        def report(fraction):
+            close_old_connections()
+            return self.store.update(job_id, expect=("running",), progress=round(fraction, 4))
+
+        def progress(fraction):
+            # The update fails once the job is no longer running, i.e. cancelled.
+            if not self.reporter.submit(report, fraction).result():
+                raise JobCancelled()
+
+        try:
+            result = self.runner(job, progress)
+        except JobCancelled:
+            return
+        except Exception as exc:
+            self.store.update(
+                job_id, expect=("running",), status="failed", error=str(exc), finished_at=timezone.now()
+            )
+            return
+        self.store.update(
+            job_id,
+            expect=("running",),
+            status="succeeded",
+            progress=1.0,
+            result=result,
+            finished_at=timezone.now(),
+        )
@@ -0,0 +1,187 @@
+from collections import defaultdict
+
+from django.db.models.fields.json import KeyTransform
+
+from .models import Connection, Device, FirewallRule, Port, TrafficProfile
+
+
+# Rows fetched per round trip while iterating a query.
+CHUNK_SIZE = 2000
+
+NO_VLANS = frozenset()
+
+
+class DeviceRecord:
+    """The device fields a simulation reads, under the model's attribute names.
+
+    ``AdditionalAsJson`` holds only the keys the engine looks at, or None;
+    ``access_vlans`` replaces the prefetched ports.
+    """
+
+    __slots__ = ("id", "AssetId", "AssetName", "DeviceType", "IsOnline", "AdditionalAsJson", "access_vlans")
+
+    def __init__(self, id, AssetId, AssetName, DeviceType, IsOnline, AdditionalAsJson, access_vlans):
+        self.id = id
+        self.AssetId = AssetId
+        self.AssetName = AssetName
+        self.DeviceType = DeviceType
+        self.IsOnline = IsOnline
+        self.AdditionalAsJson = AdditionalAsJson
+        self.access_vlans = access_vlans
+
+
+class ConnectionRecord:
+    __slots__ = (
+        "id",
+        "Source_id",
+        "Target_id",
+        "BandwidthMbps",
+        "LatencyMs",
+        "ErrorRate",
+        "IsTrunk",
+        "AllowedVlans",
+        "ConnectionDetails",
+    )
+
+    def __init__(
+        self, id, Source_id, Target_id, BandwidthMbps, LatencyMs, ErrorRate, IsTrunk, AllowedVlans, ConnectionDetails
+    ):
+        self.id = id
+        self.Source_id = Source_id
+        self.Target_id = Target_id
+        self.BandwidthMbps = BandwidthMbps
+        self.LatencyMs = LatencyMs
+        self.ErrorRate = ErrorRate
+        self.IsTrunk = IsTrunk
+        self.AllowedVlans = AllowedVlans
+        self.ConnectionDetails = ConnectionDetails
+
+
+class TrafficProfileRecord:
+    __slots__ = ("id", "Device_id", "Profile")
+
+    def __init__(self, id, Device_id, Profile):
+        self.id = id
+        self.Device_id = Device_id
+        self.Profile = Profile
+
+
+class FirewallRuleRecord:
+    __slots__ = ("id", "Device_id", "Action", "Protocol", "Src", "Dst", "SrcPort", "DstPort", "Vlan")
+
+    def __init__(self, id, Device_id, Action, Protocol, Src, Dst, SrcPort, DstPort, Vlan):
+        self.id = id
+        self.Device_id = Device_id
+        self.Action = Action
+        self.Protocol = Protocol
+        self.Src = Src
+        self.Dst = Dst
+        self.SrcPort = SrcPort
+        self.DstPort = DstPort
+        self.Vlan = Vlan
+
+
+def _present(**values):
+    """The keys of a JSON field that are set, or None when none are."""
+    found = {key: value for key, value in values.items() if value is not None}
+    return found or None
+
+
+def _connection(pk, source, target, bandwidth, latency, error_rate, trunk, allowed, jitter, failure):
+    details = _present(jitter_ms=jitter, failure_probability=failure)
+    return ConnectionRecord(pk, source, target, bandwidth, latency, error_rate, trunk, allowed, details)
+
+
+class Records:
+    """Lazy records of a ``values_list`` query; each iteration runs the query.
+
+    Rows are streamed in chunks and never cached on the queryset, so only the
+    records themselves stay in memory.
+    """
+
+    def __init__(self, queryset, build):
+        self.queryset = queryset
+        self.build = build
+
+    def rows(self):
+        return self.queryset.iterator(chunk_size=CHUNK_SIZE)
+
+    def __iter__(self):
+        build = self.build
+        return (build(*row) for row in self.rows())
+
+
+class DeviceRecords(Records):
+    """Device records, each with the access VLANs of its ports."""
+
+    def __init__(self, queryset, ports):
+        super().__init__(queryset, None)
+        self.ports = ports
+
+    def __iter__(self):
+        access = defaultdict(set)
+        for device_id, vlan in self.ports.iterator(chunk_size=CHUNK_SIZE):
+            access[device_id].add(vlan)
+        access = {device_id: frozenset(vlans) for device_id, vlans in access.items()}
+        for pk, asset_id, asset_name, device_type, online, rate, type_lower, type_upper in self.rows():
+            extra = _present(TrafficRateMbps=rate, deviceType=type_lower, DeviceType=type_upper)
+            yield DeviceRecord(pk, asset_id, asset_name, device_type, online, extra, access.get(pk, NO_VLANS))
+
+
+def simulation_records(system, version):
+    """Lazy ``(devices, connections, traffic_profiles, firewall_rules)`` records.
+
+    Only the columns the engine reads are selected, and the JSON keys it
+    needs from ``AdditionalAsJson`` and ``ConnectionDetails`` are extracted
+    by the database. Ordering by id keeps device and link indices stable for
+    cached routes.
+    """
+    devices = (
+        Device.objects.filter(System=system, SystemVersion=version)
+        .order_by("id")
+        .annotate(
+            rate=KeyTransform("TrafficRateMbps", "AdditionalAsJson"),
+            type_lower=KeyTransform("deviceType", "AdditionalAsJson"),
+            type_upper=KeyTransform("DeviceType", "AdditionalAsJson"),
+        )
+        .values_list("id", "AssetId", "AssetName", "DeviceType", "IsOnline", "rate", "type_lower", "type_upper")
+    )
+    ports = Port.objects.filter(
+        Device__System=system, Device__SystemVersion=version, IsTrunk=False, AccessVlan__isnull=False
+    ).values_list("Device_id", "AccessVlan")
+    connections = (
+        Connection.objects.filter(System=system, SystemVersion=version)
+        .order_by("id")
+        .annotate(
+            jitter=KeyTransform("jitter_ms", "ConnectionDetails"),
+            failure=KeyTransform("failure_probability", "ConnectionDetails"),
+        )
+        .values_list(
+            "id",
+            "Source_id",
+            "Target_id",
+            "BandwidthMbps",
+            "LatencyMs",
+            "ErrorRate",
+            "IsTrunk",
+            "AllowedVlans",
+            "jitter",
+            "failure",
+        )
+    )
+    traffic_profiles = (
+        TrafficProfile.objects.filter(System=system, SystemVersion=version)
+        .order_by("id")
+        .values_list("id", "Device_id", "Profile")
+    )
+    firewall_rules = (
+        FirewallRule.objects.filter(System=system, SystemVersion=version)
+        .order_by("id")
+        .values_list("id", "Device_id", "Action", "Protocol", "Src", "Dst", "SrcPort", "DstPort", "Vlan")
+    )
+    return (
+        DeviceRecords(devices, ports),
+        Records(connections, _connection),
+        Records(traffic_profiles, TrafficProfileRecord),
+        Records(firewall_rules, FirewallRuleRecord),
+    )
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest", "0004_telemetry_models"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimulationJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("JobId", models.CharField(max_length=32, unique=True)),
+                ("SystemVersion", models.IntegerField(default=1)),
+                ("Mode", models.CharField(default="snapshot", max_length=20)),
+                ("Options", models.JSONField(blank=True, null=True)),
+                ("Status", models.CharField(default="queued", max_length=20)),
+                ("Progress", models.FloatField(default=0)),
+                ("Error", models.TextField(blank=True, null=True)),
+                ("Result", models.TextField(blank=True, null=True)),
+                ("CreatedAt", models.DateTimeField(auto_now_add=True)),
+                ("StartedAt", models.DateTimeField(blank=True, null=True)),
+                ("FinishedAt", models.DateTimeField(blank=True, null=True)),
+                ("System", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="simulation_jobs", to="rest.system")),
+                ("User", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="simulation_jobs", to="auth.user")),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rest", "0006_import_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="simulationjob",
+            name="HeartbeatAt",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="HeartbeatAt",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -193,4 +193,54 @@ class TelemetrySample(models.Model):
     Extra = models.JSONField(null=True, blank=True)
 
     def __str__(self):
-        return f"{self.Session.id}:{self.Timestamp.isoformat()}"
\ No newline at end of file
+        return f"{self.Session.id}:{self.Timestamp.isoformat()}"
+
+class SimulationJob(models.Model):
+    JobId = models.CharField(max_length=32, unique=True)
+    System = models.ForeignKey(
+        System, on_delete=models.CASCADE, related_name="simulation_jobs"
+    )
+    User = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="simulation_jobs"
+    )
+    SystemVersion = models.IntegerField(default=1)
+    Mode = models.CharField(max_length=20, default="snapshot")
+    Options = models.JSONField(null=True, blank=True)
+    Status = models.CharField(max_length=20, default="queued")
+    Progress = models.FloatField(default=0)
+    Error = models.TextField(null=True, blank=True)
+    Result = models.TextField(null=True, blank=True)
+    CreatedAt = models.DateTimeField(auto_now_add=True)
+    StartedAt = models.DateTimeField(null=True, blank=True)
+    FinishedAt = models.DateTimeField(null=True, blank=True)
+    # Refreshed while the job runs; a stale one means its process is gone.
+    HeartbeatAt = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.System.Name}:{self.Mode}:{self.Status}"
+
+
+class ImportJob(models.Model):
+    JobId = models.CharField(max_length=32, unique=True)
+    # Set once the import has created its system.
+    System = models.ForeignKey(
+        System, on_delete=models.SET_NULL, null=True, blank=True, related_name="import_jobs"
+    )
+    User = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="import_jobs"
+    )
+    SystemVersion = models.IntegerField(default=1)
+    Mode = models.CharField(max_length=20, default="upload")
+    Options = models.JSONField(null=True, blank=True)
+    Status = models.CharField(max_length=20, default="queued")
+    Progress = models.FloatField(default=0)
+    Error = models.TextField(null=True, blank=True)
+    Result = models.TextField(null=True, blank=True)
+    CreatedAt = models.DateTimeField(auto_now_add=True)
+    StartedAt = models.DateTimeField(null=True, blank=True)
+    FinishedAt = models.DateTimeField(null=True, blank=True)
+    # Refreshed while the job runs; a stale one means its process is gone.
+    HeartbeatAt = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.User_id}:{self.Mode}:{self.Status}"
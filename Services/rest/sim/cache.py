@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU mapping bounded by the total size of its values.
+
+    Callers pass the size of each value (bytes, or any unit consistent with
+    ``max_size``); least recently used entries are dropped once the total
+    exceeds ``max_size``.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size=1):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_size:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self.size -= dropped
+
+    def discard(self, predicate):
+        """Drop every entry whose key satisfies ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -0,0 +1,91 @@
+from .cache import LRUCache
+from .diagnostics import NO_DIAGNOSTICS
+from .firewall import compile_firewall
+from .flows import collect_flows
+from .memo import system_digest
+from .routing import route_results, route_trees
+from .topology import compile_topology
+
+
+COMPILED_CACHE_SYSTEMS = 32
+VERSION_RESULT_BYTES = 256 * 1024 * 1024
+
+compiled_systems = LRUCache(COMPILED_CACHE_SYSTEMS)
+# Engine results per (system_id, version, metric, allocation), the baselines
+# of version diffs.
+version_results = LRUCache(VERSION_RESULT_BYTES)
+
+
+class CompiledSystem:
+    """Everything a simulation needs from the database for one version.
+
+    Cached instances are shared between requests and threads: routing
+    writes ``flows.reason``, so callers route a ``flows.copy()``.
+    """
+
+    def __init__(self, topology, flows, firewall):
+        self.topology = topology
+        self.flows = flows
+        self.firewall = firewall
+        self._digest = None
+
+    def digest(self):
+        if self._digest is None:
+            self._digest = system_digest(self)
+        return self._digest
+
+
+def compile_system(devices, connections, traffic_profiles, firewall_rules, diagnostics=NO_DIAGNOSTICS):
+    if diagnostics.enabled:
+        # Evaluate the querysets up front so their time is not charged to compiling.
+        with diagnostics.phase("query"):
+            devices, connections = list(devices), list(connections)
+            traffic_profiles, firewall_rules = list(traffic_profiles), list(firewall_rules)
+    with diagnostics.phase("graph"):
+        topology = compile_topology(devices, connections)
+        topology.adjacency()
+    with diagnostics.phase("flows"):
+        flows = collect_flows(topology, traffic_profiles)
+    with diagnostics.phase("firewall_compile"):
+        firewall = compile_firewall(topology, firewall_rules)
+    return CompiledSystem(topology, flows, firewall)
+
+
+def load_system(
+    devices, connections, traffic_profiles, firewall_rules, cache_key=None, diagnostics=NO_DIAGNOSTICS
+):
+    """Return the compiled system, from ``compiled_systems`` when possible.
+
+    ``cache_key`` starts with ``(system_id, version)`` and should carry a
+    stamp that changes whenever the version's rows do (see
+    ``simulation_cache_key``): ``invalidate_system`` only clears this
+    process, so the stamp is what keeps other processes from serving a
+    stale entry. A version without devices is not cached, since its rows may
+    still be on their way. The inputs may be lazy querysets; on a hit they
+    are never evaluated.
+    """
+    if cache_key is None:
+        return compile_system(devices, connections, traffic_profiles, firewall_rules, diagnostics)
+    system = compiled_systems.get(cache_key)
+    if system is None:
+        system = compile_system(devices, connections, traffic_profiles, firewall_rules, diagnostics)
+        if system.topology.n_devices:
+            compiled_systems.set(cache_key, system)
+    else:
+        diagnostics.count("compiled_cache_hits")
+    return system
+
+
+def invalidate_system(system_id, version=None):
+    """Forget compiled topologies and routes of a system (or one version).
+
+    Only the caches of the calling process are cleared.
+    """
+
+    def stale(key):
+        return key[0] == system_id and (version is None or key[1] == version)
+
+    compiled_systems.discard(stale)
+    version_results.discard(stale)
+    route_trees.discard(stale)
+    route_results.discard(stale)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from .flows import ROUTABLE, NO_PATH
+from .topology import _device_type
+
+
+# Device labels listed per island in the component summary.
+MAX_ISLAND_MEMBERS = 50
+
+
+def component_summary(topology, flows, top=None):
+    """Sizes of the topology's components and the islands outside the largest.
+
+    Islands are listed largest first with their online and host counts and
+    up to ``MAX_ISLAND_MEMBERS`` device labels. ``split_flows`` counts the
+    flows whose source and destination lie in different components.
+    """
+    index = topology.components()
+    component = index.component
+    size = index.size
+    n_devices = topology.n_devices
+    online = np.bincount(component, weights=topology.online, minlength=index.n_components)
+    hosts = np.bincount(
+        component,
+        weights=np.fromiter(
+            (_device_type(device) == "host" for device in topology.devices), dtype=bool, count=n_devices
+        ),
+        minlength=index.n_components,
+    )
+
+    live = ((flows.reason == ROUTABLE) | (flows.reason == NO_PATH)) & (flows.dst >= 0)
+    split = live.copy()
+    split[live] = ~index.connected(flows.src[live], flows.dst[live])
+
+    # Largest first; ties keep component order.
+    order = np.argsort(-size, kind="stable")
+    members = np.argsort(component, kind="stable")
+    starts = np.zeros(index.n_components + 1, dtype=np.int64)
+    np.cumsum(size, out=starts[1:])
+    islands = []
+    for comp in order[1:].tolist()[:top]:
+        devices = members[starts[comp]:min(starts[comp + 1], starts[comp] + MAX_ISLAND_MEMBERS)]
+        islands.append(
+            {
+                "size": int(size[comp]),
+                "online": int(online[comp]),
+                "hosts": int(hosts[comp]),
+                "devices": [topology.labels[idx] for idx in devices.tolist()],
+            }
+        )
+    return {
+        "devices": n_devices,
+        "links": topology.n_links,
+        "components": index.n_components,
+        "largest": int(size[order[0]]) if n_devices else 0,
+        "isolated": int(np.count_nonzero(size == 1)),
+        "split_flows": int(split.sum()),
+        "islands": islands,
+    }
@@ -0,0 +1,158 @@
+import math
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import combinations
+
+import numpy as np
+
+from .engine import run_simulation
+from .flows import ROUTABLE
+from .whatif import Scenario
+
+
+ELEMENT_TYPES = ("link", "device")
+
+# Failures handed to a worker per task.
+CONTINGENCY_CHUNK = 8
+
+
+def _failure_cases(topology, elements, k, samples, seed):
+    """Single-element failures, plus up to ``samples`` distinct k-failures."""
+    pool = []
+    if "link" in elements:
+        pool.extend(("link", idx) for idx in range(topology.n_links))
+    if "device" in elements:
+        pool.extend(("device", idx) for idx in range(topology.n_devices))
+    cases = [(element,) for element in pool]
+    if k < 2 or samples <= 0 or len(pool) < k:
+        return cases
+
+    if math.comb(len(pool), k) <= samples:
+        return cases + list(combinations(pool, k))
+    rng = np.random.default_rng(seed)
+    sampled = set()
+    # Bounded so that a tiny pool cannot loop forever on repeats.
+    for _ in range(samples * 10):
+        if len(sampled) >= samples:
+            break
+        sampled.add(tuple(sorted(rng.choice(len(pool), size=k, replace=False).tolist())))
+    return cases + [tuple(pool[idx] for idx in combo) for combo in sorted(sampled)]
+
+
+def _evaluate(scenario, case):
+    topology = scenario.topology
+    failed = np.zeros(topology.n_devices, dtype=bool)
+    dead = np.zeros(topology.n_links, dtype=bool)
+    for kind, idx in case:
+        if kind == "device":
+            failed[idx] = True
+        else:
+            dead[idx] = True
+    scenario.reset()
+    scenario.update(failed, dead)
+
+    base = scenario.baseline
+    current = scenario.current
+    base_ok = (base.flows.reason == ROUTABLE) & (base.blocked_by < 0)
+    now_ok = (current.flows.reason == ROUTABLE) & (current.blocked_by < 0)
+    lost_capacity = scenario.link_down
+    return {
+        "lost_flows": int((base_ok & ~now_ok).sum()),
+        "degraded_flows": int((now_ok & (current.achieved < base.achieved - 1e-9)).sum()),
+        "lost_mbps": float(base.achieved.sum() - current.achieved.sum()),
+        "capacity_lost_mbps": float(topology.capacity[lost_capacity].sum()),
+        "overloaded_links": int(((current.utilization > 1) & ~lost_capacity).sum()),
+    }
+
+
+_worker_scenario = None
+
+
+def _init_worker(system, baseline, metric, allocation):
+    global _worker_scenario
+    _worker_scenario = Scenario(system, metric=metric, allocation=allocation, baseline=baseline)
+
+
+def _evaluate_chunk(cases):
+    return [_evaluate(_worker_scenario, case) for case in cases]
+
+
+def contingency_analysis(
+    system,
+    metric="hops",
+    allocation="max_min",
+    elements=ELEMENT_TYPES,
+    k=1,
+    samples=0,
+    seed=None,
+    workers=0,
+    cache_key=None,
+    progress=None,
+):
+    """Simulate every single-element failure, and sampled k-failures, of ``system``.
+
+    Each failure is applied to a what-if ``Scenario`` of the baseline, so
+    only affected flows are re-routed. With ``workers > 1`` failures are
+    spread over a process pool; every worker receives the compiled system
+    and baseline once. ``progress`` is called with the fraction of failures
+    evaluated after every chunk. Returns the baseline totals and one entry
+    per failure, worst first.
+    """
+    baseline = run_simulation(
+        system.topology,
+        system.flows.copy(),
+        system.firewall,
+        metric=metric,
+        allocation=allocation,
+        cache_key=cache_key,
+    )
+    cases = _failure_cases(system.topology, elements, k, samples, seed)
+    chunks = [cases[pos:pos + CONTINGENCY_CHUNK] for pos in range(0, len(cases), CONTINGENCY_CHUNK)]
+    if workers > 1 and len(chunks) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(system, baseline, metric, allocation)
+        )
+        try:
+            futures = [executor.submit(_evaluate_chunk, chunk) for chunk in chunks]
+            pending = set(futures)
+            while pending:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if progress is not None:
+                    progress(1 - len(pending) / len(futures))
+            impacts = [impact for future in futures for impact in future.result()]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        scenario = Scenario(system, metric=metric, allocation=allocation, baseline=baseline)
+        impacts = []
+        for done, chunk in enumerate(chunks, 1):
+            impacts.extend(_evaluate(scenario, case) for case in chunk)
+            if progress is not None:
+                progress(done / len(chunks))
+
+    topology = system.topology
+    labels = topology.labels
+    failures = []
+    for case, impact in zip(cases, impacts):
+        failed = []
+        for kind, idx in case:
+            if kind == "device":
+                failed.append({"type": "device", "device": labels[idx]})
+            else:
+                failed.append(
+                    {
+                        "type": "link",
+                        "link_id": int(topology.link_ids[idx]),
+                        "from": labels[topology.link_src[idx]],
+                        "to": labels[topology.link_dst[idx]],
+                    }
+                )
+        impact["lost_mbps"] = round(impact["lost_mbps"], 3) + 0.0
+        failures.append({"failed": failed, **impact})
+    failures.sort(key=lambda entry: (-entry["lost_mbps"], -entry["lost_flows"], -entry["degraded_flows"]))
+
+    ok = (baseline.flows.reason == ROUTABLE) & (baseline.blocked_by < 0)
+    return {
+        "baseline": {"flows_ok": int(ok.sum()), "throughput_mbps": round(float(baseline.achieved.sum()), 3)},
+        "evaluated": len(failures),
+        "failures": failures,
+    }
@@ -0,0 +1,78 @@
+import time
+
+
+class _Phase:
+    __slots__ = ("diagnostics", "name", "started")
+
+    def __init__(self, diagnostics, name):
+        self.diagnostics = diagnostics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        phases = self.diagnostics.phases
+        phases[self.name] = phases.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+class Diagnostics:
+    """Wall time per phase and event counters of one simulation run.
+
+    Phases are timed with ``with diagnostics.phase(name):``; entering the
+    same phase again adds to its time. Counters add up ``count`` calls.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def as_dict(self):
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+    def server_timing(self):
+        """The phases as a ``Server-Timing`` header value."""
+        metrics = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()]
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(metrics)
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NoDiagnostics:
+    """Stand-in used when diagnostics are off; every call does nothing."""
+
+    enabled = False
+    _phase = _NoPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, value=1):
+        pass
+
+
+NO_DIAGNOSTICS = NoDiagnostics()
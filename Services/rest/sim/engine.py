@@ -0,0 +1,200 @@
+import numpy as np
+
+from .allocation import allocate
+from .compiled import load_system
+from .diagnostics import NO_DIAGNOSTICS
+from .firewall import evaluate_firewall
+from .flows import REASONS, ROUTABLE, SOURCE_OFFLINE
+from .routing import route_flows
+
+
+class SimulationResult:
+    """Per-flow and per-link arrays produced by one simulation run."""
+
+    def __init__(
+        self, topology, flows, routes, blocked_by, latency, achieved, utilization, row_blocked, row_achieved
+    ):
+        self.topology = topology
+        self.flows = flows
+        self.routes = routes
+        self.blocked_by = blocked_by
+        self.latency = latency
+        self.achieved = achieved
+        self.utilization = utilization
+        self.row_blocked = row_blocked
+        self.row_achieved = row_achieved
+
+    def flow_record(self, idx):
+        topology = self.topology
+        flows = self.flows
+        labels = topology.labels
+        reason = flows.reason[idx]
+        if reason != ROUTABLE:
+            status, reason_name = REASONS[reason]
+            if flows.dst[idx] < 0 or reason == SOURCE_OFFLINE:
+                destination = flows.dst_name.get(idx)
+            else:
+                destination = labels[flows.dst[idx]]
+            return {
+                "status": status,
+                "reason": reason_name,
+                "source": labels[flows.src[idx]],
+                "destination": destination,
+            }
+
+        protocol, src_port, dst_port, vlan = flows.specs[flows.spec[idx]]
+        record = {
+            "status": "ok",
+            "source": labels[flows.src[idx]],
+            "destination": labels[flows.dst[idx]],
+            "protocol": protocol,
+            "src_port": src_port,
+            "dst_port": dst_port,
+            "vlan": vlan,
+            "requested_mbps": float(flows.rate[idx]),
+            "path": [
+                {"from": labels[topology.link_src[link]], "to": labels[topology.link_dst[link]]}
+                for link in self.routes.incidence.row(self.routes.primary[idx])
+            ],
+        }
+        if self.routes.count[idx] > 1:
+            record["ecmp_paths"] = int(self.routes.count[idx])
+        latency = float(self.latency[idx])
+        if self.blocked_by[idx] >= 0:
+            record["status"] = "blocked"
+            record["blocked_by"] = labels[self.blocked_by[idx]]
+            record["achieved_mbps"] = 0
+            record["latency_ms"] = latency
+            return record
+        record["achieved_mbps"] = round(float(self.achieved[idx]), 3)
+        record["latency_ms"] = round(latency, 3)
+        return record
+
+    def flow_records(self):
+        for idx in range(len(self.flows)):
+            yield self.flow_record(idx)
+
+    def link_record(self, link):
+        topology = self.topology
+        labels = topology.labels
+        return {
+            "from": labels[topology.link_src[link]],
+            "to": labels[topology.link_dst[link]],
+            "capacity_mbps": float(topology.capacity[link]),
+            "utilization": round(float(self.utilization[link]), 3) if self.utilization[link] else 0,
+        }
+
+    def link_records(self):
+        return [self.link_record(link) for link in range(self.topology.n_links)]
+
+    def summary(self):
+        flows = self.flows
+        routable = flows.reason == ROUTABLE
+        return {
+            "flows": len(flows),
+            "ok": int((routable & (self.blocked_by < 0)).sum()),
+            "blocked": int((routable & (self.blocked_by >= 0)).sum()),
+            "unrouted": int((~routable).sum()),
+            "links": self.topology.n_links,
+            "throughput_mbps": round(float(self.achieved.sum()), 3),
+            "max_utilization": round(float(self.utilization.max()), 3) if self.topology.n_links else 0,
+        }
+
+    def records(self):
+        """Every output record tagged with its ``type``: flows, links, then a summary.
+
+        Records are built one at a time, so a consumer can write them out
+        without holding the whole output.
+        """
+        for record in self.flow_records():
+            yield {"type": "flow", **record}
+        for link in range(self.topology.n_links):
+            yield {"type": "link", **self.link_record(link)}
+        yield {"type": "summary", **self.summary()}
+
+    def as_dict(self):
+        return {"flows": list(self.flow_records()), "links": self.link_records()}
+
+
+def carried_rows(flows, routes, row_blocked):
+    """Rows that put load on their links: routable flows on non-denied paths."""
+    return (flows.reason[routes.flow] == ROUTABLE) & (row_blocked < 0)
+
+
+def assemble_result(topology, flows, routes, row_blocked, row_achieved):
+    """Per-flow and per-link outputs from per-row firewall and allocation results."""
+    incidence = routes.incidence
+
+    # A flow is blocked only when every one of its paths is denied.
+    open_paths = np.bincount(routes.flow, weights=row_blocked < 0, minlength=len(flows))
+    blocked_by = np.where(open_paths == 0, row_blocked[routes.primary], -1)
+
+    row_latency = incidence.row_sum(topology.latency[incidence.links])
+    latency = row_latency[routes.primary]
+
+    # Denied paths keep their hops for reporting but carry no load.
+    row_rate = flows.rate[routes.flow] * routes.share
+    offered = np.where(carried_rows(flows, routes, row_blocked), row_rate, 0.0)
+    utilization = incidence.column_sum(
+        offered[incidence.rows] / np.maximum(topology.capacity[incidence.links], 1)
+    )
+
+    achieved = np.bincount(routes.flow, weights=row_achieved, minlength=len(flows))
+    return SimulationResult(
+        topology, flows, routes, blocked_by, latency, achieved, utilization, row_blocked, row_achieved
+    )
+
+
+def run_simulation(
+    topology,
+    flows,
+    firewall,
+    metric="hops",
+    allocation="max_min",
+    workers=0,
+    cache_key=None,
+    diagnostics=NO_DIAGNOSTICS,
+):
+    with diagnostics.phase("route"):
+        routes = route_flows(
+            topology, flows, metric=metric, workers=workers, cache_key=cache_key, diagnostics=diagnostics
+        )
+    with diagnostics.phase("firewall"):
+        row_blocked = evaluate_firewall(topology, flows, routes, firewall, diagnostics=diagnostics)
+    with diagnostics.phase("allocate"):
+        row_rate = flows.rate[routes.flow] * routes.share
+        carried = carried_rows(flows, routes, row_blocked)
+        row_achieved = allocate(routes.incidence, row_rate, topology.capacity, carried, allocation)
+    with diagnostics.phase("assemble"):
+        result = assemble_result(topology, flows, routes, row_blocked, row_achieved)
+    if diagnostics.enabled:
+        diagnostics.count("devices", topology.n_devices)
+        diagnostics.count("links", topology.n_links)
+        diagnostics.count("flows", len(flows))
+        diagnostics.count("flows_routed", np.count_nonzero(flows.reason == ROUTABLE))
+        diagnostics.count("paths", routes.incidence.n_rows)
+    return result
+
+
+def simulate(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    workers=0,
+    cache_key=None,
+    diagnostics=NO_DIAGNOSTICS,
+):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key, diagnostics)
+    return run_simulation(
+        system.topology,
+        system.flows.copy(),
+        system.firewall,
+        metric=metric,
+        allocation=allocation,
+        workers=workers,
+        cache_key=cache_key,
+        diagnostics=diagnostics,
+    )
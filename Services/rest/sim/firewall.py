@@ -0,0 +1,177 @@
+from collections import defaultdict
+from itertools import product
+
+import numpy as np
+
+from .diagnostics import NO_DIAGNOSTICS
+
+
+class Decision:
+    """Whether one device denies one flow spec, as device masks.
+
+    A flow ``src -> dst`` is denied when ``deny_all`` is set, when ``src`` or
+    ``dst`` is set in the matching one-sided mask, or when the pair key
+    ``src * n_devices + dst`` is in ``pair_keys``. Unused masks stay ``None``.
+    """
+
+    def __init__(self, n_devices, deny_all=False, src_any=None, dst_any=None, pair_keys=None, rules=0):
+        self.n_devices = n_devices
+        self.rules = rules
+        self.deny_all = deny_all
+        self.src_any = src_any
+        self.dst_any = dst_any
+        self.pair_keys = pair_keys
+
+    def denies(self, src, dst):
+        if self.deny_all:
+            return np.ones(len(src), dtype=bool)
+        denied = np.zeros(len(src), dtype=bool)
+        if self.src_any is not None:
+            denied |= self.src_any[src]
+        if self.dst_any is not None:
+            denied |= self.dst_any[dst]
+        if self.pair_keys is not None:
+            denied |= np.isin(src * self.n_devices + dst, self.pair_keys)
+        return denied
+
+
+class FirewallIndex:
+    """Deny rules compiled into per-device lookup tables.
+
+    Only a matching deny rule can block a flow, so allow rules are dropped.
+    Each device's table is keyed by ``(protocol, dst_port, vlan)`` with
+    ``None`` for a wildcard field, the all-``None`` key being the fallback
+    list; a flow spec therefore looks at no more than eight buckets per device.
+    """
+
+    def __init__(self, topology, firewall_rules):
+        self.topology = topology
+        self.tables = defaultdict(lambda: defaultdict(list))
+        for rule in firewall_rules:
+            if (rule.Action or "").lower() != "deny":
+                continue
+            device = topology.device_index.get(rule.Device_id)
+            if device is None:
+                continue
+            key = (rule.Protocol.lower() if rule.Protocol else None, rule.DstPort or None, rule.Vlan or None)
+            self.tables[device][key].append((rule.Src or None, rule.Dst or None, rule.SrcPort or None))
+        # Plain dicts so the index can be sent to worker processes.
+        self.tables = {device: dict(table) for device, table in self.tables.items()}
+        self.ruled = np.zeros(topology.n_devices, dtype=bool)
+        self.ruled[list(self.tables)] = True
+        self._decisions = {}
+        self._endpoints = {}
+        self._labels = None
+
+    def __bool__(self):
+        return bool(self.tables)
+
+    def _endpoint(self, name):
+        """Devices a rule's Src/Dst refers to, by label or primary key."""
+        mask = self._endpoints.get(name)
+        if mask is None:
+            topology = self.topology
+            if self._labels is None:
+                self._labels = defaultdict(list)
+                for idx, label in enumerate(topology.labels):
+                    self._labels[label].append(idx)
+            mask = np.zeros(topology.n_devices, dtype=bool)
+            mask[self._labels.get(name, [])] = True
+            if name in topology.device_index:
+                mask[topology.device_index[name]] = True
+            self._endpoints[name] = mask
+        return mask
+
+    def decision(self, device, spec):
+        decision = self._decisions.get((device, spec))
+        if decision is not None:
+            return decision
+        protocol, src_port, dst_port, vlan = spec
+        n_devices = self.topology.n_devices
+        table = self.tables[device]
+        deny_all = False
+        src_any = []
+        dst_any = []
+        pairs = []
+        rules = 0
+        for key in set(product((protocol.lower(), None), (dst_port, None), (vlan, None))):
+            bucket = table.get(key, ())
+            rules += len(bucket)
+            for rule_src, rule_dst, rule_src_port in bucket:
+                if rule_src_port and rule_src_port != src_port:
+                    continue
+                if rule_src is None and rule_dst is None:
+                    deny_all = True
+                elif rule_dst is None:
+                    src_any.append(self._endpoint(rule_src))
+                elif rule_src is None:
+                    dst_any.append(self._endpoint(rule_dst))
+                else:
+                    srcs = np.flatnonzero(self._endpoint(rule_src))
+                    dsts = np.flatnonzero(self._endpoint(rule_dst))
+                    pairs.append((srcs[:, None] * n_devices + dsts[None, :]).ravel())
+        decision = Decision(
+            n_devices,
+            deny_all=deny_all,
+            src_any=np.logical_or.reduce(src_any) if src_any else None,
+            dst_any=np.logical_or.reduce(dst_any) if dst_any else None,
+            pair_keys=np.unique(np.concatenate(pairs)) if pairs else None,
+            rules=rules,
+        )
+        self._decisions[(device, spec)] = decision
+        return decision
+
+
+def compile_firewall(topology, firewall_rules):
+    return FirewallIndex(topology, firewall_rules)
+
+
+def evaluate_firewall(topology, flows, routes, firewall, diagnostics=NO_DIAGNOSTICS):
+    """Return, per route row, the index of the first device that denies it or -1.
+
+    Only hops through devices with deny rules are checked. They are grouped
+    by (device, flow spec) so that each group is one ``Decision`` lookup;
+    ``rules_evaluated`` counts the rules each lookup matched against.
+    """
+    incidence = routes.incidence
+    blocked_by = np.full(incidence.n_rows, -1, dtype=np.int64)
+    if not firewall or not incidence.nnz:
+        return blocked_by
+
+    # Hops are ordered by link along the path, Source side before Target side.
+    entries = np.arange(incidence.nnz)
+    position = np.concatenate([2 * entries, 2 * entries + 1])
+    device = np.concatenate([topology.link_src[incidence.links], topology.link_dst[incidence.links]])
+    checked = firewall.ruled[device]
+    if not checked.any():
+        return blocked_by
+    position = position[checked]
+    device = device[checked]
+    row = incidence.rows[position // 2]
+    flow = routes.flow[row]
+    spec = flows.spec[flow]
+    diagnostics.count("firewall_hops", len(position))
+
+    denied = np.zeros(len(position), dtype=bool)
+    order = np.lexsort((spec, device))
+    group_device = device[order]
+    group_spec = spec[order]
+    bounds = np.flatnonzero(
+        np.r_[True, (group_device[1:] != group_device[:-1]) | (group_spec[1:] != group_spec[:-1]), True]
+    )
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        members = order[start:end]
+        decision = firewall.decision(int(group_device[start]), flows.specs[group_spec[start]])
+        diagnostics.count("rules_evaluated", decision.rules)
+        denied[members] = decision.denies(flows.src[flow[members]], flows.dst[flow[members]])
+
+    if not denied.any():
+        return blocked_by
+    position = position[denied]
+    row = row[denied]
+    device = device[denied]
+    first = np.lexsort((position, row))
+    row = row[first]
+    leading = np.r_[True, row[1:] != row[:-1]]
+    blocked_by[row[leading]] = device[first][leading]
+    return blocked_by
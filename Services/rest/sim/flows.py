@@ -0,0 +1,159 @@
+import numpy as np
+
+from .topology import _device_type, _is_online, _traffic_rate
+
+
+ROUTABLE = 0
+SOURCE_OFFLINE = 1
+DESTINATION_NOT_FOUND = 2
+DESTINATION_OFFLINE = 3
+NO_PATH = 4
+
+REASONS = {
+    SOURCE_OFFLINE: ("down", "source_offline"),
+    DESTINATION_NOT_FOUND: ("error", "destination_not_found"),
+    DESTINATION_OFFLINE: ("down", "destination_offline"),
+    NO_PATH: ("error", "no_path"),
+}
+
+
+# Optional per-flow rate time series, used by the time-stepped simulation.
+SERIES_FIELDS = ("rate_series", "diurnal", "bursts")
+
+
+class FlowTable:
+    """Columnar list of flows in output order.
+
+    Flow attributes that rarely vary (protocol, ports, VLAN) are interned in
+    ``specs`` and each flow only stores the index of its spec.
+    """
+
+    def __init__(self):
+        self.src = []
+        self.dst = []
+        self.rate = []
+        self.spec = []
+        self.reason = []
+        self.dst_name = {}
+        self.series = {}
+        self.specs = []
+        self._spec_index = {}
+
+    def __len__(self):
+        return len(self.src)
+
+    def intern_spec(self, protocol, src_port, dst_port, vlan):
+        key = (protocol, src_port, dst_port, vlan)
+        idx = self._spec_index.get(key)
+        if idx is None:
+            idx = len(self.specs)
+            self._spec_index[key] = idx
+            self.specs.append(key)
+        return idx
+
+    def add(self, src, dst=-1, rate=0.0, spec=-1, reason=ROUTABLE, dst_name=None, series=None):
+        if dst_name is not None:
+            self.dst_name[len(self.src)] = dst_name
+        if series is not None:
+            self.series[len(self.src)] = series
+        self.src.append(src)
+        self.dst.append(dst)
+        self.rate.append(rate)
+        self.spec.append(spec)
+        self.reason.append(reason)
+
+    def subset(self, idx):
+        """Finalized table of the flows at ``idx``, sharing ``specs``."""
+        table = FlowTable()
+        table.src = self.src[idx]
+        table.dst = self.dst[idx]
+        table.rate = self.rate[idx]
+        table.spec = self.spec[idx]
+        table.reason = self.reason[idx]
+        table.dst_name = {new: self.dst_name[old] for new, old in enumerate(idx) if old in self.dst_name}
+        table.series = {new: self.series[old] for new, old in enumerate(idx) if old in self.series}
+        table.specs = self.specs
+        table._spec_index = self._spec_index
+        return table
+
+    def copy(self):
+        return self.subset(np.arange(len(self)))
+
+    def finalize(self):
+        self.src = np.asarray(self.src, dtype=np.int64)
+        self.dst = np.asarray(self.dst, dtype=np.int64)
+        self.rate = np.asarray(self.rate, dtype=float)
+        self.spec = np.asarray(self.spec, dtype=np.int64)
+        self.reason = np.asarray(self.reason, dtype=np.int8)
+        return self
+
+
+def collect_flows(topology, traffic_profiles):
+    flows = FlowTable()
+    profiles = list(traffic_profiles)
+    if not profiles:
+        _add_default_flows(topology, flows)
+        return flows.finalize()
+
+    for profile in profiles:
+        profile_data = profile.Profile or {}
+        src = topology.device_index[profile.Device_id]
+        src_device = topology.devices[src]
+        for flow in profile_data.get("flows", []):
+            dst_label = flow.get("to") or flow.get("to_device")
+            if not _is_online(src_device):
+                flows.add(src, reason=SOURCE_OFFLINE, dst_name=dst_label)
+                continue
+
+            dst = topology.label_index.get(dst_label)
+            if dst is None and flow.get("to_id"):
+                dst = topology.device_index.get(flow.get("to_id"))
+            if dst is None:
+                flows.add(src, reason=DESTINATION_NOT_FOUND, dst_name=dst_label)
+                continue
+            if not topology.online[dst]:
+                flows.add(src, dst, reason=DESTINATION_OFFLINE)
+                continue
+
+            spec = flows.intern_spec(
+                flow.get("protocol", "tcp"),
+                flow.get("src_port"),
+                flow.get("dst_port") or 443,
+                flow.get("vlan"),
+            )
+            rate = float(flow.get("rate_mbps", _traffic_rate(src_device, 10)))
+            series = {key: flow[key] for key in SERIES_FIELDS if flow.get(key)}
+            flows.add(src, dst, rate, spec, series=series or None)
+    return flows.finalize()
+
+
+def _add_default_flows(topology, flows):
+    """All-to-all tcp/443 traffic between online hosts, built as arrays.
+
+    Flows are ordered by source host, then destination host, each source
+    sending at its own ``TrafficRateMbps``.
+    """
+    hosts = np.fromiter(
+        (
+            idx
+            for idx, device in enumerate(topology.devices)
+            if _device_type(device) == "host" and topology.online[idx]
+        ),
+        dtype=np.int64,
+    )
+    rates = np.fromiter(
+        (_traffic_rate(topology.devices[idx], 10) for idx in hosts), dtype=float, count=len(hosts)
+    )
+    spec = flows.intern_spec("tcp", None, 443, None)
+
+    n_hosts = len(hosts)
+    src = np.repeat(np.arange(n_hosts), n_hosts)
+    dst = np.tile(np.arange(n_hosts), n_hosts)
+    pairs = src != dst
+    src = src[pairs]
+    dst = dst[pairs]
+    flows.src = hosts[src]
+    flows.dst = hosts[dst]
+    flows.rate = rates[src]
+    flows.spec = np.full(len(src), spec, dtype=np.int64)
+    flows.reason = np.full(len(src), ROUTABLE, dtype=np.int8)
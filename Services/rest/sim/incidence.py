@@ -0,0 +1,82 @@
+from itertools import chain
+
+import numpy as np
+
+
+class Incidence:
+    """Sparse flow x link incidence matrix in CSR layout.
+
+    Row ``f`` holds the link indices of flow ``f``'s path in path order:
+    ``links[indptr[f]:indptr[f + 1]]``. ``rows`` repeats the flow index for
+    every stored entry so per-entry values can be scattered with bincount.
+    """
+
+    def __init__(self, indptr, links, n_links):
+        self.indptr = indptr
+        self.links = links
+        self.n_links = n_links
+        self.lengths = np.diff(indptr)
+        self.rows = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), self.lengths)
+
+    @classmethod
+    def from_paths(cls, paths, n_links):
+        lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+        indptr = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        links = np.fromiter(chain.from_iterable(paths), dtype=np.int64, count=int(indptr[-1]))
+        return cls(indptr, links, n_links)
+
+    @classmethod
+    def concat(cls, parts, n_links):
+        """Stack the rows of several incidences over the same links."""
+        lengths = np.concatenate([part.lengths for part in parts])
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return cls(indptr, np.concatenate([part.links for part in parts]), n_links)
+
+    def take(self, rows):
+        """Incidence holding only ``rows``, in the given order."""
+        lengths = self.lengths[rows]
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        offsets = np.repeat(self.indptr[:-1][rows] - indptr[:-1], lengths)
+        return Incidence(indptr, self.links[offsets + np.arange(indptr[-1])], self.n_links)
+
+    @property
+    def n_rows(self):
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self):
+        return len(self.links)
+
+    def row(self, idx):
+        return self.links[self.indptr[idx]:self.indptr[idx + 1]]
+
+    def row_sum(self, entry_values):
+        return np.bincount(self.rows, weights=entry_values, minlength=self.n_rows)
+
+    def column_sum(self, entry_values):
+        return np.bincount(self.links, weights=entry_values, minlength=self.n_links)
+
+    def row_min(self, entry_values, empty=np.inf):
+        out = np.full(self.n_rows, empty, dtype=float)
+        nonempty = self.lengths > 0
+        if self.nnz:
+            out[nonempty] = np.minimum.reduceat(entry_values, self.indptr[:-1][nonempty])
+        return out
+
+    def running_column_sum(self, entry_values):
+        """Per entry, the column total over this and all earlier rows."""
+        out = np.zeros(self.nnz, dtype=float)
+        if not self.nnz:
+            return out
+        order = np.argsort(self.links, kind="stable")
+        sorted_links = self.links[order]
+        sorted_values = entry_values[order]
+        running = np.cumsum(sorted_values)
+        new_group = np.r_[True, sorted_links[1:] != sorted_links[:-1]]
+        starts = np.flatnonzero(new_group)
+        base = running[starts] - sorted_values[starts]
+        out[order] = running - base[np.cumsum(new_group) - 1]
+        return out
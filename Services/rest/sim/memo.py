@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from .cache import LRUCache
+
+
+def system_digest(system):
+    """Content hash of everything in a compiled system that shapes the result."""
+    topology = system.topology
+    flows = system.flows
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update("\0".join(topology.labels).encode())
+    for array in (
+        topology.online,
+        topology.link_src,
+        topology.link_dst,
+        topology.capacity,
+        topology.latency,
+        flows.src,
+        flows.dst,
+        flows.rate,
+        flows.spec,
+        flows.reason,
+    ):
+        digest.update(array.tobytes())
+    digest.update(repr([None if vlans is None else sorted(vlans) for vlans in topology.link_vlans]).encode())
+    digest.update(repr(flows.specs).encode())
+    digest.update(repr(sorted(flows.dst_name.items())).encode())
+    digest.update(repr({device: dict(table) for device, table in system.firewall.tables.items()}).encode())
+    return digest.hexdigest()
+
+
+def result_key(system, **options):
+    """Memo key for one simulation: the system digest plus engine options."""
+    digest = hashlib.blake2b(system.digest().encode(), digest_size=20)
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class MemoryResultStore:
+    """Serialized results in a process-local LRU bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self._entries = LRUCache(max_bytes)
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, payload):
+        self._entries.set(key, payload, len(payload))
+
+
+class FileResultStore:
+    """Serialized results as files in ``directory``, shared by all workers.
+
+    Reads refresh a file's mtime; writes evict the least recently used files
+    once the directory holds more than ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                payload = handle.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return payload
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as handle:
+            handle.write(payload)
+        os.replace(handle.name, self._path(key))
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def make_result_store(backend, max_bytes, directory=None):
+    if backend == "memory":
+        return MemoryResultStore(max_bytes)
+    if backend == "file":
+        return FileResultStore(directory, max_bytes)
+    raise ValueError(f"Unknown simulation cache backend: {backend}")
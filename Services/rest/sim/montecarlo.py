@@ -0,0 +1,282 @@
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .cache import LRUCache
+from .engine import run_simulation
+from .flows import ROUTABLE
+from .whatif import Scenario
+
+
+DEFAULT_TRIALS = 1000
+MAX_TRIALS = 100_000
+DEFAULT_TIME_BUDGET_S = 30.0
+
+# A link's loss in one trial is the lost fraction of this many packets,
+# each dropped with probability ErrorRate.
+PACKETS_PER_TRIAL = 1000
+
+# Trials per chunk keep a chunk's path entry x trial matrices near this size.
+CHUNK_CELLS = 2_000_000
+MAX_CHUNK_TRIALS = 64
+
+# Upper bound on kept flow x trial samples (two float32 matrices).
+MAX_SAMPLES = 50_000_000
+
+# Re-routed results per distinct set of failed links, kept per worker.
+FAILURE_RESULTS = 64
+
+PERCENTILES = (50, 95, 99)
+
+
+def _row_sums(incidence, entry_values):
+    """Per-row sums of an entries x trials matrix."""
+    running = np.zeros((incidence.nnz + 1, entry_values.shape[1]))
+    np.cumsum(entry_values, axis=0, out=running[1:])
+    return running[incidence.indptr[1:]] - running[incidence.indptr[:-1]]
+
+
+def _row_sums_by_flow(routes, row_values):
+    """Per-flow sums of a rows x trials matrix; rows are ordered by flow."""
+    running = np.zeros((len(row_values) + 1, row_values.shape[1]))
+    np.cumsum(row_values, axis=0, out=running[1:])
+    return running[routes.primary + routes.count] - running[routes.primary]
+
+
+def _percentiles(samples, percentiles):
+    """Per-row percentiles of ``samples``, ignoring NaN.
+
+    Rows without any value get NaN. Linear interpolation, as np.percentile.
+    """
+    ordered = np.sort(samples, axis=1)
+    count = (~np.isnan(ordered)).sum(axis=1)
+    out = np.full((len(percentiles), len(samples)), np.nan)
+    has = count > 0
+    for pos, percentile in enumerate(percentiles):
+        rank = percentile / 100 * np.maximum(count - 1, 0)
+        low = np.floor(rank).astype(np.int64)
+        high = np.minimum(low + 1, np.maximum(count - 1, 0))
+        low_value = np.take_along_axis(ordered, low[:, None], axis=1)[:, 0]
+        high_value = np.take_along_axis(ordered, high[:, None], axis=1)[:, 0]
+        value = low_value + (high_value - low_value) * (rank - low)
+        out[pos, has] = value[has]
+    return out
+
+
+def _summary(values):
+    if np.isnan(values[0]):
+        return None
+    return {f"p{percentile}": round(float(value), 3) for percentile, value in zip(PERCENTILES, values)}
+
+
+class Trials:
+    """Draws Monte Carlo trials of ``system`` and measures every flow in them.
+
+    Per trial, every link independently fails with its failure probability,
+    loses a Binomial(PACKETS_PER_TRIAL, ErrorRate) fraction of the packets
+    crossing it and adds normal jitter (standard deviation ``jitter_ms``) to
+    its latency. Trials with the same failed links share one re-routed what-
+    if result; loss and jitter are applied to all trials at once.
+    """
+
+    def __init__(self, system, baseline, metric="hops", allocation="max_min", failure_probability=0.0):
+        self.topology = system.topology
+        self.baseline = baseline
+        self.scenario = Scenario(system, metric=metric, allocation=allocation, baseline=baseline)
+        failure = self.topology.failure
+        self.failure = np.clip(np.where(np.isnan(failure), failure_probability, failure), 0, 1)
+        self.measured = np.flatnonzero((baseline.flows.reason == ROUTABLE) & (baseline.blocked_by < 0))
+        self.used = np.zeros(self.topology.n_links, dtype=bool)
+        self.used[baseline.routes.incidence.links] = True
+        self.results = LRUCache(FAILURE_RESULTS)
+
+    def _result(self, down):
+        if not down.any():
+            return self.baseline
+        key = np.packbits(down).tobytes()
+        result = self.results.get(key)
+        if result is None:
+            self.scenario.reset()
+            self.scenario.update(np.zeros(self.topology.n_devices, dtype=bool), down)
+            result = self.scenario.current
+            self.results.set(key, result)
+        return result
+
+    def run(self, seed, n_trials):
+        """Latency and delivered rate of the measured flows, ``flows x trials``.
+
+        Latency is NaN in trials where a flow does not get through.
+        """
+        topology = self.topology
+        rng = np.random.default_rng(seed)
+        shape = (topology.n_links, n_trials)
+        down = rng.random(shape) < self.failure[:, None]
+        # Failures that miss every baseline path change nothing.
+        down[:, ~(down & self.used[:, None]).any(axis=0)] = False
+        loss = rng.binomial(PACKETS_PER_TRIAL, topology.error_rate[:, None], size=shape) / PACKETS_PER_TRIAL
+        # A fully lossy link keeps a tiny fraction so path sums stay finite.
+        keep_log = np.log1p(-np.minimum(loss, 1 - 1e-12))
+        delay = np.maximum(topology.latency[:, None] + topology.jitter[:, None] * rng.standard_normal(shape), 0.0)
+
+        n_flows = len(self.baseline.flows)
+        latency = np.full((n_flows, n_trials), np.nan, dtype=np.float32)
+        throughput = np.zeros((n_flows, n_trials), dtype=np.float32)
+        if down.any():
+            patterns, group = np.unique(down.T, axis=0, return_inverse=True)
+            group = group.ravel()
+        else:
+            patterns, group = down[:, :1].T, np.zeros(n_trials, dtype=np.int64)
+        for pattern_idx, pattern in enumerate(patterns):
+            trials = np.flatnonzero(group == pattern_idx)
+            result = self._result(pattern)
+            routes = result.routes
+            incidence = routes.incidence
+            row_delay = _row_sums(incidence, delay[:, trials][incidence.links])
+            row_keep = np.exp(_row_sums(incidence, keep_log[:, trials][incidence.links]))
+            delivered = _row_sums_by_flow(routes, result.row_achieved[:, None] * row_keep)
+            ok = np.flatnonzero((result.flows.reason == ROUTABLE) & (result.blocked_by < 0))
+            latency[np.ix_(ok, trials)] = row_delay[routes.primary[ok]]
+            throughput[:, trials] = delivered
+        return latency[self.measured], throughput[self.measured]
+
+
+def _chunk_trials(baseline):
+    entries = max(baseline.routes.incidence.nnz, baseline.topology.n_links, 1)
+    return int(np.clip(CHUNK_CELLS // entries, 1, MAX_CHUNK_TRIALS))
+
+
+_worker_trials = None
+
+
+def _init_worker(system, baseline, metric, allocation, failure_probability):
+    global _worker_trials
+    _worker_trials = Trials(system, baseline, metric, allocation, failure_probability)
+
+
+def _run_chunk(seed, n_trials):
+    return _worker_trials.run(seed, n_trials)
+
+
+def monte_carlo(
+    system,
+    metric="hops",
+    allocation="max_min",
+    trials=DEFAULT_TRIALS,
+    seed=None,
+    failure_probability=0.0,
+    time_budget_s=DEFAULT_TIME_BUDGET_S,
+    workers=0,
+    cache_key=None,
+    progress=None,
+):
+    """Latency and throughput percentiles per flow over random trials of ``system``.
+
+    Trials run in chunks, each seeded from ``SeedSequence(seed).spawn``, so
+    a seed gives the same samples whatever the number of workers. Once
+    ``time_budget_s`` is spent no further chunks are started and the
+    report covers the chunks completed in order so far (at least one).
+    ``failure_probability`` applies to links that do not set their own
+    ``failure_probability`` detail. ``progress`` is called with the
+    fraction of chunks done after every chunk.
+    """
+    started = time.monotonic()
+    if not 1 <= trials <= MAX_TRIALS:
+        raise ValueError(f"trials must be between 1 and {MAX_TRIALS}")
+    if not 0 <= failure_probability <= 1:
+        raise ValueError("failure_probability must be between 0 and 1")
+    if time_budget_s is not None and time_budget_s <= 0:
+        raise ValueError("time_budget_s must be positive")
+
+    baseline = run_simulation(
+        system.topology,
+        system.flows.copy(),
+        system.firewall,
+        metric=metric,
+        allocation=allocation,
+        cache_key=cache_key,
+    )
+    measured = np.flatnonzero((baseline.flows.reason == ROUTABLE) & (baseline.blocked_by < 0))
+    if len(measured) * trials > MAX_SAMPLES:
+        raise ValueError(f"{trials} trials of {len(measured)} flows exceed {MAX_SAMPLES} samples; use fewer trials")
+
+    if seed is None:
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    chunk = _chunk_trials(baseline)
+    sizes = [min(chunk, trials - start) for start in range(0, trials, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    deadline = started + time_budget_s if time_budget_s is not None else None
+
+    parts = []
+    if workers > 1 and len(sizes) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(system, baseline, metric, allocation, failure_probability),
+        )
+        try:
+            futures = [executor.submit(_run_chunk, chunk_seed, size) for chunk_seed, size in zip(seeds, sizes)]
+            pending = set(futures)
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                if progress is not None:
+                    progress(1 - len(pending) / len(futures))
+            futures[0].result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for future in futures:
+            if not future.done() or future.cancelled():
+                break
+            parts.append(future.result())
+    else:
+        runner = Trials(system, baseline, metric, allocation, failure_probability)
+        for chunk_seed, size in zip(seeds, sizes):
+            parts.append(runner.run(chunk_seed, size))
+            if progress is not None:
+                progress(len(parts) / len(sizes))
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+    latency = np.concatenate([part[0] for part in parts], axis=1)
+    throughput = np.concatenate([part[1] for part in parts], axis=1)
+    completed = latency.shape[1]
+    delivered = (~np.isnan(latency)).sum(axis=1) / completed
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        latency_pct = _percentiles(latency, PERCENTILES)
+        # Throughput pXX is the rate met or exceeded in XX% of trials.
+        low_tail = tuple(100 - percentile for percentile in PERCENTILES)
+        throughput_pct = _percentiles(throughput, low_tail)
+        network_pct = _percentiles(throughput.sum(axis=0, dtype=float)[None, :], low_tail)[:, 0]
+
+    topology = system.topology
+    labels = topology.labels
+    flows = baseline.flows
+    records = []
+    for pos, idx in enumerate(measured.tolist()):
+        protocol, _, dst_port, _ = flows.specs[flows.spec[idx]]
+        records.append(
+            {
+                "source": labels[flows.src[idx]],
+                "destination": labels[flows.dst[idx]],
+                "protocol": protocol,
+                "dst_port": dst_port,
+                "requested_mbps": float(flows.rate[idx]),
+                "delivered": round(float(delivered[pos]), 4),
+                "latency_ms": _summary(latency_pct[:, pos]),
+                "throughput_mbps": _summary(throughput_pct[:, pos]),
+            }
+        )
+    return {
+        "trials": completed,
+        "requested_trials": trials,
+        "truncated": completed < trials,
+        "seed": seed,
+        "elapsed_s": round(time.monotonic() - started, 3),
+        "network": {"throughput_mbps": _summary(network_pct)},
+        "flows": records,
+    }
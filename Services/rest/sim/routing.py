@@ -0,0 +1,579 @@
+import hashlib
+from collections import deque, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .cache import LRUCache
+from .diagnostics import NO_DIAGNOSTICS
+from .flows import NO_PATH, ROUTABLE
+from .incidence import Incidence
+from .topology import vlan_id
+
+
+ROUTING_METRICS = ("hops", "latency", "bandwidth")
+
+# Below this many distinct sources a process pool costs more than it saves.
+PARALLEL_MIN_SOURCES = 256
+
+# From this many distinct sources on, flows are checked against the
+# topology's component index before any tree is built; the index costs
+# about as much as one or two trees.
+COMPONENT_MIN_SOURCES = 4
+
+# Weighted trees are relaxed for this many sources at a time.
+TREE_BATCH = 64
+
+# Cost of a link under the "bandwidth" metric is REFERENCE_BW_MBPS / capacity,
+# like OSPF's reference bandwidth.
+REFERENCE_BW_MBPS = 100000.0
+MIN_LINK_WEIGHT = 1e-9
+EQUAL_COST_RTOL = 1e-9
+MAX_ECMP_PATHS = 8
+
+ROUTE_CACHE_BYTES = 256 * 1024 * 1024
+
+# Shortest-path trees keyed by (system_id, version, metric, source), or
+# (system_id, version, "vlan", vlan, metric, source) on a VLAN's subgraph.
+route_trees = LRUCache(ROUTE_CACHE_BYTES)
+# Routed flow tables keyed by (system_id, version, metric).
+route_results = LRUCache(ROUTE_CACHE_BYTES)
+
+
+def build_graph(connections):
+    graph = defaultdict(list)
+    for conn in connections:
+        graph[conn.Source_id].append((conn.Target_id, conn))
+        graph[conn.Target_id].append((conn.Source_id, conn))
+    return graph
+
+
+def find_path(graph, src_id, dst_id, components=None):
+    """BFS path from ``src_id`` to ``dst_id`` as a list of connections, or None.
+
+    With a ``ComponentIndex`` of the same devices, pairs in different
+    components return None without a search.
+    """
+    if src_id == dst_id:
+        return []
+    if components is not None and not components.connected_ids(src_id, dst_id):
+        return None
+    queue = deque([src_id])
+    prev = {src_id: None}
+    prev_conn = {}
+    while queue:
+        current = queue.popleft()
+        for neighbor_id, conn in graph.get(current, []):
+            if neighbor_id in prev:
+                continue
+            prev[neighbor_id] = current
+            prev_conn[neighbor_id] = conn
+            if neighbor_id == dst_id:
+                queue.clear()
+                break
+            queue.append(neighbor_id)
+    if dst_id not in prev:
+        return None
+    path = []
+    step = dst_id
+    while prev[step] is not None:
+        path.append(prev_conn[step])
+        step = prev[step]
+    path.reverse()
+    return path
+
+
+def shortest_path_tree(adjacency, source):
+    """Level-synchronous BFS from ``source`` over a CSR adjacency.
+
+    Returns ``(prev_node, prev_link, depth)`` arrays; ``depth`` is -1 for
+    devices that were not reached. Within a level, a device is claimed by the
+    first frontier entry that lists it, which is the order a FIFO queue would
+    discover it in, so paths are identical to ``find_path``.
+    """
+    ptr, origin, neighbors, links = adjacency
+    n_devices = len(ptr) - 1
+    prev_node = np.full(n_devices, -1, dtype=np.int64)
+    prev_link = np.full(n_devices, -1, dtype=np.int64)
+    depth = np.full(n_devices, -1, dtype=np.int64)
+    depth[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    level = 0
+    while len(frontier):
+        level += 1
+        starts = ptr[frontier]
+        counts = ptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            break
+        entries = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        entries = entries[depth[neighbors[entries]] < 0]
+        if not len(entries):
+            break
+        _, first = np.unique(neighbors[entries], return_index=True)
+        entries = entries[np.sort(first)]
+        frontier = neighbors[entries]
+        depth[frontier] = level
+        prev_node[frontier] = origin[entries]
+        prev_link[frontier] = links[entries]
+    return prev_node, prev_link, depth
+
+
+class WeightedTree:
+    """Shortest-path DAG from one source under a link weight.
+
+    ``dist`` holds the distance to every device (inf when unreachable). The
+    equal-cost predecessors of device ``v`` are ``prev_node[ptr[v]:ptr[v + 1]]``
+    reached over ``prev_link``. ``first_node`` / ``first_link`` / ``hops``
+    follow the first predecessor only, and ``branched[v]`` is set when more
+    than one equal-cost path leads to ``v``.
+    """
+
+    def __init__(self, source, dist, ptr, prev_node, prev_link):
+        self.dist = dist
+        self.ptr = ptr
+        self.prev_node = prev_node
+        self.prev_link = prev_link
+
+        counts = np.diff(ptr)
+        has_prev = counts > 0
+        self.first_node = np.full(len(dist), -1, dtype=np.int64)
+        self.first_link = np.full(len(dist), -1, dtype=np.int64)
+        self.first_node[has_prev] = prev_node[ptr[:-1][has_prev]]
+        self.first_link[has_prev] = prev_link[ptr[:-1][has_prev]]
+        self.hops = np.full(len(dist), -1, dtype=np.int64)
+        self.hops[source] = 0
+        self.branched = counts > 1
+        pending = np.flatnonzero(has_prev)
+        while len(pending):
+            parent = self.first_node[pending]
+            ready = self.hops[parent] >= 0
+            if not ready.any():
+                break
+            done = pending[ready]
+            self.hops[done] = self.hops[parent[ready]] + 1
+            self.branched[done] |= self.branched[parent[ready]]
+            pending = pending[~ready]
+        self.nbytes = sum(
+            part.nbytes
+            for part in (dist, ptr, prev_node, prev_link, self.first_node, self.first_link, self.hops)
+        )
+        self._lists = None
+
+    def equal_cost_paths(self, source, dst, limit=MAX_ECMP_PATHS):
+        """Up to ``limit`` equal-cost paths as lists of link indices, or None."""
+        if dst == source:
+            return [[]]
+        if not np.isfinite(self.dist[dst]):
+            return None
+        if self._lists is None:
+            self._lists = (self.ptr.tolist(), self.prev_node.tolist(), self.prev_link.tolist())
+        ptr, prev_node, prev_link = self._lists
+        paths = []
+        # Every predecessor in the DAG leads back to the source, so the
+        # depth-first walk never dead-ends and stops after ``limit`` paths.
+        stack = [(dst, [])]
+        while stack and len(paths) < limit:
+            node, suffix = stack.pop()
+            if node == source:
+                paths.append(suffix[::-1])
+                continue
+            for pos in range(ptr[node + 1] - 1, ptr[node] - 1, -1):
+                stack.append((prev_node[pos], suffix + [prev_link[pos]]))
+        return paths
+
+
+def link_weights(topology, metric):
+    if metric == "latency":
+        weights = topology.latency
+    elif metric == "bandwidth":
+        weights = REFERENCE_BW_MBPS / np.maximum(topology.capacity, 1)
+    else:
+        weights = np.ones(topology.n_links)
+    return np.maximum(weights, MIN_LINK_WEIGHT)
+
+
+def weighted_trees(adjacency, weights, sources):
+    """Shortest-path DAGs for ``sources`` under per-link ``weights``.
+
+    Distances for a batch of sources are relaxed together, one column per
+    source, from the devices that improved in the previous round until
+    nothing improves. The adjacency entries that lie on a shortest path are
+    then kept as the equal-cost predecessors.
+    """
+    ptr, origin, neighbors, links = adjacency
+    n_devices = len(ptr) - 1
+    by_target = np.argsort(neighbors, kind="stable")
+    entry_origin = origin[by_target]
+    entry_target = neighbors[by_target]
+    entry_link = links[by_target]
+    entry_weight = weights[entry_link]
+
+    trees = []
+    for pos in range(0, len(sources), TREE_BATCH):
+        batch = np.asarray(sources[pos:pos + TREE_BATCH], dtype=np.int64)
+        dist = np.full((n_devices, len(batch)), np.inf)
+        dist[batch, np.arange(len(batch))] = 0.0
+        active = np.zeros(n_devices, dtype=bool)
+        active[batch] = True
+        while True:
+            selected = np.flatnonzero(active[entry_origin])
+            if not len(selected):
+                break
+            # Entries are sorted by target, so each target is one run.
+            targets = entry_target[selected]
+            starts = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1]])
+            candidate = dist[entry_origin[selected]] + entry_weight[selected, None]
+            best = np.minimum.reduceat(candidate, starts, axis=0)
+            targets = targets[starts]
+            current = dist[targets]
+            improved = best < current
+            dist[targets] = np.where(improved, best, current)
+            active[:] = False
+            active[targets[improved.any(axis=1)]] = True
+
+        reach = dist[entry_target]
+        with np.errstate(invalid="ignore"):
+            tight = np.isfinite(reach) & (
+                np.abs(dist[entry_origin] + entry_weight[:, None] - reach)
+                <= EQUAL_COST_RTOL * np.maximum(reach, 1.0)
+            )
+        for column, source in enumerate(batch.tolist()):
+            kept = np.flatnonzero(tight[:, column])
+            tree_ptr = np.searchsorted(entry_target[kept], np.arange(n_devices + 1))
+            trees.append(
+                WeightedTree(
+                    source, dist[:, column].copy(), tree_ptr, entry_origin[kept], entry_link[kept]
+                )
+            )
+    return trees
+
+
+def _build_trees(adjacency, weights, metric, sources):
+    if metric == "hops":
+        return [shortest_path_tree(adjacency, source) for source in sources]
+    return weighted_trees(adjacency, weights, sources)
+
+
+_worker_state = None
+
+
+def _init_worker(adjacency, weights, metric):
+    global _worker_state
+    _worker_state = (adjacency, weights, metric)
+
+
+def _build_chunk(sources):
+    adjacency, weights, metric = _worker_state
+    return _build_trees(adjacency, weights, metric, sources)
+
+
+def _tree_reach(tree):
+    """Devices a tree reached, i.e. the nodes its search visited."""
+    if isinstance(tree, WeightedTree):
+        return np.count_nonzero(np.isfinite(tree.dist))
+    return np.count_nonzero(tree[2] >= 0)
+
+
+def _tree_size(tree):
+    if isinstance(tree, WeightedTree):
+        return tree.nbytes
+    return sum(part.nbytes for part in tree)
+
+
+def source_trees(topology, sources, metric="hops", workers=0, cache_key=None, diagnostics=NO_DIAGNOSTICS):
+    """Shortest-path tree for each source, reusing cached trees.
+
+    With a ``cache_key`` (``(system_id, version)``) trees are looked up in and
+    stored to ``route_trees``. Missing trees are built in a process pool when
+    ``workers > 1`` and at least ``PARALLEL_MIN_SOURCES`` are needed.
+    """
+    trees = {}
+    if cache_key is not None:
+        for source in sources:
+            tree = route_trees.get((*cache_key, metric, source))
+            if tree is not None:
+                trees[source] = tree
+    missing = [source for source in sources if source not in trees]
+    diagnostics.count("trees_cached", len(trees))
+    if not missing:
+        return trees
+
+    adjacency = topology.adjacency()
+    weights = link_weights(topology, metric)
+    if workers > 1 and len(missing) >= PARALLEL_MIN_SOURCES:
+        chunk_size = max(TREE_BATCH, len(missing) // (workers * 4))
+        chunks = [missing[pos:pos + chunk_size] for pos in range(0, len(missing), chunk_size)]
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(adjacency, weights, metric)
+        ) as executor:
+            built = [tree for chunk in executor.map(_build_chunk, chunks) for tree in chunk]
+    else:
+        built = _build_trees(adjacency, weights, metric, missing)
+
+    for source, tree in zip(missing, built):
+        trees[source] = tree
+        if cache_key is not None:
+            route_trees.set((*cache_key, metric, source), tree, _tree_size(tree))
+    if diagnostics.enabled:
+        diagnostics.count("trees_built", len(built))
+        diagnostics.count("nodes_visited", sum(_tree_reach(tree) for tree in built))
+    return trees
+
+
+class Routes:
+    """Routed paths for a FlowTable.
+
+    ``incidence`` has one row per path, ordered by flow; ``flow`` maps each
+    row to its flow and ``share`` is the fraction of the flow's volume the
+    path carries. Every flow has at least one row (empty when the flow was
+    not routed), and ``primary`` points at its first row.
+    """
+
+    def __init__(self, incidence, flow, share, n_flows):
+        self.incidence = incidence
+        self.flow = flow
+        self.share = share
+        self.count = np.bincount(flow, minlength=n_flows)
+        self.primary = np.zeros(n_flows, dtype=np.int64)
+        np.cumsum(self.count[:-1], out=self.primary[1:])
+
+    @property
+    def nbytes(self):
+        incidence = self.incidence
+        return sum(
+            part.nbytes
+            for part in (incidence.indptr, incidence.links, incidence.rows, self.flow, self.share)
+        )
+
+    @classmethod
+    def single(cls, incidence):
+        n_flows = incidence.n_rows
+        return cls(incidence, np.arange(n_flows, dtype=np.int64), np.ones(n_flows), n_flows)
+
+
+def _source_groups(flows):
+    routable = np.flatnonzero(flows.reason == ROUTABLE)
+    order = routable[np.argsort(flows.src[routable], kind="stable")]
+    sources = flows.src[order]
+    bounds = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1], True]) if len(order) else [0]
+    return [
+        (int(sources[start]), order[start:end])
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def _tree_paths(tree, source, destinations):
+    """Read BFS-tree paths to ``destinations`` back to back.
+
+    Returns ``(lengths, links)``; a length of -1 marks an unreachable
+    destination.
+    """
+    prev_node, prev_link, depth = tree
+    lengths = depth[destinations]
+    sizes = np.maximum(lengths, 0)
+    ends = np.cumsum(sizes)
+    out = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.int64)
+    walking = sizes > 0
+    current = destinations[walking]
+    pos = ends[walking] - 1
+    while len(current):
+        out[pos] = prev_link[current]
+        current = prev_node[current]
+        pos = pos - 1
+        keep = current != source
+        current = current[keep]
+        pos = pos[keep]
+    return lengths, out
+
+
+def _route_hops(flows, groups, trees, n_links):
+    lengths = np.zeros(len(flows), dtype=np.int64)
+    results = []
+    for source, members in groups:
+        member_lengths, routed = _tree_paths(trees[source], source, flows.dst[members])
+        flows.reason[members[member_lengths < 0]] = NO_PATH
+        lengths[members] = np.maximum(member_lengths, 0)
+        results.append(routed)
+
+    # Paths arrive grouped by source; scatter them into flow order.
+    indptr = np.zeros(len(flows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    links = np.empty(int(indptr[-1]), dtype=np.int64)
+    if len(links):
+        members = np.concatenate([members for _, members in groups])
+        grouped = np.concatenate(results)
+        grouped_start = np.zeros(len(flows), dtype=np.int64)
+        grouped_start[members] = np.cumsum(lengths[members]) - lengths[members]
+        links[:] = grouped[np.repeat(grouped_start - indptr[:-1], lengths) + np.arange(len(links))]
+    return Routes.single(Incidence(indptr, links, n_links))
+
+
+def _route_weighted(flows, groups, trees, n_links):
+    n_flows = len(flows)
+    single = []
+    multi = {}
+    for source, members in groups:
+        tree = trees[source]
+        destinations = flows.dst[members]
+        reached = np.isfinite(tree.dist[destinations])
+        flows.reason[members[~reached]] = NO_PATH
+        branched = reached & tree.branched[destinations]
+        for idx, dst in zip(members[branched].tolist(), destinations[branched].tolist()):
+            multi[idx] = tree.equal_cost_paths(source, dst)
+        plain = reached & ~branched
+        lengths, routed = _tree_paths(
+            (tree.first_node, tree.first_link, tree.hops), source, destinations[plain]
+        )
+        single.append((members[plain], lengths, routed))
+
+    counts = np.ones(n_flows, dtype=np.int64)
+    for idx, paths in multi.items():
+        counts[idx] = len(paths)
+    flow = np.repeat(np.arange(n_flows, dtype=np.int64), counts)
+    first_row = np.cumsum(counts) - counts
+
+    row_lengths = np.zeros(len(flow), dtype=np.int64)
+    members = np.concatenate([part[0] for part in single]) if single else np.zeros(0, dtype=np.int64)
+    lengths = np.concatenate([part[1] for part in single]) if single else np.zeros(0, dtype=np.int64)
+    row_lengths[first_row[members]] = lengths
+    for idx, paths in multi.items():
+        row_lengths[first_row[idx]:first_row[idx] + len(paths)] = [len(path) for path in paths]
+
+    indptr = np.zeros(len(flow) + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=indptr[1:])
+    links = np.empty(int(indptr[-1]), dtype=np.int64)
+    if lengths.sum():
+        grouped = np.concatenate([part[2] for part in single])
+        grouped_start = np.cumsum(lengths) - lengths
+        links[np.repeat(indptr[first_row[members]] - grouped_start, lengths) + np.arange(len(grouped))] = grouped
+    for idx, paths in multi.items():
+        for row, path in enumerate(paths, start=first_row[idx]):
+            links[indptr[row]:indptr[row + 1]] = path
+    return Routes(Incidence(indptr, links, n_links), flow, 1.0 / counts[flow], n_flows)
+
+
+def _vlan_groups(topology, flows):
+    """Routable flows grouped by the VLAN subgraph they are routed on.
+
+    Returns ``[(view, vlan, members)]``. Untagged flows, and flows on VLANs
+    every link carries, share the full topology with ``vlan`` None.
+    """
+    routable = np.flatnonzero(flows.reason == ROUTABLE)
+    spec_vlans = []
+    for spec in flows.specs:
+        vlan = vlan_id(spec[3])
+        spec_vlans.append(vlan if topology.vlan_view(vlan) is not topology else None)
+    keys = {}
+    spec_group = np.fromiter(
+        (keys.setdefault(vlan, len(keys)) for vlan in spec_vlans), dtype=np.int64, count=len(spec_vlans)
+    )
+    flow_group = spec_group[flows.spec[routable]]
+    groups = []
+    for vlan, group in keys.items():
+        members = routable[flow_group == group]
+        if len(members):
+            groups.append((topology.vlan_view(vlan), vlan, members))
+    return groups
+
+
+def _reject_unreachable(topology, flows, diagnostics=NO_DIAGNOSTICS):
+    """Mark routable flows whose ends lie in different components ``NO_PATH``.
+
+    Returns how many were marked.
+    """
+    routable = np.flatnonzero(flows.reason == ROUTABLE)
+    apart = routable[~topology.components().connected(flows.src[routable], flows.dst[routable])]
+    flows.reason[apart] = NO_PATH
+    diagnostics.count("flows_unreachable", len(apart))
+    return len(apart)
+
+
+def _route_on(topology, flows, metric, workers, cache_key, diagnostics=NO_DIAGNOSTICS):
+    groups = _source_groups(flows)
+    # Sources whose destinations are all out of reach then need no tree.
+    if len(groups) >= COMPONENT_MIN_SOURCES and _reject_unreachable(topology, flows, diagnostics):
+        groups = _source_groups(flows)
+    trees = source_trees(
+        topology,
+        [source for source, _ in groups],
+        metric,
+        workers=workers,
+        cache_key=cache_key,
+        diagnostics=diagnostics,
+    )
+    if metric == "hops":
+        return _route_hops(flows, groups, trees, topology.n_links)
+    return _route_weighted(flows, groups, trees, topology.n_links)
+
+
+def _route_vlans(topology, flows, groups, metric, workers, cache_key, diagnostics=NO_DIAGNOSTICS):
+    """Route each VLAN group on its own subgraph and stitch the rows in flow order."""
+    n_links = topology.n_links
+    routed = np.zeros(len(flows), dtype=bool)
+    incidences, row_flows, shares = [], [], []
+    for view, vlan, members in groups:
+        sub = flows.subset(members)
+        tree_key = cache_key
+        if cache_key is not None and vlan is not None:
+            tree_key = (*cache_key, "vlan", vlan)
+        sub_routes = _route_on(view, sub, metric, workers, tree_key, diagnostics)
+        flows.reason[members] = sub.reason
+        routed[members] = True
+        incidences.append(sub_routes.incidence)
+        row_flows.append(members[sub_routes.flow])
+        shares.append(sub_routes.share)
+
+    # Flows that were not routed keep one empty row each.
+    idle = np.flatnonzero(~routed)
+    incidences.append(Incidence(np.zeros(len(idle) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), n_links))
+    row_flows.append(idle)
+    shares.append(np.ones(len(idle)))
+
+    row_flow = np.concatenate(row_flows)
+    order = np.argsort(row_flow, kind="stable")
+    incidence = Incidence.concat(incidences, n_links).take(order)
+    return Routes(incidence, row_flow[order], np.concatenate(shares)[order], len(flows))
+
+
+def route_flows(topology, flows, metric="hops", workers=0, cache_key=None, diagnostics=NO_DIAGNOSTICS):
+    """Route every routable flow and return its ``Routes``.
+
+    One shortest-path tree is built (or taken from the cache) per distinct
+    source device and every destination of that source is read off it.
+    ``"hops"`` follows the BFS tree, one path per flow, exactly like
+    ``find_path``. ``"latency"`` and ``"bandwidth"`` weight links by
+    ``LatencyMs`` or inverse ``BandwidthMbps`` and split each flow evenly
+    over up to ``MAX_ECMP_PATHS`` equal-cost paths. Tagged flows are routed
+    on their VLAN's subgraph (``Topology.vlan_view``), with trees cached
+    per VLAN. Flows without a path have their reason set to ``NO_PATH`` and
+    an empty row; with enough sources, flows between components are found
+    from ``Topology.components`` before any tree is built.
+    """
+    if metric not in ROUTING_METRICS:
+        raise ValueError(f"Unknown routing metric: {metric}")
+
+    fingerprint = None
+    if cache_key is not None:
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (flows.src, flows.dst, flows.reason, flows.spec):
+            digest.update(part.tobytes())
+        digest.update(repr([spec[3] for spec in flows.specs]).encode())
+        fingerprint = digest.hexdigest()
+        cached = route_results.get((*cache_key, metric))
+        if cached is not None and cached[0] == fingerprint:
+            _, no_path, routes = cached
+            flows.reason[no_path] = NO_PATH
+            diagnostics.count("route_cache_hits")
+            return routes
+
+    groups = _vlan_groups(topology, flows)
+    if all(vlan is None for _, vlan, _ in groups):
+        routes = _route_on(topology, flows, metric, workers, cache_key, diagnostics)
+    else:
+        routes = _route_vlans(topology, flows, groups, metric, workers, cache_key, diagnostics)
+
+    if fingerprint is not None:
+        no_path = np.flatnonzero(flows.reason == NO_PATH)
+        route_results.set((*cache_key, metric), (fingerprint, no_path, routes), routes.nbytes + no_path.nbytes)
+    return routes
@@ -0,0 +1,185 @@
+import json
+
+import numpy as np
+
+from .engine import carried_rows
+from .firewall import evaluate_firewall
+from .routing import route_flows
+
+
+DEFAULT_STEP_MINUTES = 1
+DEFAULT_DURATION_HOURS = 24
+MAX_DURATION_HOURS = 7 * 24
+
+# Link x curve weight matrices are built in blocks of at most this many cells.
+WEIGHT_BLOCK_CELLS = 4_000_000
+
+
+def step_minutes_grid(step_minutes, duration_hours):
+    if step_minutes < 1 or 60 % step_minutes:
+        raise ValueError("step_minutes must divide 60")
+    if not 1 <= duration_hours <= MAX_DURATION_HOURS:
+        raise ValueError(f"duration_hours must be between 1 and {MAX_DURATION_HOURS}")
+    return np.arange(0, duration_hours * 60, step_minutes, dtype=float)
+
+
+def rate_curve(series, rate, minutes, period):
+    """Rate of one flow at each of ``minutes``.
+
+    ``rate_series`` is a list of rates spread evenly over the simulated
+    period and interpolated in between. ``diurnal`` is a daily cosine from
+    ``min_mbps`` up to ``max_mbps`` (default ``rate_mbps``) at ``peak_hour``.
+    Without either the flow stays at ``rate_mbps``. ``bursts`` add
+    ``rate_mbps`` for ``duration_minutes`` from ``start_minute`` on top.
+    """
+    try:
+        if series.get("rate_series"):
+            values = np.asarray(series["rate_series"], dtype=float)
+            samples = np.arange(len(values)) * (period / len(values))
+            curve = np.interp(minutes, samples, values, period=period)
+        elif series.get("diurnal"):
+            diurnal = series["diurnal"]
+            low = float(diurnal.get("min_mbps", 0))
+            high = float(diurnal.get("max_mbps", rate))
+            peak = float(diurnal.get("peak_hour", 12))
+            curve = low + (high - low) * (1 + np.cos(2 * np.pi * (minutes / 60 - peak) / 24)) / 2
+        else:
+            curve = np.full(len(minutes), rate)
+        for burst in series.get("bursts") or ():
+            offset = (minutes - float(burst["start_minute"])) % period
+            curve = curve + np.where(offset < float(burst["duration_minutes"]), float(burst["rate_mbps"]), 0.0)
+    except (KeyError, TypeError, ValueError, AttributeError) as exc:
+        raise ValueError(f"Invalid rate series {json.dumps(series)}: {exc}")
+    return np.maximum(curve, 0.0)
+
+
+def flow_curves(flows, minutes, period):
+    """The flow x time rate matrix in factored form.
+
+    Returns ``(curve_of, scale, curves)``: flow ``f`` sends
+    ``scale[f] * curves[curve_of[f]]``. Constant flows share curve 0 (all
+    ones) scaled by their rate, and identical series share one curve.
+    """
+    curve_of = np.zeros(len(flows), dtype=np.int64)
+    scale = np.array(flows.rate, dtype=float)
+    curves = [np.ones(len(minutes))]
+    index = {}
+    for idx, series in flows.series.items():
+        key = (json.dumps(series, sort_keys=True), float(flows.rate[idx]))
+        curve = index.get(key)
+        if curve is None:
+            curve = len(curves)
+            index[key] = curve
+            curves.append(rate_curve(series, flows.rate[idx], minutes, period))
+        curve_of[idx] = curve
+        scale[idx] = 1.0
+    return curve_of, scale, np.vstack(curves)
+
+
+def link_load(incidence, row_weight, row_curve, curves):
+    """Offered load per link and time step, ``links x steps``.
+
+    Row weights are summed per (link, curve) and the resulting matrix is
+    multiplied by the curves, in blocks of curves when there are many.
+    """
+    n_links = incidence.n_links
+    n_curves = len(curves)
+    load = np.zeros((n_links, curves.shape[1]))
+    entry_curve = row_curve[incidence.rows]
+    order = np.argsort(entry_curve, kind="stable")
+    sorted_curve = entry_curve[order]
+    block = max(1, WEIGHT_BLOCK_CELLS // max(n_links, 1))
+    for start in range(0, n_curves, block):
+        width = min(block, n_curves - start)
+        lo, hi = np.searchsorted(sorted_curve, [start, start + width])
+        entries = order[lo:hi]
+        if not len(entries):
+            continue
+        weights = np.bincount(
+            incidence.links[entries] * width + entry_curve[entries] - start,
+            weights=row_weight[incidence.rows[entries]],
+            minlength=n_links * width,
+        ).reshape(n_links, width)
+        load += weights @ curves[start:start + width]
+    return load
+
+
+def _hourly_mean(values, minutes):
+    hours = (minutes // 60).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+    counts = np.diff(np.r_[starts, len(minutes)])
+    return np.add.reduceat(values, starts, axis=-1) / counts
+
+
+def simulate_time_series(
+    system,
+    metric="hops",
+    step_minutes=DEFAULT_STEP_MINUTES,
+    duration_hours=DEFAULT_DURATION_HOURS,
+    include_series=True,
+    workers=0,
+    cache_key=None,
+):
+    """Per-link utilization over time for flows routed once on ``system``.
+
+    Paths and firewall decisions do not change over time, so every step is
+    evaluated at once from the factored rate matrix. Utilization is offered
+    load over capacity, as in a snapshot run. Without ``include_series``
+    only the peak-hour report is returned.
+    """
+    minutes = step_minutes_grid(step_minutes, duration_hours)
+    period = duration_hours * 60.0
+    topology = system.topology
+    flows = system.flows.copy()
+    curve_of, scale, curves = flow_curves(flows, minutes, period)
+
+    routes = route_flows(topology, flows, metric=metric, workers=workers, cache_key=cache_key)
+    row_blocked = evaluate_firewall(topology, flows, routes, system.firewall)
+    row_weight = np.where(carried_rows(flows, routes, row_blocked), routes.share * scale[routes.flow], 0.0)
+
+    capacity = np.maximum(topology.capacity, 1)
+    utilization = link_load(routes.incidence, row_weight, curve_of[routes.flow], curves) / capacity[:, None]
+    flow_weight = np.bincount(routes.flow, weights=row_weight, minlength=len(flows))
+    offered = np.bincount(curve_of, weights=flow_weight, minlength=len(curves)) @ curves
+
+    labels = topology.labels
+    hourly = _hourly_mean(utilization, minutes)
+    network_hourly = _hourly_mean(offered, minutes)
+    peaks = utilization.argmax(axis=1)
+    link_peaks = [
+        {
+            "from": labels[topology.link_src[link]],
+            "to": labels[topology.link_dst[link]],
+            "peak_utilization": round(float(utilization[link, peaks[link]]), 3),
+            "peak_minute": int(minutes[peaks[link]]),
+            "busiest_hour": int(hourly[link].argmax()),
+            "busiest_hour_utilization": round(float(hourly[link].max()), 3),
+            "overloaded_minutes": int((utilization[link] > 1).sum()) * step_minutes,
+        }
+        for link in range(topology.n_links)
+    ]
+    link_peaks.sort(key=lambda entry: -entry["peak_utilization"])
+
+    result = {
+        "step_minutes": step_minutes,
+        "steps": len(minutes),
+        "peak_hours": {
+            "network": {
+                "peak_hour": int(network_hourly.argmax()),
+                "peak_offered_mbps": round(float(network_hourly.max()), 3),
+                "hourly_offered_mbps": np.round(network_hourly, 3).tolist(),
+            },
+            "links": link_peaks,
+        },
+    }
+    if include_series:
+        result["links"] = [
+            {
+                "from": labels[topology.link_src[link]],
+                "to": labels[topology.link_dst[link]],
+                "capacity_mbps": float(topology.capacity[link]),
+                "utilization": np.round(utilization[link], 3).tolist(),
+            }
+            for link in range(topology.n_links)
+        ]
+    return result
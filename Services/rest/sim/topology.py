@@ -0,0 +1,266 @@
+import copy
+
+import numpy as np
+
+
+DEFAULT_LINK_BW = 1000.0
+DEFAULT_LINK_LATENCY = 1.0
+
+
+def _device_label(device):
+    return device.AssetId or device.AssetName or str(device.id)
+
+
+def _device_type(device):
+    if getattr(device, "DeviceType", None):
+        return str(device.DeviceType).lower()
+    extra = getattr(device, "AdditionalAsJson", None) or {}
+    return str(extra.get("deviceType") or extra.get("DeviceType") or "generic").lower()
+
+
+def _is_online(device):
+    return bool(getattr(device, "IsOnline", True))
+
+
+def _link_detail(conn, key):
+    details = getattr(conn, "ConnectionDetails", None)
+    if isinstance(details, dict) and details.get(key) is not None:
+        return float(details[key])
+    return None
+
+
+def vlan_id(value):
+    """VLAN number of a flow or rule field; None when untagged or unparseable."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _access_vlans(device):
+    vlans = getattr(device, "access_vlans", None)
+    if vlans is not None:
+        return vlans
+    ports = getattr(device, "ports", None)
+    if ports is None:
+        return frozenset()
+    return frozenset(
+        port.AccessVlan for port in ports.all() if not port.IsTrunk and port.AccessVlan is not None
+    )
+
+
+def _link_vlans(conn, access):
+    """VLANs a connection carries, or None for every VLAN.
+
+    An explicit ``AllowedVlans`` list wins, a trunk without one carries
+    everything, and an access link carries the access VLANs of its end
+    devices' ports (everything when neither end declares any).
+    """
+    allowed = getattr(conn, "AllowedVlans", None)
+    if allowed:
+        return frozenset(vlan for vlan in map(vlan_id, allowed) if vlan is not None)
+    if getattr(conn, "IsTrunk", False):
+        return None
+    return access or None
+
+
+def _traffic_rate(device, default=10):
+    extra = getattr(device, "AdditionalAsJson", None) or {}
+    return float(extra.get("TrafficRateMbps", default))
+
+
+def _union_find(n_devices, a, b):
+    """Root of every device after joining the pairs ``a[i]``, ``b[i]``.
+
+    Each round hooks the larger root of every edge under the smallest root
+    it touches, then compresses paths until every device points at its
+    root. Roots only ever decrease, so the forest stays acyclic, and each
+    round at least halves the number of components that still have an edge
+    leaving them.
+    """
+    parent = np.arange(n_devices, dtype=np.int64)
+    while len(a):
+        root_a = parent[a]
+        root_b = parent[b]
+        apart = root_a != root_b
+        if not apart.any():
+            break
+        low = np.minimum(root_a[apart], root_b[apart])
+        high = np.maximum(root_a[apart], root_b[apart])
+        np.minimum.at(parent, high, low)
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        # Edges inside one component never separate again.
+        a = a[apart]
+        b = b[apart]
+    return parent
+
+
+class ComponentIndex:
+    """Connected components of a topology's adjacency.
+
+    ``component[v]`` numbers the component of device ``v``, in order of each
+    component's lowest device index, and ``size`` holds the device count of
+    each component.
+    """
+
+    def __init__(self, topology):
+        _, origin, neighbors, _ = topology.adjacency()
+        roots = _union_find(topology.n_devices, origin, neighbors)
+        _, self.component = np.unique(roots, return_inverse=True)
+        self.size = np.bincount(self.component)
+        self.device_index = topology.device_index
+
+    @property
+    def n_components(self):
+        return len(self.size)
+
+    def connected(self, src, dst):
+        """Whether each ``src[i]`` can reach ``dst[i]``."""
+        return self.component[src] == self.component[dst]
+
+    def connected_ids(self, src_id, dst_id):
+        """Whether two devices, by primary key, lie in one component."""
+        src = self.device_index.get(src_id)
+        dst = self.device_index.get(dst_id)
+        return src is not None and dst is not None and self.component[src] == self.component[dst]
+
+
+class Topology:
+    """Array form of one system version.
+
+    Devices and connections are numbered by their position in the querysets,
+    so ``device_index`` / ``link_index`` map primary keys to array offsets and
+    every per-device or per-link quantity is a NumPy vector.
+    """
+
+    def __init__(self, devices, connections):
+        self.devices = list(devices)
+        self.connections = list(connections)
+
+        self.labels = [_device_label(device) for device in self.devices]
+        self.device_index = {device.id: idx for idx, device in enumerate(self.devices)}
+        self.label_index = {label: idx for idx, label in enumerate(self.labels)}
+        self.online = np.fromiter(
+            (_is_online(device) for device in self.devices), dtype=bool, count=len(self.devices)
+        )
+
+        n_links = len(self.connections)
+        self.link_ids = np.fromiter((conn.id for conn in self.connections), dtype=np.int64, count=n_links)
+        self.link_index = {conn.id: idx for idx, conn in enumerate(self.connections)}
+        self.link_src = np.fromiter(
+            (self.device_index[conn.Source_id] for conn in self.connections), dtype=np.int64, count=n_links
+        )
+        self.link_dst = np.fromiter(
+            (self.device_index[conn.Target_id] for conn in self.connections), dtype=np.int64, count=n_links
+        )
+        self.capacity = np.fromiter(
+            (conn.BandwidthMbps or DEFAULT_LINK_BW for conn in self.connections), dtype=float, count=n_links
+        )
+        self.latency = np.fromiter(
+            (conn.LatencyMs or DEFAULT_LINK_LATENCY for conn in self.connections), dtype=float, count=n_links
+        )
+        # Random link behaviour for Monte Carlo runs. ``failure`` is NaN where
+        # the link does not set its own failure probability.
+        self.error_rate = np.clip(
+            np.fromiter((conn.ErrorRate or 0.0 for conn in self.connections), dtype=float, count=n_links), 0, 1
+        )
+        self.jitter = np.fromiter(
+            (_link_detail(conn, "jitter_ms") or 0.0 for conn in self.connections), dtype=float, count=n_links
+        )
+        failure = [_link_detail(conn, "failure_probability") for conn in self.connections]
+        self.failure = np.array([np.nan if value is None else value for value in failure], dtype=float)
+
+        access = [_access_vlans(device) for device in self.devices]
+        self.link_vlans = [
+            _link_vlans(conn, access[src] | access[dst])
+            for conn, src, dst in zip(self.connections, self.link_src.tolist(), self.link_dst.tolist())
+        ]
+
+        self._adjacency = None
+        self._components = None
+        self._vlan_views = {}
+
+    def adjacency(self):
+        """Undirected adjacency in CSR form.
+
+        Returns ``(ptr, origin, neighbors, links)``: the neighbors of device
+        ``v`` are ``neighbors[ptr[v]:ptr[v + 1]]``, reached over the matching
+        ``links``; ``origin`` repeats ``v`` for each of its entries. Neighbors
+        keep connection order, like ``build_graph``.
+        """
+        if self._adjacency is None:
+            n_links = self.n_links
+            origin = np.empty(2 * n_links, dtype=np.int64)
+            origin[0::2] = self.link_src
+            origin[1::2] = self.link_dst
+            neighbor = np.empty(2 * n_links, dtype=np.int64)
+            neighbor[0::2] = self.link_dst
+            neighbor[1::2] = self.link_src
+            link = np.repeat(np.arange(n_links, dtype=np.int64), 2)
+            order = np.argsort(origin, kind="stable")
+            ptr = np.zeros(self.n_devices + 1, dtype=np.int64)
+            np.cumsum(np.bincount(origin, minlength=self.n_devices), out=ptr[1:])
+            self._adjacency = (ptr, origin[order], neighbor[order], link[order])
+        return self._adjacency
+
+    def components(self):
+        """``ComponentIndex`` of the adjacency, built on first use.
+
+        Copies from ``without_links`` (failed links, VLAN subgraphs) get
+        their own index.
+        """
+        if self._components is None:
+            self._components = ComponentIndex(self)
+        return self._components
+
+    def without_links(self, down):
+        """Shallow copy whose adjacency skips the links flagged in ``down``.
+
+        Link indices are unchanged, so paths found on the copy are valid for
+        the original topology.
+        """
+        ptr, origin, neighbors, links = self.adjacency()
+        keep = ~down[links]
+        origin = origin[keep]
+        reduced = copy.copy(self)
+        ptr = np.zeros(self.n_devices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origin, minlength=self.n_devices), out=ptr[1:])
+        reduced._adjacency = (ptr, origin, neighbors[keep], links[keep])
+        reduced._components = None
+        reduced._vlan_views = {}
+        return reduced
+
+    def vlan_view(self, vlan):
+        """Topology restricted to the links that carry ``vlan``.
+
+        Built once per VLAN and kept with the topology. Untagged traffic, and
+        VLANs every link carries, get the topology itself.
+        """
+        if vlan is None:
+            return self
+        view = self._vlan_views.get(vlan)
+        if view is None:
+            carries = np.fromiter(
+                (allowed is None or vlan in allowed for allowed in self.link_vlans), dtype=bool, count=self.n_links
+            )
+            view = self if carries.all() else self.without_links(~carries)
+            self._vlan_views[vlan] = view
+        return view
+
+    @property
+    def n_devices(self):
+        return len(self.devices)
+
+    @property
+    def n_links(self):
+        return len(self.connections)
+
+
+def compile_topology(devices, connections):
+    return Topology(devices, connections)
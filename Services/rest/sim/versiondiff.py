@@ -0,0 +1,427 @@
+import numpy as np
+
+from .allocation import allocate
+from .compiled import version_results
+from .engine import assemble_result, carried_rows, run_simulation
+from .firewall import evaluate_firewall
+from .flows import NO_PATH, ROUTABLE
+from .incidence import Incidence
+from .routing import EQUAL_COST_RTOL, WeightedTree, Routes, link_weights, route_flows, source_trees
+from .whatif import _sharing_rows
+
+
+# With more new or re-weighted links than this the new version is simulated
+# in full instead of being derived from the old one.
+MAX_ADDED_LINKS = 256
+
+
+def _occurrence(keys):
+    """Rank of each key among the equal keys before it."""
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    starts = np.r_[True, ordered[1:] != ordered[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(len(keys)), 0))
+    rank = np.empty(len(keys), dtype=np.int64)
+    rank[order] = np.arange(len(keys)) - group_start
+    return rank
+
+
+def _pair(old_keys, new_keys):
+    """Position in ``new_keys`` of every entry of ``old_keys``, or -1.
+
+    Equal keys pair up in order of appearance. Negative old keys never match.
+    """
+    keys = np.concatenate([old_keys, new_keys])
+    ranks = np.concatenate([_occurrence(old_keys), _occurrence(new_keys)])
+    order = np.lexsort((ranks, keys))
+    keys = keys[order]
+    ranks = ranks[order]
+    # Within a (key, rank) pair the old entry sorts first.
+    pairs = np.flatnonzero((keys[1:] == keys[:-1]) & (ranks[1:] == ranks[:-1]) & (keys[1:] >= 0))
+    out = np.full(len(old_keys), -1, dtype=np.int64)
+    out[order[pairs]] = order[pairs + 1] - len(old_keys)
+    return out
+
+
+def _distances(tree):
+    if isinstance(tree, WeightedTree):
+        return tree.dist
+    depth = tree[2]
+    return np.where(depth >= 0, depth, np.inf)
+
+
+class VersionDiff:
+    """The result of a new version derived from a result of an older one.
+
+    Devices are matched by label, links by their end devices and flows by
+    endpoints, protocol, ports and VLAN. Flows whose old paths still exist
+    unchanged keep them unless a new or re-weighted link offers one no
+    longer; only the other flows are routed. Firewall checks are redone for those flows and for
+    flows crossing devices whose rules changed, and bandwidth is re-allocated
+    for the flows sharing links, directly or transitively, with any change.
+    When too many links are new the new version is simulated in full.
+    """
+
+    def __init__(
+        self, old_system, baseline, system, metric="hops", allocation="max_min", workers=0, cache_key=None
+    ):
+        self.baseline = baseline
+        self.old_firewall = old_system.firewall
+        self.topology = system.topology
+        self.firewall = system.firewall
+        self.metric = metric
+        self.allocation = allocation
+        old = baseline.topology
+        topology = self.topology
+
+        self.device_map = np.fromiter(
+            (topology.label_index.get(label, -1) for label in old.labels), dtype=np.int64, count=old.n_devices
+        )
+        self.link_map = _pair(self._old_link_keys(), topology.link_src * topology.n_devices + topology.link_dst)
+        self.flow_map = _pair(*self._flow_keys(system.flows))
+        self.old_of_new = np.full(len(system.flows), -1, dtype=np.int64)
+        matched = np.flatnonzero(self.flow_map >= 0)
+        self.old_of_new[self.flow_map[matched]] = matched
+
+        old_links = np.flatnonzero(self.link_map >= 0)
+        new_links = self.link_map[old_links]
+        same_route = (link_weights(old, metric)[old_links] == link_weights(topology, metric)[new_links]) & np.fromiter(
+            (old.link_vlans[a] == topology.link_vlans[b] for a, b in zip(old_links.tolist(), new_links.tolist())),
+            dtype=bool,
+            count=len(old_links),
+        )
+        # Old links that routing can still use as they were, by new index.
+        self.route_map = np.full(old.n_links, -1, dtype=np.int64)
+        self.route_map[old_links[same_route]] = new_links[same_route]
+        self.added_links = np.ones(topology.n_links, dtype=bool)
+        self.added_links[new_links[same_route]] = False
+        self.capacity_changed = np.zeros(topology.n_links, dtype=bool)
+        self.capacity_changed[new_links] = old.capacity[old_links] != topology.capacity[new_links]
+
+        self.incremental = self.added_links.sum() <= MAX_ADDED_LINKS
+        if self.incremental:
+            self._derive(system, workers, cache_key)
+        else:
+            self.current = run_simulation(
+                topology, system.flows.copy(), self.firewall, metric=metric, allocation=allocation,
+                workers=workers, cache_key=cache_key,
+            )
+            self.touched = np.ones(len(system.flows), dtype=bool)
+            self.rerouted = int((self.current.flows.reason == ROUTABLE).sum())
+            self.reallocated = self.rerouted
+
+    def _old_link_keys(self):
+        old = self.baseline.topology
+        src = self.device_map[old.link_src]
+        dst = self.device_map[old.link_dst]
+        keys = src * self.topology.n_devices + dst
+        return np.where((src >= 0) & (dst >= 0), keys, -1 - np.arange(old.n_links))
+
+    def _flow_keys(self, flows):
+        old_flows = self.baseline.flows
+        n_devices = self.topology.n_devices + 1
+        # Spec -1 (flows that were never routable) maps to 0.
+        specs = {spec: idx + 1 for idx, spec in enumerate(flows.specs)}
+        old_spec = np.fromiter(
+            (specs.get(spec, -1) for spec in old_flows.specs), dtype=np.int64, count=len(old_flows.specs)
+        )
+        old_spec = np.r_[old_spec, 0]
+        n_specs = len(flows.specs) + 1
+
+        src = self.device_map[old_flows.src]
+        dst = np.where(old_flows.dst >= 0, self.device_map[np.maximum(old_flows.dst, 0)], -1)
+        spec = old_spec[old_flows.spec]
+        gone = (src < 0) | ((old_flows.dst >= 0) & (dst < 0)) | (spec < 0)
+        old_keys = (src * n_devices + dst + 1) * n_specs + spec
+        old_keys = np.where(gone, -1 - np.arange(len(old_flows)), old_keys)
+        new_keys = (flows.src * n_devices + flows.dst + 1) * n_specs + flows.spec + 1
+        return old_keys, new_keys
+
+    def _firewall_changed(self):
+        """New devices whose deny rules differ from the same device's old rules."""
+        old = self.baseline.topology
+        old_tables = self.old_firewall.tables
+        tables = self.firewall.tables
+        changed = np.zeros(self.topology.n_devices, dtype=bool)
+        for device, table in tables.items():
+            before = old.label_index.get(self.topology.labels[device])
+            if before is None or old_tables.get(before) != table:
+                changed[device] = True
+        for before in old_tables:
+            device = self.device_map[before]
+            if device >= 0 and device not in tables:
+                changed[device] = True
+        return changed
+
+    def _improved(self, flows, kept, cost, cache_key):
+        """Kept flows to which a new or re-weighted link offers a path no longer than theirs."""
+        topology = self.topology
+        added = np.flatnonzero(self.added_links)
+        improved = np.zeros(len(kept), dtype=bool)
+        if not len(added) or not len(kept):
+            return improved
+        weights = link_weights(topology, self.metric)
+        ends = np.unique(np.concatenate([topology.link_src[added], topology.link_dst[added]]))
+        trees = source_trees(topology, ends.tolist(), self.metric, cache_key=cache_key)
+        src = flows.src[kept]
+        dst = flows.dst[kept]
+        bound = cost + EQUAL_COST_RTOL * np.maximum(cost, 1.0)
+        for link in added.tolist():
+            # Distances on the full graph bound those on any VLAN subgraph
+            # from below, so tagged flows are re-routed conservatively.
+            a = _distances(trees[int(topology.link_src[link])])
+            b = _distances(trees[int(topology.link_dst[link])])
+            via = np.minimum(a[src] + b[dst], b[src] + a[dst]) + weights[link]
+            improved |= np.isfinite(via) & (via <= bound)
+        return improved
+
+    def _derive(self, system, workers, cache_key):
+        baseline = self.baseline
+        old = baseline.topology
+        topology = self.topology
+        flows = system.flows.copy()
+        old_flows = baseline.flows
+        old_routes = baseline.routes
+        old_incidence = old_routes.incidence
+        n_links = topology.n_links
+
+        # Matched flows whose old rows only use links routing sees unchanged.
+        broken = np.zeros(old_incidence.n_rows, dtype=bool)
+        broken[old_incidence.rows[self.route_map[old_incidence.links] < 0]] = True
+        broken_flow = np.bincount(old_routes.flow, weights=broken, minlength=len(old_flows)) > 0
+        matched = np.flatnonzero(self.old_of_new >= 0)
+        before = self.old_of_new[matched]
+        old_reason = old_flows.reason[before]
+        keep = (
+            (flows.reason[matched] == ROUTABLE)
+            & ((old_reason == ROUTABLE) | (old_reason == NO_PATH))
+            & ~broken_flow[before]
+        )
+        kept = matched[keep]
+        kept_old = before[keep]
+        row_cost = old_incidence.row_sum(link_weights(old, self.metric)[old_incidence.links])
+        cost = np.where(
+            old_flows.reason[kept_old] == ROUTABLE, row_cost[old_routes.primary[kept_old]], np.inf
+        )
+        improved = self._improved(flows, kept, cost, cache_key)
+        kept = kept[~improved]
+        kept_old = kept_old[~improved]
+        flows.reason[kept] = old_flows.reason[kept_old]
+
+        is_kept = np.zeros(len(flows), dtype=bool)
+        is_kept[kept] = True
+        rerouted = np.flatnonzero((flows.reason == ROUTABLE) & ~is_kept)
+        idle = np.flatnonzero((flows.reason != ROUTABLE) & ~is_kept)
+        sub = flows.subset(rerouted)
+        sub_routes = route_flows(topology, sub, metric=self.metric, workers=workers)
+        flows.reason[rerouted] = sub.reason
+
+        # Rows: kept old rows on new link indices, new rows, and one empty
+        # row per flow that is not routed.
+        old_kept = np.zeros(len(old_flows), dtype=bool)
+        old_kept[kept_old] = True
+        kept_rows = np.flatnonzero(old_kept[old_routes.flow])
+        moved = old_incidence.take(kept_rows)
+        moved = Incidence(moved.indptr, self.route_map[moved.links], n_links)
+        empty = Incidence(np.zeros(len(idle) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), n_links)
+        row_flow = np.concatenate(
+            [self.flow_map[old_routes.flow[kept_rows]], rerouted[sub_routes.flow], idle]
+        )
+        order = np.argsort(row_flow, kind="stable")
+        incidence = Incidence.concat([moved, sub_routes.incidence, empty], n_links).take(order)
+        share = np.concatenate([old_routes.share[kept_rows], sub_routes.share, np.ones(len(idle))])[order]
+        routes = Routes(incidence, row_flow[order], share, len(flows))
+
+        old_blocked = baseline.row_blocked[kept_rows]
+        old_blocked = np.where(old_blocked >= 0, self.device_map[np.maximum(old_blocked, 0)], -1)
+        row_blocked = np.concatenate(
+            [old_blocked, np.full(sub_routes.incidence.n_rows, -1, dtype=np.int64), np.full(len(idle), -1, dtype=np.int64)]
+        )[order]
+        row_achieved = np.concatenate(
+            [baseline.row_achieved[kept_rows], np.zeros(sub_routes.incidence.n_rows), np.zeros(len(idle))]
+        )[order]
+
+        # Firewall checks for new rows and for kept rows through devices whose rules changed.
+        fw_changed = self._firewall_changed()
+        hop_changed = fw_changed[topology.link_src[incidence.links]] | fw_changed[topology.link_dst[incidence.links]]
+        checked = np.zeros(len(flows), dtype=bool)
+        checked[rerouted] = True
+        checked[routes.flow[incidence.rows[hop_changed]]] = True
+        checked_flows = np.flatnonzero(checked)
+        if len(checked_flows):
+            rows = np.flatnonzero(checked[routes.flow])
+            local = np.full(len(flows), -1, dtype=np.int64)
+            local[checked_flows] = np.arange(len(checked_flows))
+            checked_routes = Routes(
+                incidence.take(rows), local[routes.flow[rows]], routes.share[rows], len(checked_flows)
+            )
+            row_blocked[rows] = evaluate_firewall(
+                topology, flows.subset(checked_flows), checked_routes, self.firewall
+            )
+
+        # Re-allocate everything connected to a changed row or link.
+        changed = checked.copy()
+        changed[kept] |= flows.rate[kept] != old_flows.rate[kept_old]
+        if self.allocation == "sequential":
+            # Sequential admission follows flow order; flows that moved ahead
+            # of an earlier flow are treated as changed.
+            by_old = kept[np.argsort(kept_old, kind="stable")]
+            changed[by_old[by_old < np.maximum.accumulate(by_old)]] = True
+        carried = carried_rows(flows, routes, row_blocked)
+        # Kept rows that a rule change now blocks, or no longer blocks, take
+        # their load off or put it on their links.
+        was_carried = np.concatenate(
+            [
+                carried_rows(old_flows, old_routes, baseline.row_blocked)[kept_rows],
+                np.zeros(sub_routes.incidence.n_rows + len(idle), dtype=bool),
+            ]
+        )[order]
+        flipped = is_kept[routes.flow] & (was_carried != carried)
+        seed = (changed[routes.flow] | flipped) & carried
+        freed = self.capacity_changed.copy()
+        freed[incidence.links[flipped[incidence.rows]]] = True
+        gone_rows = ~old_kept[old_routes.flow]
+        gone_links = self.link_map[old_incidence.links[gone_rows[old_incidence.rows]]]
+        freed[gone_links[gone_links >= 0]] = True
+        seed[incidence.rows[freed[incidence.links] & carried[incidence.rows]]] = True
+        component = np.flatnonzero(_sharing_rows(incidence, carried, seed))
+
+        row_rate = flows.rate[routes.flow] * routes.share
+        row_achieved[~carried] = 0.0
+        row_achieved[component] = allocate(
+            incidence.take(component),
+            row_rate[component],
+            topology.capacity,
+            np.ones(len(component), dtype=bool),
+            self.allocation,
+        )
+
+        self.current = assemble_result(topology, flows, routes, row_blocked, row_achieved)
+        # Other flows can only differ in numbers, which diff() compares directly.
+        self.touched = checked
+        self.rerouted = len(rerouted)
+        self.reallocated = len(np.unique(routes.flow[component]))
+
+    def _flow_change(self, before, after):
+        change = {"before": before, "after": after}
+        if "achieved_mbps" in before and "achieved_mbps" in after:
+            change["achieved_mbps_delta"] = round(after["achieved_mbps"] - before["achieved_mbps"], 3)
+            change["latency_ms_delta"] = round(after["latency_ms"] - before["latency_ms"], 3)
+        return change
+
+    def diff(self):
+        """Flows and links whose output differs between the versions."""
+        base = self.baseline
+        current = self.current
+        old = base.topology
+        topology = self.topology
+
+        new_flows = np.flatnonzero(self.old_of_new >= 0)
+        old_flows = self.old_of_new[new_flows]
+        old_blocked = np.where(base.blocked_by >= 0, self.device_map[np.maximum(base.blocked_by, 0)], -1)
+        candidates = (
+            self.touched[new_flows]
+            | (base.flows.reason[old_flows] != current.flows.reason[new_flows])
+            | (base.flows.rate[old_flows] != current.flows.rate[new_flows])
+            | (old_blocked[old_flows] != current.blocked_by[new_flows])
+            | (np.round(base.achieved[old_flows], 3) != np.round(current.achieved[new_flows], 3))
+            | (np.round(base.latency[old_flows], 3) != np.round(current.latency[new_flows], 3))
+        )
+        changed = []
+        for idx, before_idx in zip(new_flows[candidates].tolist(), old_flows[candidates].tolist()):
+            before = base.flow_record(before_idx)
+            after = current.flow_record(idx)
+            if before != after:
+                changed.append(self._flow_change(before, after))
+        added = [{"after": current.flow_record(idx)} for idx in np.flatnonzero(self.old_of_new < 0).tolist()]
+        removed = [{"before": base.flow_record(idx)} for idx in np.flatnonzero(self.flow_map < 0).tolist()]
+
+        old_links = np.flatnonzero(self.link_map >= 0)
+        new_links = self.link_map[old_links]
+        differs = (
+            (old.capacity[old_links] != topology.capacity[new_links])
+            | (old.latency[old_links] != topology.latency[new_links])
+            | (np.round(base.utilization[old_links], 3) != np.round(current.utilization[new_links], 3))
+        )
+        link_changes = []
+        for before_link, link in zip(old_links[differs].tolist(), new_links[differs].tolist()):
+            before = base.link_record(before_link)
+            after = current.link_record(link)
+            link_changes.append(
+                {
+                    "from": after["from"],
+                    "to": after["to"],
+                    "capacity_mbps_before": before["capacity_mbps"],
+                    "capacity_mbps_after": after["capacity_mbps"],
+                    "latency_ms_before": float(old.latency[before_link]),
+                    "latency_ms_after": float(topology.latency[link]),
+                    "utilization_before": before["utilization"],
+                    "utilization_after": after["utilization"],
+                }
+            )
+        matched_links = np.zeros(topology.n_links, dtype=bool)
+        matched_links[new_links] = True
+
+        new_devices = np.zeros(topology.n_devices, dtype=bool)
+        new_devices[self.device_map[self.device_map >= 0]] = True
+        lost = sum(
+            1 for change in changed if change["before"]["status"] == "ok" and change["after"]["status"] != "ok"
+        )
+        slower = sum(
+            1
+            for change in changed
+            if change.get("achieved_mbps_delta", 0) < 0 or change.get("latency_ms_delta", 0) > 0
+        )
+        return {
+            "incremental": bool(self.incremental),
+            "rerouted_flows": self.rerouted,
+            "reallocated_flows": self.reallocated,
+            "summary": {
+                "flows_changed": len(changed),
+                "flows_added": len(added),
+                "flows_removed": len(removed),
+                "flows_slower": slower,
+                "flows_lost": lost,
+                "links_changed": len(link_changes),
+            },
+            "devices": {
+                "added": [topology.labels[idx] for idx in np.flatnonzero(~new_devices).tolist()],
+                "removed": [old.labels[idx] for idx in np.flatnonzero(self.device_map < 0).tolist()],
+            },
+            "flows": {"changed": changed, "added": added, "removed": removed},
+            "links": {
+                "changed": link_changes,
+                "added": [current.link_record(link) for link in np.flatnonzero(~matched_links).tolist()],
+                "removed": [base.link_record(link) for link in np.flatnonzero(self.link_map < 0).tolist()],
+            },
+        }
+
+
+def version_result(system, metric, allocation, workers=0, cache_key=None):
+    """Full result of a compiled version, kept in ``version_results`` per metric and allocation."""
+    key = None if cache_key is None else (*cache_key, metric, allocation)
+    result = version_results.get(key) if key is not None else None
+    if result is None:
+        result = run_simulation(
+            system.topology, system.flows.copy(), system.firewall, metric=metric, allocation=allocation,
+            workers=workers, cache_key=cache_key,
+        )
+        if key is not None:
+            version_results.set(key, result, result.routes.nbytes + 64 * len(result.flows))
+    return result
+
+
+def diff_versions(old_system, system, metric="hops", allocation="max_min", workers=0, old_key=None, cache_key=None):
+    """Diff of the results of two compiled versions; see ``VersionDiff``.
+
+    The old version's result comes from ``version_results`` when possible,
+    and the derived result of the new version is stored there too.
+    """
+    baseline = version_result(old_system, metric, allocation, workers, old_key)
+    versions = VersionDiff(old_system, baseline, system, metric, allocation, workers, cache_key)
+    if cache_key is not None and version_results.get((*cache_key, metric, allocation)) is None:
+        current = versions.current
+        version_results.set(
+            (*cache_key, metric, allocation), current, current.routes.nbytes + 64 * len(current.flows)
+        )
+    return versions.diff()
@@ -0,0 +1,268 @@
+import threading
+import uuid
+
+import numpy as np
+
+from .allocation import allocate
+from .cache import LRUCache
+from .engine import assemble_result, carried_rows, run_simulation
+from .firewall import evaluate_firewall
+from .flows import DESTINATION_OFFLINE, NO_PATH, ROUTABLE, SOURCE_OFFLINE
+from .incidence import Incidence
+from .routing import Routes, route_flows
+
+
+CHANGE_TYPES = ("device_down", "link_down", "rate")
+
+# Open what-if sessions per process; the least recently used one is dropped.
+WHAT_IF_SESSIONS = 64
+
+scenarios = LRUCache(WHAT_IF_SESSIONS)
+
+
+def _sharing_rows(incidence, carried, rows):
+    """Grow ``rows`` to every carried row linked to it through shared links."""
+    links = np.zeros(incidence.n_links, dtype=bool)
+    entry_carried = carried[incidence.rows]
+    while True:
+        links[incidence.links[rows[incidence.rows]]] = True
+        hit = np.zeros(incidence.n_rows, dtype=bool)
+        hit[incidence.rows[entry_carried & links[incidence.links]]] = True
+        if not (hit & ~rows).any():
+            return rows
+        rows |= hit
+
+
+class Scenario:
+    """A baseline simulation plus cumulative what-if changes.
+
+    A change only redoes the expensive stages for what it touches. Flows
+    whose paths cross a failed device or link are re-routed on the remaining
+    graph and re-checked against the firewall. Bandwidth is re-allocated for
+    the flows sharing links, directly or transitively, with a changed flow;
+    other flows cannot see the change under either allocation model.
+    """
+
+    def __init__(
+        self, system, metric="hops", allocation="max_min", owner=None, cache_key=None, baseline=None
+    ):
+        self.topology = system.topology
+        self.firewall = system.firewall
+        self.metric = metric
+        self.allocation = allocation
+        self.owner = owner
+        self.lock = threading.Lock()
+        if baseline is None:
+            baseline = run_simulation(
+                self.topology,
+                system.flows.copy(),
+                self.firewall,
+                metric=metric,
+                allocation=allocation,
+                cache_key=cache_key,
+            )
+        self.baseline = baseline
+        self.reset()
+
+    def reset(self):
+        self.current = self.baseline
+        self.flows = self.baseline.flows.copy()
+        self.device_down = np.zeros(self.topology.n_devices, dtype=bool)
+        self.link_down = np.zeros(self.topology.n_links, dtype=bool)
+        self.rerouted = np.zeros(len(self.flows), dtype=bool)
+        self.changes = []
+
+    def _device(self, name):
+        topology = self.topology
+        idx = topology.label_index.get(name)
+        if idx is None:
+            idx = topology.device_index.get(name)
+        if idx is None:
+            raise ValueError(f"Unknown device: {name}")
+        return idx
+
+    def _links(self, change):
+        topology = self.topology
+        if change.get("link_id") is not None:
+            idx = topology.link_index.get(change["link_id"])
+            if idx is None:
+                raise ValueError(f"Unknown link: {change['link_id']}")
+            return np.array([idx])
+        a = self._device(change.get("from"))
+        b = self._device(change.get("to"))
+        links = np.flatnonzero(
+            ((topology.link_src == a) & (topology.link_dst == b))
+            | ((topology.link_src == b) & (topology.link_dst == a))
+        )
+        if not len(links):
+            raise ValueError(f"No link between {change.get('from')} and {change.get('to')}")
+        return links
+
+    def _rate_flows(self, change):
+        selected = self.flows.src == self._device(change.get("source"))
+        if change.get("destination") is not None:
+            selected &= self.flows.dst == self._device(change["destination"])
+        return selected
+
+    def _parse(self, changes):
+        failed = np.zeros(self.topology.n_devices, dtype=bool)
+        dead = np.zeros(self.topology.n_links, dtype=bool)
+        rates = []
+        for change in changes:
+            kind = change.get("type")
+            if kind == "device_down":
+                failed[self._device(change.get("device"))] = True
+            elif kind == "link_down":
+                dead[self._links(change)] = True
+            elif kind == "rate":
+                try:
+                    rate = float(change.get("rate_mbps"))
+                except (TypeError, ValueError):
+                    raise ValueError("rate changes need a numeric rate_mbps")
+                if rate < 0:
+                    raise ValueError("rate_mbps must not be negative")
+                rates.append((self._rate_flows(change), rate))
+            else:
+                raise ValueError(f"Change type must be one of {', '.join(CHANGE_TYPES)}")
+        return failed, dead, rates
+
+    def apply(self, changes):
+        """Apply ``changes`` on top of the current state.
+
+        Every change is validated before any is applied. Returns the number
+        of flows re-routed and re-allocated.
+        """
+        counts = self.update(*self._parse(changes))
+        self.changes.extend(changes)
+        return counts
+
+    def update(self, failed, dead, rates=()):
+        """Fail the devices and links flagged in ``failed`` / ``dead`` and set rates.
+
+        ``rates`` holds ``(flow mask, rate)`` pairs. A failed device takes its
+        flows down and, unlike an offline device in a stored version, is no
+        longer used as transit.
+        """
+        failed = failed.copy()
+        dead = dead.copy()
+        topology = self.topology
+        flows = self.flows
+        current = self.current
+        routes = current.routes
+        incidence = routes.incidence
+
+        failed &= ~self.device_down
+        dead |= failed[topology.link_src] | failed[topology.link_dst]
+        dead &= ~self.link_down
+        self.device_down |= failed
+        self.link_down |= dead
+
+        rate_changed = np.zeros(len(flows), dtype=bool)
+        for selected, rate in rates:
+            flows.rate[selected] = rate
+            rate_changed |= selected
+
+        # Flows from or to a failed device go down with it; like collect_flows,
+        # a down source takes precedence over any destination problem.
+        source_down = np.flatnonzero((flows.reason != SOURCE_OFFLINE) & failed[flows.src])
+        live = (flows.reason == ROUTABLE) | (flows.reason == NO_PATH)
+        destination_down = np.flatnonzero(live & ~failed[flows.src] & (flows.dst >= 0) & failed[flows.dst])
+        for idx in source_down.tolist():
+            if flows.dst[idx] >= 0:
+                flows.dst_name[idx] = topology.labels[flows.dst[idx]]
+        flows.reason[source_down] = SOURCE_OFFLINE
+        flows.reason[destination_down] = DESTINATION_OFFLINE
+
+        # Flows that lose a link on any of their paths are routed again.
+        replaced = np.zeros(len(flows), dtype=bool)
+        replaced[routes.flow[incidence.rows[dead[incidence.links]]]] = True
+        replaced[source_down] = True
+        replaced[destination_down] = True
+        replaced_idx = np.flatnonzero(replaced)
+        sub = flows.subset(replaced_idx)
+        sub_routes = route_flows(topology.without_links(self.link_down), sub, metric=self.metric)
+        sub_blocked = evaluate_firewall(topology, sub, sub_routes, self.firewall)
+        flows.reason[replaced_idx] = sub.reason
+
+        # Splice the new rows in place of the replaced flows' rows.
+        removed_rows = replaced[routes.flow]
+        kept = np.flatnonzero(~removed_rows)
+        row_flow = np.concatenate([routes.flow[kept], replaced_idx[sub_routes.flow]])
+        order = np.argsort(row_flow, kind="stable")
+        new_incidence = Incidence.concat([incidence.take(kept), sub_routes.incidence], topology.n_links).take(order)
+        share = np.concatenate([routes.share[kept], sub_routes.share])[order]
+        new_routes = Routes(new_incidence, row_flow[order], share, len(flows))
+        row_blocked = np.concatenate([current.row_blocked[kept], sub_blocked])[order]
+        row_achieved = np.concatenate([current.row_achieved[kept], np.zeros(sub_routes.incidence.n_rows)])[order]
+        changed = np.concatenate([np.zeros(len(kept), dtype=bool), np.ones(sub_routes.incidence.n_rows, dtype=bool)])
+        changed = changed[order] | rate_changed[new_routes.flow]
+
+        # Links freed by removed rows are shared with new rows via the seed.
+        carried = carried_rows(flows, new_routes, row_blocked)
+        seed = changed & carried
+        freed = np.zeros(topology.n_links, dtype=bool)
+        freed[incidence.links[removed_rows[incidence.rows]]] = True
+        seed[new_incidence.rows[freed[new_incidence.links] & carried[new_incidence.rows]]] = True
+        component = np.flatnonzero(_sharing_rows(new_incidence, carried, seed))
+
+        row_rate = flows.rate[new_routes.flow] * new_routes.share
+        row_achieved[~carried] = 0.0
+        row_achieved[component] = allocate(
+            new_incidence.take(component),
+            row_rate[component],
+            topology.capacity,
+            np.ones(len(component), dtype=bool),
+            self.allocation,
+        )
+
+        self.current = assemble_result(topology, flows, new_routes, row_blocked, row_achieved)
+        self.rerouted |= replaced
+        return int(replaced.sum()), len(np.unique(new_routes.flow[component]))
+
+    def diff(self):
+        """Flows and links whose output differs from the baseline."""
+        base = self.baseline
+        current = self.current
+        candidates = (
+            self.rerouted
+            | (base.flows.reason != current.flows.reason)
+            | (base.flows.rate != current.flows.rate)
+            | (base.blocked_by != current.blocked_by)
+            | (np.round(base.achieved, 3) != np.round(current.achieved, 3))
+        )
+        flow_changes = []
+        for idx in np.flatnonzero(candidates).tolist():
+            before = base.flow_record(idx)
+            after = current.flow_record(idx)
+            if before != after:
+                flow_changes.append({"before": before, "after": after})
+
+        labels = self.topology.labels
+        link_changes = [
+            {
+                "from": labels[self.topology.link_src[link]],
+                "to": labels[self.topology.link_dst[link]],
+                "down": bool(self.link_down[link]),
+                "utilization_before": round(float(base.utilization[link]), 3),
+                "utilization_after": round(float(current.utilization[link]), 3),
+            }
+            for link in np.flatnonzero(
+                self.link_down | (np.round(base.utilization, 3) != np.round(current.utilization, 3))
+            ).tolist()
+        ]
+        return {"changes": self.changes, "flows": flow_changes, "links": link_changes}
+
+
+def open_scenario(system, metric="hops", allocation="max_min", owner=None, cache_key=None):
+    scenario = Scenario(system, metric=metric, allocation=allocation, owner=owner, cache_key=cache_key)
+    session_id = uuid.uuid4().hex
+    scenarios.set(session_id, scenario)
+    return session_id, scenario
+
+
+def get_scenario(session_id):
+    return scenarios.get(session_id)
+
+
+def close_scenario(session_id):
+    scenarios.discard(lambda key: key == session_id)
@@ -1,253 +1,319 @@
-from collections import deque, defaultdict
-
-
-DEFAULT_LINK_BW = 1000.0
-DEFAULT_LINK_LATENCY = 1.0
-
-
-def _device_label(device):
-    return device.AssetId or device.AssetName or str(device.id)
-
-
-def _device_type(device):
-    if getattr(device, "DeviceType", None):
-        return str(device.DeviceType).lower()
-    extra = getattr(device, "AdditionalAsJson", None) or {}
-    return str(extra.get("deviceType") or extra.get("DeviceType") or "generic").lower()
-
-
-def _is_online(device):
-    return bool(getattr(device, "IsOnline", True))
-
-
-def _traffic_rate(device, default=10):
-    extra = getattr(device, "AdditionalAsJson", None) or {}
-    return float(extra.get("TrafficRateMbps", default))
-
-def build_graph(connections):
-    graph = defaultdict(list)
-    for conn in connections:
-        graph[conn.Source_id].append((conn.Target_id, conn))
-        graph[conn.Target_id].append((conn.Source_id, conn))
-    return graph
-
-
-def find_path(graph, src_id, dst_id):
-    if src_id == dst_id:
-        return []
-    queue = deque([src_id])
-    prev = {src_id: None}
-    prev_conn = {}
-    while queue:
-        current = queue.popleft()
-        for neighbor_id, conn in graph.get(current, []):
-            if neighbor_id in prev:
-                continue
-            prev[neighbor_id] = current
-            prev_conn[neighbor_id] = conn
-            if neighbor_id == dst_id:
-                queue.clear()
-                break
-            queue.append(neighbor_id)
-    if dst_id not in prev:
-        return None
-    path = []
-    step = dst_id
-    while prev[step] is not None:
-        path.append(prev_conn[step])
-        step = prev[step]
-    path.reverse()
-    return path
-
-
-def compute_simulation(devices, connections, traffic_profiles, firewall_rules):
-    device_by_id = {device.id: device for device in devices}
-    device_by_label = {_device_label(device): device for device in devices}
-    graph = build_graph(connections)
-    link_utilization = defaultdict(float)
-    flows_out = []
-    profiles = list(traffic_profiles)
-
-    firewall_by_device = defaultdict(list)
-    for rule in firewall_rules:
-        firewall_by_device[rule.Device_id].append(rule)
-
-    def rule_matches(rule, flow):
-        if rule.Protocol and rule.Protocol.lower() != flow["protocol"].lower():
-            return False
-        if rule.Src and rule.Src not in {flow["src_label"], flow["src_id"]}:
-            return False
-        if rule.Dst and rule.Dst not in {flow["dst_label"], flow["dst_id"]}:
-            return False
-        if rule.SrcPort and rule.SrcPort != flow.get("src_port"):
-            return False
-        if rule.DstPort and rule.DstPort != flow.get("dst_port"):
-            return False
-        if rule.Vlan and rule.Vlan != flow.get("vlan"):
-            return False
-        return True
-
-    if not profiles:
-        host_devices = [d for d in devices if _device_type(d) == "host"]
-        for src in host_devices:
-            if not _is_online(src):
-                continue
-            for dst in host_devices:
-                if src.id == dst.id or not _is_online(dst):
-                    continue
-                profiles.append(
-                    type("Profile", (), {
-                        "Device": src,
-                        "Profile": {
-                            "flows": [
-                                {
-                                    "to": _device_label(dst),
-                                    "protocol": "tcp",
-                                    "dst_port": 443,
-                                    "rate_mbps": _traffic_rate(src, 10),
-                                }
-                            ]
-                        },
-                    })
-                )
-
-    for profile in profiles:
-        profile_data = profile.Profile or {}
-        flows = profile_data.get("flows", [])
-        for flow in flows:
-            src_device = profile.Device
-            if not _is_online(src_device):
-                flows_out.append(
-                    {
-                        "status": "down",
-                        "reason": "source_offline",
-                        "source": _device_label(src_device),
-                        "destination": flow.get("to") or flow.get("to_device"),
-                    }
-                )
-                continue
-            dst_label = flow.get("to") or flow.get("to_device")
-            dst_device = device_by_label.get(dst_label)
-            if not dst_device and flow.get("to_id"):
-                dst_device = device_by_id.get(flow.get("to_id"))
-
-            if not dst_device:
-                flows_out.append(
-                    {
-                        "status": "error",
-                        "reason": "destination_not_found",
-                        "source": _device_label(src_device),
-                        "destination": dst_label,
-                    }
-                )
-                continue
-
-            if not _is_online(dst_device):
-                flows_out.append(
-                    {
-                        "status": "down",
-                        "reason": "destination_offline",
-                        "source": _device_label(src_device),
-                        "destination": _device_label(dst_device),
-                    }
-                )
-                continue
-
-            path = find_path(graph, src_device.id, dst_device.id)
-            if path is None:
-                flows_out.append(
-                    {
-                        "status": "error",
-                        "reason": "no_path",
-                        "source": _device_label(src_device),
-                        "destination": _device_label(dst_device),
-                    }
-                )
-                continue
-
-            flow_record = {
-                "status": "ok",
-                "source": _device_label(src_device),
-                "destination": _device_label(dst_device),
-                "protocol": flow.get("protocol", "tcp"),
-                "src_port": flow.get("src_port"),
-                "dst_port": flow.get("dst_port") or 443,
-                "vlan": flow.get("vlan"),
-                "requested_mbps": float(flow.get("rate_mbps", _traffic_rate(src_device, 10))),
-                "path": [],
-            }
-
-            flow_for_rules = {
-                "protocol": flow_record["protocol"],
-                "src_port": flow_record["src_port"],
-                "dst_port": flow_record["dst_port"],
-                "vlan": flow_record["vlan"],
-                "src_label": flow_record["source"],
-                "dst_label": flow_record["destination"],
-                "src_id": src_device.id,
-                "dst_id": dst_device.id,
-            }
-
-            blocked = False
-            for conn in path:
-                for device_id in (conn.Source_id, conn.Target_id):
-                    for rule in firewall_by_device.get(device_id, []):
-                        if rule_matches(rule, flow_for_rules):
-                            if rule.Action.lower() == "deny":
-                                blocked = True
-                                flow_record["status"] = "blocked"
-                                flow_record["blocked_by"] = _device_label(
-                                    device_by_id.get(device_id)
-                                )
-                                break
-                    if blocked:
-                        break
-                if blocked:
-                    break
-
-            total_latency = 0.0
-            for conn in path:
-                flow_record["path"].append(
-                    {
-                        "from": _device_label(device_by_id[conn.Source_id]),
-                        "to": _device_label(device_by_id[conn.Target_id]),
-                    }
-                )
-                total_latency += conn.LatencyMs or DEFAULT_LINK_LATENCY
-
-            if blocked:
-                flow_record["achieved_mbps"] = 0
-                flow_record["latency_ms"] = total_latency
-                flows_out.append(flow_record)
-                continue
-
-            requested = flow_record["requested_mbps"]
-            for conn in path:
-                capacity = conn.BandwidthMbps or DEFAULT_LINK_BW
-                link_utilization[conn.id] += requested / max(capacity, 1)
-
-            bottleneck = requested
-            for conn in path:
-                capacity = conn.BandwidthMbps or DEFAULT_LINK_BW
-                utilization = link_utilization[conn.id]
-                if utilization > 1:
-                    bottleneck = min(bottleneck, capacity / utilization)
-
-            flow_record["achieved_mbps"] = round(bottleneck, 3)
-            flow_record["latency_ms"] = round(total_latency, 3)
-            flows_out.append(flow_record)
-
-    link_stats = []
-    for conn in connections:
-        capacity = conn.BandwidthMbps or DEFAULT_LINK_BW
-        utilization = link_utilization.get(conn.id, 0)
-        link_stats.append(
-            {
-                "from": _device_label(device_by_id[conn.Source_id]),
-                "to": _device_label(device_by_id[conn.Target_id]),
-                "capacity_mbps": capacity,
-                "utilization": round(utilization, 3),
-            }
-        )
-
-    return {"flows": flows_out, "links": link_stats}
+import json
+
+from .sim.allocation import ALLOCATIONS
+from .sim.compiled import invalidate_system, load_system
+from .sim.components import component_summary
+from .sim.contingency import ELEMENT_TYPES, contingency_analysis
+from .sim.diagnostics import NO_DIAGNOSTICS, Diagnostics
+from .sim.engine import run_simulation, simulate
+from .sim.memo import make_result_store, result_key
+from .sim.montecarlo import DEFAULT_TIME_BUDGET_S, DEFAULT_TRIALS, monte_carlo
+from .sim.routing import ROUTING_METRICS, build_graph, find_path
+from .sim.timeseries import DEFAULT_DURATION_HOURS, DEFAULT_STEP_MINUTES, simulate_time_series
+from .sim.topology import (
+    DEFAULT_LINK_BW,
+    DEFAULT_LINK_LATENCY,
+    _device_label,
+    _device_type,
+    _is_online,
+    _traffic_rate,
+)
+from .sim.versiondiff import diff_versions
+from .sim.whatif import close_scenario, get_scenario, open_scenario
+
+
+SIMULATION_MODES = ("snapshot", "time_series", "monte_carlo", "contingency")
+
+# NDJSON lines written per streamed chunk.
+NDJSON_BATCH = 1000
+
+
+def compute_simulation(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    workers=0,
+    cache_key=None,
+    diagnostics=NO_DIAGNOSTICS,
+):
+    """Simulation result as a dict; with enabled ``diagnostics`` it gets a
+    ``diagnostics`` block of phase timings and counters."""
+    result = simulate(
+        devices,
+        connections,
+        traffic_profiles,
+        firewall_rules,
+        metric=metric,
+        allocation=allocation,
+        workers=workers,
+        cache_key=cache_key,
+        diagnostics=diagnostics,
+    )
+    with diagnostics.phase("render"):
+        output = result.as_dict()
+    if diagnostics.enabled:
+        output["diagnostics"] = diagnostics.as_dict()
+    return output
+
+
+def simulation_cache_key(system, version):
+    """Cache key of a stored version: ``(system_id, version, stamp)``.
+
+    Saving a system bumps its ``Version`` and rewrites its counts, so the stamp
+    moves in every process, not just the one that handled the save.
+    """
+    return (system.id, version, (system.Version, system.NodeCount, system.EdgeCount))
+
+
+def invalidate_simulation_cache(system_id, version=None):
+    invalidate_system(system_id, version)
+
+
+def simulation_payload(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    store,
+    metric="hops",
+    allocation="max_min",
+    workers=0,
+    cache_key=None,
+    diagnostics=NO_DIAGNOSTICS,
+):
+    """Return ``(payload, cache_hit)``, the simulation result as JSON bytes.
+
+    Results are memoized in ``store`` under a hash of the compiled inputs and
+    the engine options, so identical requests skip the engine entirely.
+    ``diagnostics`` only records; the payload never includes it.
+    """
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key, diagnostics)
+    with diagnostics.phase("result_cache"):
+        key = result_key(system, metric=metric, allocation=allocation)
+        payload = store.get(key)
+    if payload is not None:
+        diagnostics.count("result_cache_hits")
+        return payload, True
+    result = run_simulation(
+        system.topology,
+        system.flows.copy(),
+        system.firewall,
+        metric=metric,
+        allocation=allocation,
+        workers=workers,
+        cache_key=cache_key,
+        diagnostics=diagnostics,
+    )
+    with diagnostics.phase("render"):
+        payload = json.dumps(result.as_dict(), separators=(",", ":")).encode()
+    store.set(key, payload)
+    return payload, False
+
+
+def simulation_ndjson(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    workers=0,
+    cache_key=None,
+    diagnostics=NO_DIAGNOSTICS,
+):
+    """Run the simulation and return its output as a generator of NDJSON chunks.
+
+    The engine runs before this returns, so errors surface before anything
+    is streamed. Lines are rendered lazily, ``NDJSON_BATCH`` per chunk: one
+    per flow, one per link and a closing summary (see
+    ``SimulationResult.records``).
+    """
+    result = simulate(
+        devices,
+        connections,
+        traffic_profiles,
+        firewall_rules,
+        metric=metric,
+        allocation=allocation,
+        workers=workers,
+        cache_key=cache_key,
+        diagnostics=diagnostics,
+    )
+
+    def chunks():
+        lines = []
+        for record in result.records():
+            lines.append(json.dumps(record, separators=(",", ":")))
+            if len(lines) >= NDJSON_BATCH:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+    return chunks()
+
+
+def compute_version_diff(
+    old_inputs, new_inputs, metric="hops", allocation="max_min", workers=0, old_key=None, cache_key=None
+):
+    """Flow and link changes between two versions.
+
+    ``old_inputs`` / ``new_inputs`` are the ``(devices, connections,
+    traffic_profiles, firewall_rules)`` of each version and ``old_key`` /
+    ``cache_key`` their ``(system_id, version)``.
+    """
+    old_system = load_system(*old_inputs, cache_key=old_key)
+    system = load_system(*new_inputs, cache_key=cache_key)
+    return diff_versions(
+        old_system, system, metric=metric, allocation=allocation, workers=workers, old_key=old_key, cache_key=cache_key
+    )
+
+
+def compute_components(devices, connections, traffic_profiles, firewall_rules, top=None, cache_key=None):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key)
+    return component_summary(system.topology, system.flows, top=top)
+
+
+def open_what_if(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    owner=None,
+    cache_key=None,
+):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key)
+    return open_scenario(system, metric=metric, allocation=allocation, owner=owner, cache_key=cache_key)
+
+
+def get_what_if(session_id):
+    return get_scenario(session_id)
+
+
+def close_what_if(session_id):
+    close_scenario(session_id)
+
+
+def compute_contingency(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    elements=ELEMENT_TYPES,
+    k=1,
+    samples=0,
+    seed=None,
+    top=None,
+    workers=0,
+    cache_key=None,
+    progress=None,
+):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key)
+    report = contingency_analysis(
+        system,
+        metric=metric,
+        allocation=allocation,
+        elements=elements,
+        k=k,
+        samples=samples,
+        seed=seed,
+        workers=workers,
+        cache_key=cache_key,
+        progress=progress,
+    )
+    if top is not None:
+        report["failures"] = report["failures"][:top]
+    return report
+
+
+def compute_time_series(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    step_minutes=DEFAULT_STEP_MINUTES,
+    duration_hours=DEFAULT_DURATION_HOURS,
+    include_series=True,
+    workers=0,
+    cache_key=None,
+):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key)
+    return simulate_time_series(
+        system,
+        metric=metric,
+        step_minutes=step_minutes,
+        duration_hours=duration_hours,
+        include_series=include_series,
+        workers=workers,
+        cache_key=cache_key,
+    )
+
+
+def compute_monte_carlo(
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    metric="hops",
+    allocation="max_min",
+    trials=DEFAULT_TRIALS,
+    seed=None,
+    failure_probability=0.0,
+    time_budget_s=DEFAULT_TIME_BUDGET_S,
+    workers=0,
+    cache_key=None,
+    progress=None,
+):
+    system = load_system(devices, connections, traffic_profiles, firewall_rules, cache_key)
+    return monte_carlo(
+        system,
+        metric=metric,
+        allocation=allocation,
+        trials=trials,
+        seed=seed,
+        failure_probability=failure_probability,
+        time_budget_s=time_budget_s,
+        workers=workers,
+        cache_key=cache_key,
+        progress=progress,
+    )
+
+
+def compute_mode(
+    mode,
+    devices,
+    connections,
+    traffic_profiles,
+    firewall_rules,
+    store,
+    options,
+    workers=0,
+    cache_key=None,
+    progress=None,
+):
+    """Run one simulation ``mode`` with its ``options`` and return the JSON bytes.
+
+    Snapshot results go through the memo ``store``; ``progress`` is passed
+    to the modes that report it.
+    """
+    inputs = (devices, connections, traffic_profiles, firewall_rules)
+    if mode == "snapshot":
+        payload, _ = simulation_payload(*inputs, store, workers=workers, cache_key=cache_key, **options)
+        return payload
+    if mode == "time_series":
+        result = compute_time_series(*inputs, workers=workers, cache_key=cache_key, **options)
+    elif mode == "monte_carlo":
+        result = compute_monte_carlo(*inputs, workers=workers, cache_key=cache_key, progress=progress, **options)
+    elif mode == "contingency":
+        result = compute_contingency(*inputs, workers=workers, cache_key=cache_key, progress=progress, **options)
+    else:
+        raise ValueError(f"mode must be one of {', '.join(SIMULATION_MODES)}")
+    return json.dumps(result, separators=(",", ":")).encode()
@@ -0,0 +1,196 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .bulk import RowCounter, bulk_insert
+from .models import Connection, Device
+from .sysml_parser import ConnectionBlock, parse_sysml
+
+logger = logging.getLogger(__name__)
+
+# SysML attributes that map directly to Device fields; the rest are kept in
+# AdditionalAsJson.
+STANDARD_FIELDS = {
+    "assetIdentifier": "AssetId",
+    "manufacturer": "Manufacturer",
+    "modelNumber": "ModelNumber",
+    "assetName": "AssetName",
+    "serialNumber": "SerialNumber",
+    "comments": "Comments",
+    "assetCostAmount": "AssetCostAmount",
+    "netBookValueAmount": "NetBookValueAmount",
+    "ownership": "Ownership",
+    "inventoryDate": "InventoryDate",
+    "datePlacedInService": "DatePlacedInService",
+    "usefulLifePeriods": "UsefulLifePeriods",
+    "assetType": "AssetType",
+    "locationID": "LocationID",
+    "buildingNumber": "BuildingNumber",
+    "buildingName": "BuildingName",
+    "floor": "Floor",
+    "roomNumber": "RoomNumber",
+    "xPosition": "Xposition",
+    "yPosition": "Yposition",
+}
+
+# Connection attributes that are not copied into ConnectionDetails.
+CONNECTION_FIELDS = ("connectionType", "source", "target")
+
+_DEVICE_FIELDS = {name: Device._meta.get_field(name) for name in STANDARD_FIELDS.values()}
+_CONNECTION_TYPE = Connection._meta.get_field("ConnectionType")
+
+# Skipped connections listed in an upload's result; the rest are only counted.
+SKIPPED_REPORTED = 100
+
+
+class SysMLImport:
+    """A validated SysML file: unsaved devices and the connections between them.
+
+    ``devices`` lists the ``Device`` of every block and ``by_id`` maps each
+    SysML id to the last one declared with it; ``connections`` holds
+    ``(source id, target id, ConnectionType, ConnectionDetails)`` and
+    ``skipped`` the connections left out, with their line and reason. Nothing
+    references a system or a row yet, so an import can be read anywhere and
+    written later with ``write_sysml``.
+    """
+
+    def __init__(self, devices, by_id, connections, skipped):
+        self.devices = devices
+        self.by_id = by_id
+        self.connections = connections
+        self.skipped = skipped
+
+    def summary(self):
+        return {
+            "devices_created": len(self.devices),
+            "connections_created": len(self.connections),
+            "connections_skipped": len(self.skipped),
+            "skipped_connections": self.skipped[:SKIPPED_REPORTED],
+            "message": "Successfully parsed SysML file",
+        }
+
+
+def _clean(field, value):
+    """``value`` converted for ``field``; raises ``ValidationError``.
+
+    Only conversion and length are checked; foreign keys are set when the
+    import is written.
+    """
+    if value is None:
+        if not field.null:
+            raise ValidationError(field.error_messages["null"])
+        return None
+    value = field.to_python(value)
+    field.run_validators(value)
+    return value
+
+
+def _errors(error):
+    return "; ".join(error.messages)
+
+
+def read_sysml(file):
+    """Parse and validate an uploaded SysML file without touching the database.
+
+    Raises ``SysMLSyntaxError`` for unreadable text and ``ValueError`` for a
+    device whose attributes do not fit its fields. Connections to unknown
+    devices or with an invalid type are skipped and returned in ``skipped``.
+    """
+    devices = []
+    by_id = {}
+    connection_blocks = []
+    for block in parse_sysml(file):
+        # Connections may name devices declared after them.
+        if isinstance(block, ConnectionBlock):
+            connection_blocks.append(block)
+            continue
+
+        values = {}
+        additional_data = {}
+        for field_name, field_value in block.attributes.items():
+            if field_name in STANDARD_FIELDS:
+                name = STANDARD_FIELDS[field_name]
+                try:
+                    values[name] = _clean(_DEVICE_FIELDS[name], field_value)
+                except ValidationError as e:
+                    raise ValueError(
+                        f"Error creating device with ID {block.id} (line {block.line}): {field_name}: {_errors(e)}"
+                    )
+            else:
+                additional_data[field_name] = field_value
+        if additional_data:
+            values["AdditionalAsJson"] = additional_data
+        device = Device(**values)
+        devices.append(device)
+        by_id[block.id] = device
+
+    if not devices:
+        raise ValueError("No valid device definitions found in the SysML file.")
+
+    connections = []
+    skipped = []
+
+    def skip(block, error):
+        skipped.append({"source": block.source, "target": block.target, "line": block.line, "error": error})
+
+    for block in connection_blocks:
+        if block.source not in by_id or block.target not in by_id:
+            missing = block.source if block.source not in by_id else block.target
+            skip(block, f"Device with ID {missing} not found")
+            continue
+
+        attributes = block.attributes
+        connection_type = attributes.get("connectionType")
+        # Provide a default type if none specified
+        if not isinstance(connection_type, str):
+            connection_type = "default"
+        try:
+            connection_type = _clean(_CONNECTION_TYPE, connection_type)
+        except ValidationError as e:
+            skip(block, f"connectionType: {_errors(e)}")
+            continue
+        details = {
+            field_name: field_value
+            for field_name, field_value in attributes.items()
+            if field_name not in CONNECTION_FIELDS
+        }
+        connections.append((block.source, block.target, connection_type, details or None))
+    if skipped:
+        first = skipped[0]
+        logger.warning(
+            "Skipped %d of %d SysML connections; first at line %d: %s",
+            len(skipped), len(connection_blocks), first["line"], first["error"],
+        )
+    return SysMLImport(devices, by_id, connections, skipped)
+
+
+def write_sysml(imports, system, version, progress=None):
+    """Insert ``SysMLImport``s into ``system`` at ``version`` in one transaction.
+
+    The devices of every import and then their connections are written with
+    batched ``bulk_create``; the inserted primary keys come back with the
+    devices, so connection endpoints need no lookups. ``progress(fraction)``
+    follows the rows written. Any failure rolls all of them back.
+    """
+    devices = [device for parsed in imports for device in parsed.devices]
+    for device in devices:
+        device.System = system
+        device.SystemVersion = version
+    counter = RowCounter(len(devices) + sum(len(parsed.connections) for parsed in imports), progress)
+
+    with transaction.atomic():
+        bulk_insert(Device, devices, counter)
+        connections = [
+            Connection(
+                System=system,
+                SystemVersion=version,
+                Source_id=parsed.by_id[source].pk,
+                Target_id=parsed.by_id[target].pk,
+                ConnectionType=connection_type,
+                ConnectionDetails=details,
+            )
+            for parsed in imports
+            for source, target, connection_type, details in parsed.connections
+        ]
+        bulk_insert(Connection, connections, counter)
@@ -0,0 +1,360 @@
+import codecs
+import re
+
+
+# Bytes read from the upload at a time.
+CHUNK_SIZE = 64 * 1024
+
+# Whitespace and comments before a token are matched with it. Whitespace is
+# taken one character per repetition: ``\s+`` inside the ``*`` would make a
+# failed match backtrack exponentially over a long whitespace run.
+_SPACE = r"(?:\s|//[^\n]*|/\*.*?\*/)*"
+_TOKEN = re.compile(
+    _SPACE
+    + r"""(?:
+    (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<quoted>'(?:[^'\\]|\\.)*')
+  | (?P<arrow>->)
+  | (?P<scope>::)
+  | (?P<number>-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<punct>[{}()\[\];:=,?<>*#@~+\-|&!.])
+    )""",
+    re.VERBOSE | re.DOTALL,
+)
+_SKIP = re.compile(_SPACE, re.DOTALL)
+# Whitespace and comments that cannot continue in the next chunk: a line
+# comment only once its newline has been read.
+_SKIP_DONE = re.compile(r"(?:\s|//[^\n]*\n|/\*.*?\*/)*", re.DOTALL)
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+
+EOF = "eof"
+
+
+class SysMLSyntaxError(ValueError):
+    """A SysML file that cannot be read, with the 1-based position of the problem."""
+
+    def __init__(self, message, line, column):
+        super().__init__(f"line {line}, column {column}: {message}")
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+class Token:
+    __slots__ = ("kind", "text", "line", "column")
+
+    def __init__(self, kind, text, line, column):
+        self.kind = kind
+        self.text = text
+        self.line = line
+        self.column = column
+
+    def describe(self):
+        return "end of file" if self.kind == EOF else repr(self.text)
+
+
+class DeviceBlock:
+    """``part instance <id>: Device { ... }`` with its attribute assignments."""
+
+    __slots__ = ("id", "attributes", "line", "column")
+
+    def __init__(self, id, attributes, line, column):
+        self.id = id
+        self.attributes = attributes
+        self.line = line
+        self.column = column
+
+
+class ConnectionBlock:
+    """``part instance <source> -> <target>::DeviceConnection { ... }``."""
+
+    __slots__ = ("source", "target", "attributes", "line", "column")
+
+    def __init__(self, source, target, attributes, line, column):
+        self.source = source
+        self.target = target
+        self.attributes = attributes
+        self.line = line
+        self.column = column
+
+
+def tokenize(stream, chunk_size=CHUNK_SIZE):
+    """Tokens of a SysML text read from ``stream`` ``chunk_size`` at a time.
+
+    ``stream`` yields bytes (decoded as UTF-8) or str from ``read``. Only
+    the unconsumed tail of the text is buffered, so memory is bounded by the
+    chunk size plus about twice the longest token. Whitespace and comments are dropped;
+    the stream ends with an ``EOF`` token.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    line = column = 1
+    eof = False
+
+    def read(size):
+        data = stream.read(size)
+        if isinstance(data, str):
+            return data, not data
+        try:
+            return decoder.decode(data, final=not data), not data
+        except UnicodeDecodeError:
+            raise SysMLSyntaxError("invalid UTF-8; the SysML file must be UTF-8 encoded", line, column)
+
+    def skip_to(start):
+        nonlocal line, column
+        newlines = buf.count("\n", pos, start)
+        if newlines:
+            line += newlines
+            column = start - buf.rindex("\n", pos, start)
+        else:
+            column += start - pos
+
+    match_token = _TOKEN.match
+    while True:
+        match = match_token(buf, pos)
+        # A token that reaches the end of the buffer may continue in the next
+        # chunk; so may text that does not match yet (an open string).
+        if not eof and (match is None or match.end() == len(buf)):
+            # Drop finished whitespace and comments so a long run of them is
+            # not scanned again after every chunk, and read at least as much
+            # as is still pending so a long token is rescanned only
+            # logarithmically often.
+            start = _SKIP_DONE.match(buf, pos).end()
+            skip_to(start)
+            pos = start
+            data, eof = read(max(chunk_size, len(buf) - pos))
+            buf = buf[pos:] + data
+            pos = 0
+            continue
+        if match is None:
+            start = _SKIP.match(buf, pos).end()
+            skip_to(start)
+            if start == len(buf):
+                yield Token(EOF, "", line, column)
+                return
+            if buf.startswith('"', start) or buf.startswith("'", start):
+                raise SysMLSyntaxError("unterminated string", line, column)
+            if buf.startswith("/*", start):
+                raise SysMLSyntaxError("unterminated comment", line, column)
+            raise SysMLSyntaxError(f"unexpected character {buf[start]!r}", line, column)
+
+        kind = match.lastgroup
+        start = match.start(kind)
+        end = match.end()
+        if start != pos:
+            skip_to(start)
+            pos = start
+        yield Token(kind, buf[start:end], line, column)
+        # Only strings can span lines.
+        if kind == "string" or kind == "quoted":
+            skip_to(end)
+        else:
+            column += end - start
+        pos = end
+
+
+def _unquote(text):
+    return _ESCAPE.sub(r"\1", text[1:-1])
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.token = next(tokens)
+
+    def advance(self):
+        token = self.token
+        if token.kind != EOF:
+            self.token = next(self.tokens)
+        return token
+
+    def error(self, message, token=None):
+        token = token or self.token
+        return SysMLSyntaxError(message, token.line, token.column)
+
+    def at(self, text):
+        return self.token.text == text and self.token.kind not in ("string", "quoted")
+
+    def expect(self, text, context):
+        if not self.at(text):
+            raise self.error(f"expected {text!r} {context}, found {self.token.describe()}")
+        return self.advance()
+
+    def identifier(self, context):
+        token = self.token
+        if token.kind == "quoted":
+            self.advance()
+            return _unquote(token.text)
+        if token.kind in ("name", "number"):
+            self.advance()
+            return token.text
+        raise self.error(f"expected a name {context}, found {token.describe()}")
+
+    def qualified_name(self, context):
+        parts = [self.identifier(context)]
+        while self.at("::"):
+            self.advance()
+            parts.append(self.identifier(context))
+        return "::".join(parts)
+
+    def elements(self, inside):
+        """Device and connection blocks up to the end of a package (or file)."""
+        while True:
+            token = self.token
+            if token.kind == EOF:
+                if inside is not None:
+                    raise self.error(f"expected '}}' to close the block opened at line {inside.line}")
+                return
+            if self.at("}"):
+                if inside is None:
+                    raise self.error("unmatched '}'")
+                self.advance()
+                return
+            if self.at("package"):
+                self.advance()
+                self.qualified_name("after 'package'")
+                opening = self.expect("{", "after the package name")
+                yield from self.elements(opening)
+            elif self.at("part"):
+                self.advance()
+                if self.at("instance"):
+                    self.advance()
+                    block = self.instance(token)
+                    if block is not None:
+                        yield block
+                else:
+                    self.skip_statement()
+            else:
+                self.skip_statement()
+
+    def instance(self, start):
+        source = self.identifier("after 'part instance'")
+        if self.at("->"):
+            self.advance()
+            target = self.identifier("after '->'")
+            self.expect("::", "before the connection type")
+            kind = self.qualified_name("after '::'")
+        else:
+            target = None
+            self.expect(":", "after the instance name")
+            kind = self.qualified_name("after ':'")
+        if self.at(";"):
+            self.advance()
+            attributes = {}
+        else:
+            attributes = self.body()
+
+        kind = kind.rsplit("::", 1)[-1]
+        if target is None and kind == "Device":
+            return DeviceBlock(source, attributes, start.line, start.column)
+        if target is not None and kind == "DeviceConnection":
+            return ConnectionBlock(source, target, attributes, start.line, start.column)
+        return None
+
+    def body(self):
+        """``{ name = value; ... }`` as a dict; other statements are skipped."""
+        opening = self.expect("{", "to open the block")
+        attributes = {}
+        while not self.at("}"):
+            if self.token.kind == EOF:
+                raise self.error(f"expected '}}' to close the block opened at line {opening.line}")
+            if self.token.kind in ("name", "quoted") and not self.at("part"):
+                name_token = self.token
+                name = self.identifier("")
+                if self.at("="):
+                    self.advance()
+                    attributes[name] = self.value(name)
+                    # Some exports end an assignment with ',' instead.
+                    if self.at(";") or self.at(","):
+                        self.advance()
+                    elif not self.at("}"):
+                        raise self.error(f"expected ';' after the value of {name!r}, found {self.token.describe()}")
+                    continue
+                if self.at(";"):
+                    self.advance()
+                    continue
+                if self.token.kind == EOF:
+                    raise self.error(f"unexpected end of file after {name_token.text!r}")
+            self.skip_statement()
+        self.advance()
+        return attributes
+
+    def value(self, name):
+        token = self.token
+        if token.kind == "string":
+            self.advance()
+            return _unquote(token.text)
+        if token.kind == "number":
+            self.advance()
+            text = token.text
+            if "." in text or "e" in text or "E" in text:
+                return float(text)
+            return int(text)
+        if token.kind in ("name", "quoted"):
+            text = self.qualified_name(f"in the value of {name!r}")
+            if token.kind == "name":
+                if text == "true":
+                    return True
+                if text == "false":
+                    return False
+                if text == "null":
+                    return None
+            return text
+        if self.at("{"):
+            return self.body()
+        if self.at("["):
+            self.advance()
+            items = []
+            while not self.at("]"):
+                items.append(self.value(name))
+                if self.at(","):
+                    self.advance()
+                elif not self.at("]"):
+                    raise self.error(f"expected ',' or ']' in the value of {name!r}, found {self.token.describe()}")
+            self.advance()
+            return items
+        raise self.error(f"expected a value for {name!r}, found {token.describe()}")
+
+    def skip_statement(self):
+        """Skip to the end of a statement: its ';' or its balanced ``{ ... }`` block.
+
+        A '}' that closes the enclosing block is left for the caller.
+        """
+        depth = 0
+        opened = None
+        while True:
+            token = self.token
+            if token.kind == EOF:
+                if opened is not None:
+                    raise self.error(f"expected '}}' to close the block opened at line {opened.line}")
+                raise self.error("unexpected end of file")
+            if self.at("{"):
+                if not depth:
+                    opened = token
+                depth += 1
+            elif self.at("}"):
+                if not depth:
+                    return
+                depth -= 1
+                if not depth:
+                    self.advance()
+                    return
+            elif self.at(";") and not depth:
+                self.advance()
+                return
+            self.advance()
+
+
+def parse_sysml(stream, chunk_size=CHUNK_SIZE):
+    """Yield the ``DeviceBlock`` and ``ConnectionBlock`` records of a SysML file.
+
+    The file is read incrementally; blocks are yielded as soon as they are
+    complete. Packages nest, ``part def`` and other declarations are
+    skipped, and attribute values may be strings, numbers, booleans,
+    qualified names, lists or nested ``{ ... }`` blocks. Raises
+    ``SysMLSyntaxError`` with the line and column of the first error.
+    """
+    parser = _Parser(tokenize(stream, chunk_size))
+    yield from parser.elements(None)
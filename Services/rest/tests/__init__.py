@@ -0,0 +1,59 @@
+import hashlib
+import io
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from ..chunked_upload import create_upload, write_chunk
+from ..sim.compiled import compiled_systems, version_results
+from ..sim.routing import route_results, route_trees
+
+
+# Sample SysML files and Ethernet configs shipped with the repo.
+ASSETS = Path(__file__).resolve().parents[3] / "Tests"
+
+
+def clear_simulation_caches():
+    """Empty the process-level caches; test databases reuse system ids."""
+    for cache in (compiled_systems, version_results, route_trees, route_results):
+        cache.clear()
+
+
+def api_client(username="tester"):
+    user = User.objects.create_user(username, password="password")
+    client = APIClient()
+    client.force_authenticate(user)
+    return user, client
+
+
+def import_config(client, name):
+    """Import ``Tests/<name>`` through the config endpoint; returns the system id."""
+    response = client.post(
+        "/api/v1/config/import/",
+        {"config": (ASSETS / name).read_text(), "format": "json" if name.endswith(".json") else "yaml"},
+        format="json",
+    )
+    assert response.status_code == 201, response.content
+    return response.json()["system_id"]
+
+
+def chunked_upload(owner, file_name, data, chunk_size=100):
+    """Upload ``data`` in chunks, last chunk first; returns the upload."""
+    upload = create_upload(owner, file_name, len(data), chunk_size)
+    for index in reversed(range(upload["chunks"])):
+        chunk = data[index * chunk_size:(index + 1) * chunk_size]
+        write_chunk(upload, index, io.BytesIO(chunk), hashlib.sha256(chunk).hexdigest())
+    return upload
+
+
+def use_temporary_media(test):
+    """Point ``MEDIA_ROOT`` at a fresh directory until ``test`` ends."""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    settings = override_settings(MEDIA_ROOT=media)
+    settings.enable()
+    test.addCleanup(settings.disable)
@@ -0,0 +1,169 @@
+import os
+import shutil
+import time
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import chunked_upload as uploads
+from ..chunked_upload import (
+    ASSEMBLING,
+    ASSEMBLY_LEASE_S,
+    UploadBusy,
+    assemble,
+    get_upload,
+    purge_uploads,
+    upload_record,
+)
+from ..models import ImportJob
+from . import api_client, chunked_upload, use_temporary_media
+
+
+DATA = b"part instance a: Device { name = \"A\"; }\n" * 10
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        self.user, self.client = api_client()
+
+    def upload(self):
+        return chunked_upload(self.user.id, "model.sysml", DATA)
+
+    def marker(self, upload):
+        return default_storage.path(f"uploads/chunks/{upload['upload_id']}/{ASSEMBLING}")
+
+    def test_chunks_in_any_order_assemble_to_the_file(self):
+        upload = self.upload()
+        record = upload_record(upload)
+        self.assertEqual((record["complete"], record["missing"], record["assembling"]), (True, [], False))
+        name = assemble(upload)
+        self.assertEqual(default_storage.open(name).read(), DATA)
+        self.assertFalse(os.path.exists(self.marker(upload)))
+        # Assembled once: later calls, also with a stale copy of the upload, return the same file.
+        self.assertEqual(assemble(get_upload(upload["upload_id"], self.user.id)), name)
+
+    def test_assembly_in_progress_is_refused(self):
+        upload = self.upload()
+        open(self.marker(upload), "w").close()
+        self.assertTrue(upload_record(upload)["assembling"])
+        with self.assertRaises(UploadBusy):
+            assemble(upload)
+        self.assertNotIn("path", get_upload(upload["upload_id"], self.user.id))
+
+    def test_stale_marker_is_taken_over(self):
+        upload = self.upload()
+        marker = self.marker(upload)
+        open(marker, "w").close()
+        stale = time.time() - ASSEMBLY_LEASE_S - 1
+        os.utime(marker, (stale, stale))
+        self.assertEqual(default_storage.open(assemble(upload)).read(), DATA)
+        self.assertEqual(os.listdir(os.path.dirname(marker)), ["upload.json"])
+
+    def test_stale_marker_is_taken_over_once(self):
+        upload = self.upload()
+        marker = self.marker(upload)
+        with open(marker, "w") as handle:
+            handle.write("dead")
+        stale = time.time() - ASSEMBLY_LEASE_S - 1
+        os.utime(marker, (stale, stale))
+
+        # Another claimant takes the stale marker over just after this one
+        # judged it stale.
+        getmtime = os.path.getmtime
+        winners = []
+
+        def racing_getmtime(path):
+            value = getmtime(path)
+            if path == marker and not winners:
+                winners.append(None)  # The winner's own check must not race again.
+                winners[0] = uploads._claim(os.path.dirname(marker))
+            return value
+
+        with mock.patch.object(uploads.os.path, "getmtime", racing_getmtime):
+            with self.assertRaises(UploadBusy):
+                uploads._claim(os.path.dirname(marker))
+        (_, token), = winners
+        with open(marker) as handle:
+            self.assertEqual(handle.read(), token)
+        leftovers = [name for name in os.listdir(os.path.dirname(marker)) if name.startswith(ASSEMBLING)]
+        self.assertEqual(leftovers, [ASSEMBLING])
+
+    def test_assembly_stops_once_taken_over(self):
+        upload = self.upload()
+        marker = self.marker(upload)
+        copy = shutil.copyfileobj
+
+        def copy_then_lose_the_lease(source, target, length):
+            copy(source, target, length)
+            with open(marker, "w") as handle:
+                handle.write("other")
+
+        with mock.patch.object(uploads.shutil, "copyfileobj", copy_then_lose_the_lease):
+            with self.assertRaises(UploadBusy):
+                assemble(upload)
+        with open(marker) as handle:
+            self.assertEqual(handle.read(), "other")
+        self.assertEqual(os.listdir(default_storage.path("uploads")), ["chunks"])
+        self.assertNotIn("path", get_upload(upload["upload_id"], self.user.id))
+
+    def test_assembly_finished_by_another_job_is_reused(self):
+        upload = self.upload()
+        name = assemble(dict(upload))
+        self.assertNotIn("path", upload)
+        self.assertEqual(assemble(upload), name)
+
+    def active_job(self, upload):
+        return ImportJob.objects.create(
+            JobId="a" * 32,
+            User=self.user,
+            Status="running",
+            HeartbeatAt=timezone.now(),
+            Options={"uploads": [upload["upload_id"]], "name": "model", "version": None},
+        )
+
+    def test_purge_keeps_uploads_of_active_jobs(self):
+        kept = self.upload()
+        dropped = self.upload()
+        idle = time.time() - 2 * 24 * 3600
+        for upload in (kept, dropped):
+            os.utime(default_storage.path(f"uploads/chunks/{upload['upload_id']}"), (idle, idle))
+        purge_uploads(keep={kept["upload_id"]})
+        self.assertIsNotNone(get_upload(kept["upload_id"], self.user.id))
+        self.assertIsNone(get_upload(dropped["upload_id"], self.user.id))
+
+    def test_starting_an_upload_purges_all_but_active_imports(self):
+        kept = self.upload()
+        dropped = self.upload()
+        idle = time.time() - 2 * 24 * 3600
+        for upload in (kept, dropped):
+            os.utime(default_storage.path(f"uploads/chunks/{upload['upload_id']}"), (idle, idle))
+        self.active_job(kept)
+        response = self.client.post(
+            "/api/v1/upload/chunked/", {"file_name": "other.sysml", "size": 10}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertIsNotNone(get_upload(kept["upload_id"], self.user.id))
+        self.assertIsNone(get_upload(dropped["upload_id"], self.user.id))
+
+    def test_upload_of_an_active_job_cannot_be_imported_again_or_deleted(self):
+        upload = self.upload()
+        self.active_job(upload)
+        response = self.client.post(
+            "/api/v1/import/jobs/", {"uploads": [upload["upload_id"]], "name": "again"}, format="json"
+        )
+        self.assertEqual(response.status_code, 409, response.content)
+        response = self.client.delete(f"/api/v1/upload/chunked/{upload['upload_id']}/")
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertIsNotNone(get_upload(upload["upload_id"], self.user.id))
+
+    def test_upload_being_assembled_cannot_be_imported(self):
+        upload = self.upload()
+        open(self.marker(upload), "w").close()
+        response = self.client.post(
+            "/api/v1/import/jobs/", {"uploads": [upload["upload_id"]], "name": "again"}, format="json"
+        )
+        self.assertEqual(response.status_code, 409, response.content)
+        self.assertFalse(ImportJob.objects.exists())
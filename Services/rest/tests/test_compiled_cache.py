@@ -0,0 +1,65 @@
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Device, System
+from ..sim.compiled import compile_system, compiled_systems, load_system
+from ..sim.flows import NO_PATH
+from ..sim.memo import MemoryResultStore, system_digest
+from ..simulation import compute_simulation, simulation_cache_key, simulation_payload
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import random_system
+
+
+class CompiledCacheTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+        self.system_id = import_config(self.client, "ethernet_office.yaml")
+
+    def simulate(self, version):
+        response = self.client.post("/api/v1/simulate/", {"system_id": self.system_id, "version": version}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_empty_version_is_not_cached(self):
+        self.assertEqual(self.simulate(2), {"flows": [], "links": [], "cache_hit": False})
+        self.assertEqual(len(compiled_systems), 0)
+        self.simulate(1)
+        system = System.objects.get(id=self.system_id)
+        self.assertIsNotNone(compiled_systems.get(simulation_cache_key(system, 1)))
+
+    def test_save_elsewhere_changes_the_key(self):
+        links = len(self.simulate(1)["links"])
+        system = System.objects.get(id=self.system_id)
+        key = simulation_cache_key(system, 1)
+
+        # What another process's save leaves behind: new rows and a bumped
+        # system row, but nothing invalidated here.
+        source, target = Device.objects.filter(System=system, SystemVersion=1)[:2]
+        system.connections.create(SystemVersion=1, Source=source, Target=target, ConnectionType="ethernet")
+        system.Version += 1
+        system.EdgeCount += 1
+        system.save()
+
+        self.assertNotEqual(simulation_cache_key(system, 1), key)
+        self.assertEqual(len(self.simulate(1)["links"]), links + 1)
+
+
+class SharedCompiledSystemTests(SimpleTestCase):
+    def setUp(self):
+        clear_simulation_caches()
+
+    def test_runs_leave_the_cached_flows_alone(self):
+        inputs = random_system(0)
+        key = (1, 1, None)
+        cached = load_system(*inputs, cache_key=key)
+        reason = cached.flows.reason.copy()
+        digest = system_digest(cached)
+        for metric in ("hops", "latency"):
+            compute_simulation(*inputs, metric=metric, cache_key=key)
+            simulation_payload(*inputs, MemoryResultStore(1 << 20), metric=metric, cache_key=key)
+        self.assertIs(load_system(*inputs, cache_key=key), cached)
+        self.assertEqual(cached.flows.reason.tolist(), reason.tolist())
+        self.assertNotIn(NO_PATH, reason.tolist())
+        # The memo digest is the same as in a process that never ran it.
+        self.assertEqual(system_digest(cached), digest)
+        self.assertEqual(system_digest(compile_system(*inputs)), digest)
@@ -0,0 +1,91 @@
+from django.test import SimpleTestCase, TestCase
+
+from ..sim.compiled import load_system
+from ..sim.components import component_summary
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import _device, _link, _profile, random_system
+
+
+def _reachable(devices, connections):
+    """Device id -> set of device ids in its component, by breadth-first search."""
+    neighbours = {device.id: set() for device in devices}
+    for connection in connections:
+        neighbours[connection.Source_id].add(connection.Target_id)
+        neighbours[connection.Target_id].add(connection.Source_id)
+    reached = {}
+    for device in devices:
+        if device.id in reached:
+            continue
+        seen, frontier = {device.id}, [device.id]
+        while frontier:
+            frontier = [other for node in frontier for other in neighbours[node] - seen]
+            seen.update(frontier)
+        for node in seen:
+            reached[node] = seen
+    return reached
+
+
+class ComponentSummaryTests(SimpleTestCase):
+    def test_split_topology(self):
+        # Three parts: a - b - c, d - e with d offline, and the lone host f.
+        a, b, c = _device(1, "a", "host"), _device(2, "b"), _device(3, "c", "host")
+        d, e, f = _device(4, "d", online=False), _device(5, "e", "host"), _device(6, "f", "host")
+        system = load_system(
+            [a, b, c, d, e, f],
+            [_link(1, a, b), _link(2, b, c), _link(3, d, e)],
+            [
+                _profile(a, [{"to": "c"}, {"to": "e"}, {"to": "f"}]),
+                _profile(e, [{"to": "c"}, {"to": "d"}]),
+            ],
+            [],
+        )
+        summary = component_summary(system.topology, system.flows)
+        self.assertEqual(
+            summary,
+            {
+                "devices": 6,
+                "links": 3,
+                "components": 3,
+                "largest": 3,
+                "isolated": 1,
+                # a -> e, a -> f and e -> c; e -> d fails on the offline end instead.
+                "split_flows": 3,
+                "islands": [
+                    {"size": 2, "online": 1, "hosts": 1, "devices": ["d", "e"]},
+                    {"size": 1, "online": 1, "hosts": 1, "devices": ["f"]},
+                ],
+            },
+        )
+        self.assertEqual(len(component_summary(system.topology, system.flows, top=1)["islands"]), 1)
+
+    def test_matches_a_search(self):
+        for seed in range(10):
+            with self.subTest(seed=seed):
+                devices, connections, traffic_profiles, firewall_rules = random_system(seed, n_devices=60)
+                # Cut the tree into pieces.
+                connections = connections[::3]
+                system = load_system(devices, connections, traffic_profiles, firewall_rules)
+                summary = component_summary(system.topology, system.flows)
+                reached = _reachable(devices, connections)
+                parts = {frozenset(part) for part in reached.values()}
+                self.assertEqual(summary["components"], len(parts))
+                self.assertEqual(summary["largest"], max(len(part) for part in parts))
+                self.assertEqual(summary["isolated"], sum(len(part) == 1 for part in parts))
+                self.assertEqual(
+                    sorted(island["size"] for island in summary["islands"]),
+                    sorted(len(part) for part in parts)[:-1],
+                )
+
+
+class ComponentsViewTests(TestCase):
+    def test_connected_config(self):
+        clear_simulation_caches()
+        _, client = api_client()
+        system_id = import_config(client, "ethernet_office.yaml")
+        response = client.post("/api/v1/simulate/components/", {"system_id": system_id}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertEqual((report["components"], report["largest"]), (1, report["devices"]))
+        self.assertEqual((report["split_flows"], report["islands"]), (0, []))
+        response = client.post("/api/v1/simulate/components/", {"system_id": system_id, "top": -1}, format="json")
+        self.assertEqual(response.status_code, 400)
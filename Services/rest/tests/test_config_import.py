@@ -0,0 +1,60 @@
+from unittest import mock
+
+import yaml
+from django.db import DatabaseError
+from django.test import TestCase
+
+from .. import config_import
+from ..config_import import import_config as import_config_text
+from ..models import ConfigFile, Connection, Device, FirewallRule, Port, System, TrafficProfile
+from . import ASSETS, api_client, import_config
+
+
+class ConfigImportTests(TestCase):
+    def setUp(self):
+        self.user, self.client = api_client()
+
+    def import_office(self, progress=None):
+        return import_config_text((ASSETS / "ethernet_office.yaml").read_text(), "yaml", self.user, progress=progress)
+
+    def assertNothingImported(self):
+        for model in (System, Device, Port, Connection, TrafficProfile, FirewallRule, ConfigFile):
+            self.assertFalse(model.objects.exists(), model.__name__)
+
+    def test_rows_and_counts(self):
+        progress = []
+        system = self.import_office(progress.append)
+        config = yaml.safe_load((ASSETS / "ethernet_office.yaml").read_text())
+        self.assertEqual((system.Name, system.Version), ("Office-Network", 1))
+        self.assertEqual(system.NodeCount, len(config["devices"]))
+        self.assertEqual(Device.objects.filter(System=system).count(), system.NodeCount)
+        self.assertEqual(Connection.objects.filter(System=system).count(), system.EdgeCount)
+        self.assertEqual(
+            Port.objects.filter(System=system).count(),
+            sum(len(device.get("ports", [])) for device in config["devices"]),
+        )
+        self.assertTrue(ConfigFile.objects.filter(System=system).exists())
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1.0)
+
+    def test_failed_write_leaves_nothing(self):
+        insert = config_import.bulk_insert
+
+        def bulk_insert(model, rows, counter):
+            if model is TrafficProfile:
+                raise DatabaseError("disk full")
+            return insert(model, rows, counter)
+
+        with mock.patch.object(config_import, "bulk_insert", bulk_insert):
+            with self.assertRaisesMessage(DatabaseError, "disk full"):
+                self.import_office()
+        self.assertNothingImported()
+
+    def test_endpoint(self):
+        system_id = import_config(self.client, "ethernet_datacenter.json")
+        self.assertEqual(System.objects.get(id=system_id).User, self.user)
+        response = self.client.post(
+            "/api/v1/config/import/", {"config": (ASSETS / "t1.sysml").read_text(), "format": "yaml"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(System.objects.count(), 1)
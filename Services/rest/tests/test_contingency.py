@@ -0,0 +1,61 @@
+from django.test import SimpleTestCase
+
+from ..sim.compiled import load_system
+from ..sim.contingency import contingency_analysis
+from .test_simulation import _device, _link, _profile
+
+
+class ContingencyTests(SimpleTestCase):
+    """A triangle ``s1 s2 s3`` with hosts ``h1`` and ``h2``, joined to ``t`` and
+    its host ``h3`` by the single bridge link ``s3 - t``."""
+
+    def setUp(self):
+        h1, h2, h3 = _device(1, "h1", "host"), _device(2, "h2", "host"), _device(3, "h3", "host")
+        s1, s2, s3, t = _device(4, "s1"), _device(5, "s2"), _device(6, "s3"), _device(7, "t")
+        self.inputs = (
+            [h1, h2, h3, s1, s2, s3, t],
+            [
+                _link(1, h1, s1),
+                _link(2, h2, s2),
+                _link(3, s1, s2),
+                _link(4, s1, s3),
+                _link(5, s2, s3),
+                _link(6, s3, t),
+                _link(7, t, h3),
+            ],
+            [
+                _profile(h1, [{"to": "h3", "rate_mbps": 10}, {"to": "h2", "rate_mbps": 5}]),
+                _profile(h2, [{"to": "h3", "rate_mbps": 20}]),
+            ],
+            [],
+        )
+
+    def analysis(self, **options):
+        report = contingency_analysis(load_system(*self.inputs), elements=("link",), **options)
+        return report, {failure["failed"][0]["link_id"]: failure for failure in report["failures"]}
+
+    def test_bridge_failure_strands_the_flows_across_it(self):
+        report, by_link = self.analysis()
+        self.assertEqual(report["baseline"], {"flows_ok": 3, "throughput_mbps": 35.0})
+        self.assertEqual(report["evaluated"], 7)
+        bridge = by_link[6]
+        self.assertEqual(bridge["failed"], [{"type": "link", "link_id": 6, "from": "s3", "to": "t"}])
+        self.assertEqual((bridge["lost_flows"], bridge["lost_mbps"]), (2, 30.0))
+        self.assertEqual(report["failures"][0], bridge)
+        # The triangle has a way around every one of its links.
+        for link in (3, 4, 5):
+            self.assertEqual((by_link[link]["lost_flows"], by_link[link]["lost_mbps"]), (0, 0.0))
+
+    def test_pairs_of_failures(self):
+        report, _ = self.analysis(k=2, samples=100)
+        self.assertEqual(report["evaluated"], 7 + 21)
+        pair = next(
+            failure
+            for failure in report["failures"]
+            if [element["link_id"] for element in failure["failed"]] == [3, 5]
+        )
+        # s2 is cut off from both of its neighbours: h2 loses everything.
+        self.assertEqual((pair["lost_flows"], pair["lost_mbps"]), (2, 25.0))
+
+    def test_workers_match_serial(self):
+        self.assertEqual(self.analysis(k=2, samples=100, workers=2), self.analysis(k=2, samples=100))
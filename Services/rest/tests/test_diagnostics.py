@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from .. import views
+from ..sim.memo import MemoryResultStore
+from . import api_client, clear_simulation_caches, import_config
+
+
+def _timing(header):
+    """Phase names and durations of a ``Server-Timing`` header."""
+    metrics = {}
+    for metric in header.split(", "):
+        name, duration = metric.split(";dur=")
+        metrics[name] = float(duration)
+    return metrics
+
+
+class DiagnosticsTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        _, self.client = api_client()
+        self.system_id = import_config(self.client, "ethernet_office.yaml")
+        patcher = mock.patch.object(views, "simulation_results", MemoryResultStore(64 * 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def simulate(self, **options):
+        response = self.client.post("/api/v1/simulate/", {"system_id": self.system_id, **options}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_phases_and_counters(self):
+        response = self.simulate(diagnostics=True)
+        diagnostics = response.json()["diagnostics"]
+        timing = _timing(response["Server-Timing"])
+        for phase in ("query", "graph", "flows", "result_cache", "route", "firewall", "allocate", "render"):
+            self.assertIn(phase, diagnostics["phases_ms"])
+            self.assertIn(phase, timing)
+        self.assertEqual(list(timing)[-1], "total")
+        self.assertGreater(diagnostics["total_ms"], 0)
+        counters = diagnostics["counters"]
+        self.assertGreater(counters["queries"], 0)
+        self.assertGreater(counters["trees_built"], 0)
+        self.assertEqual(counters["flows"], len(response.json()["flows"]))
+
+        # A repeat comes from the caches: nothing but the lookup is timed.
+        diagnostics = self.simulate(diagnostics=True).json()["diagnostics"]
+        self.assertEqual(list(diagnostics["phases_ms"]), ["result_cache"])
+        self.assertEqual(diagnostics["counters"]["result_cache_hits"], 1)
+        self.assertEqual(diagnostics["counters"]["compiled_cache_hits"], 1)
+
+    def test_off_by_default(self):
+        response = self.simulate()
+        self.assertNotIn("Server-Timing", response)
+        self.assertNotIn("diagnostics", response.json())
+
+    def test_other_modes_send_the_header_only(self):
+        response = self.simulate(diagnostics=True, mode="time_series", step_minutes=60)
+        self.assertIn("time_series", _timing(response["Server-Timing"]))
+        self.assertNotIn("diagnostics", response.json())
+
+        response = self.client.post(
+            "/api/v1/simulate/", {"system_id": self.system_id, "diagnostics": True, "format": "ndjson"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("route", _timing(response["Server-Timing"]))
+        self.assertTrue(b"".join(response.streaming_content))
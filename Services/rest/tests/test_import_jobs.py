@@ -0,0 +1,71 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+
+from .. import sysml_import
+from ..import_jobs import run_import_job
+from ..jobs import JobCancelled
+from ..models import ConfigFile, Connection, Device, System
+from . import ASSETS, api_client, chunked_upload, use_temporary_media
+
+
+def _failing_insert(model):
+    """``bulk_insert`` that fails once it reaches ``model``'s rows."""
+    insert = sysml_import.bulk_insert
+
+    def bulk_insert(table, rows, counter):
+        if table is model:
+            raise DatabaseError("disk full")
+        return insert(table, rows, counter)
+
+    return bulk_insert
+
+
+def _cancel_at(fraction):
+    def progress(value):
+        if value >= fraction:
+            raise JobCancelled()
+
+    return progress
+
+
+class RunImportJobTests(TestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        self.user, _ = api_client()
+
+    def job(self, mode, *names):
+        uploads = [
+            chunked_upload(self.user.id, name, (ASSETS / name).read_bytes(), chunk_size=64 * 1024)
+            for name in names
+        ]
+        options = {"uploads": [upload["upload_id"] for upload in uploads], "name": "imported", "version": None}
+        return {"job_id": "job", "owner": self.user.id, "mode": mode, "options": options}
+
+    def assertNothingImported(self):
+        self.assertFalse(System.objects.exists())
+        self.assertFalse(Device.objects.exists())
+        self.assertFalse(Connection.objects.exists())
+        self.assertFalse(ConfigFile.objects.exists())
+
+    def test_upload_job_imports_every_file(self):
+        progress = []
+        _, system = run_import_job(self.job("upload", "t1.sysml", "t2.sysml"), progress.append)
+        self.assertEqual(system.NodeCount, Device.objects.filter(System=system).count())
+        self.assertGreater(system.NodeCount, 0)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1.0)
+
+    def test_failed_sysml_write_leaves_nothing(self):
+        with mock.patch.object(sysml_import, "bulk_insert", _failing_insert(Connection)):
+            with self.assertRaisesMessage(ValueError, "No files were processed successfully"):
+                run_import_job(self.job("upload", "t1.sysml", "t2.sysml"), lambda fraction: None)
+        self.assertNothingImported()
+
+    def test_cancelled_import_leaves_nothing(self):
+        for mode, name in (("upload", "t1.sysml"), ("config", "ethernet_office.yaml")):
+            # Past parsing, while the rows are written.
+            with self.subTest(mode=mode), self.assertRaises(JobCancelled):
+                run_import_job(self.job(mode, name), _cancel_at(0.6))
+            self.assertNothingImported()
@@ -0,0 +1,168 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from ..jobs import INTERRUPTED, DatabaseJobStore, JobCancelled, JobLimitError, JobQueue, MemoryJobStore
+from ..models import SimulationJob, System
+from . import api_client
+
+
+def wait_for(queue, job_id, statuses=("succeeded", "failed", "cancelled"), timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {queue.store.get(job_id)['status']}")
+
+
+class GatedRunner:
+    """Runs until ``release`` is set, reporting progress meanwhile."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = []
+
+    def __call__(self, job, progress):
+        self.started.append(job["job_id"])
+        while not self.release.wait(0.01):
+            progress(0.5)
+        return b'{"ok": true}'
+
+
+class JobQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.store = MemoryJobStore()
+        self.runner = GatedRunner()
+        self.queues = []
+
+    def tearDown(self):
+        self.runner.release.set()
+        for queue in self.queues:
+            queue.stop()
+
+    def queue(self, **options):
+        """A queue of another process sharing ``self.store``."""
+        queue = JobQueue(self.store, self.runner, **{"workers": 2, "per_user": 1, "max_queued": 2, **options})
+        self.queues.append(queue)
+        return queue
+
+    def test_runs_and_stores_the_result(self):
+        queue = self.queue()
+        job = queue.submit(1, 7, 1, "snapshot", {})
+        self.runner.release.set()
+        finished = wait_for(queue, job["job_id"])
+        self.assertEqual((finished["status"], finished["progress"]), ("succeeded", 1.0))
+        self.assertEqual(queue.result(job["job_id"]), b'{"ok": true}')
+
+    def test_limits_are_counted_across_processes(self):
+        first, second = self.queue(), self.queue()
+        running = first.submit(1, 7, 1, "snapshot", {})["job_id"]
+        wait_for(first, running, ("running",))
+        # The user's one running slot is taken in the other process.
+        self.assertEqual(second.submit(1, 7, 1, "snapshot", {})["status"], "queued")
+        first.submit(1, 7, 1, "snapshot", {})
+        with self.assertRaisesMessage(JobLimitError, "At most 2 queued simulation jobs per user"):
+            second.submit(1, 7, 1, "snapshot", {})
+        self.assertEqual(second.submit(2, 7, 1, "snapshot", {})["status"], "running")
+
+    def test_queued_jobs_of_a_stopped_process_run_elsewhere(self):
+        # Left queued by a process that stopped before dispatching it.
+        self.store.create("a" * 32, 1, 7, 1, "snapshot", {})
+        queue = self.queue(heartbeat_s=0.02)
+        queue.start()
+        self.runner.release.set()
+        self.assertEqual(wait_for(queue, "a" * 32)["status"], "succeeded")
+
+    def test_cancel(self):
+        queue = self.queue()
+        running = queue.submit(1, 7, 1, "snapshot", {})["job_id"]
+        queued = queue.submit(1, 7, 1, "snapshot", {})["job_id"]
+        wait_for(queue, running, ("running",))
+        self.assertTrue(queue.cancel(queued))
+        self.assertTrue(queue.cancel(running))
+        self.assertEqual(wait_for(queue, running)["status"], "cancelled")
+        self.runner.release.set()
+        queue.stop()
+        self.assertEqual(self.runner.started, [running])
+        self.assertFalse(queue.cancel(running))
+
+    def test_progress_raises_once_cancelled(self):
+        raised = []
+
+        def runner(job, progress):
+            queue.cancel(job["job_id"])
+            try:
+                progress(0.5)
+            except JobCancelled:
+                raised.append(job["job_id"])
+                raise
+            return b"{}"
+
+        queue = JobQueue(MemoryJobStore(), runner)
+        self.queues.append(queue)
+        job_id = queue.submit(1, 7, 1, "snapshot", {})["job_id"]
+        self.assertEqual(wait_for(queue, job_id)["status"], "cancelled")
+        queue.stop()
+        self.assertEqual(raised, [job_id])
+
+    def test_runner_errors_fail_the_job(self):
+        def runner(job, progress):
+            raise ValueError("trials must be between 1 and 100000")
+
+        queue = JobQueue(MemoryJobStore(), runner)
+        self.queues.append(queue)
+        job = wait_for(queue, queue.submit(1, 7, 1, "snapshot", {})["job_id"])
+        self.assertEqual((job["status"], job["error"]), ("failed", "trials must be between 1 and 100000"))
+
+    def test_heartbeat_keeps_a_long_job_alive(self):
+        queue = self.queue(heartbeat_s=0.02, lease_s=0.1)
+        job_id = queue.submit(1, 7, 1, "snapshot", {})["job_id"]
+        time.sleep(0.4)
+        self.assertEqual(self.store.get(job_id)["status"], "running")
+        self.runner.release.set()
+        self.assertEqual(wait_for(queue, job_id)["status"], "succeeded")
+
+
+class DatabaseJobStoreTests(TestCase):
+    def setUp(self):
+        self.user, _ = api_client()
+        self.system = System.objects.create(Name="s", User=self.user, Version=1)
+        self.store = DatabaseJobStore()
+
+    def job(self, job_id, status="queued", heartbeat=None, owner=None):
+        self.store.create(job_id, (owner or self.user).id, self.system.id, 1, "snapshot", {})
+        SimulationJob.objects.filter(JobId=job_id).update(Status=status, HeartbeatAt=heartbeat)
+
+    def test_counts_and_queue_order(self):
+        other, _ = api_client("other")
+        self.job("q1")
+        self.job("q2", owner=other)
+        self.job("r1", "running", timezone.now())
+        self.job("r2", "running", timezone.now(), owner=other)
+        self.job("r3", "running", timezone.now(), owner=other)
+        self.assertEqual(self.store.count(self.user.id, ("queued", "running")), 2)
+        self.assertEqual(self.store.running_counts(), {self.user.id: 1, other.id: 2})
+        self.assertEqual(self.store.queued(), [("q1", self.user.id), ("q2", other.id)])
+
+    def test_stale_running_jobs_are_failed_then_purged(self):
+        now = timezone.now()
+        self.job("old", "running", now - timedelta(minutes=5))
+        self.job("legacy", "running")
+        self.job("fresh", "running", now)
+        self.job("queued")
+        queue = JobQueue(self.store, None, lease_s=60, retention_s=3600)
+        queue.purge()
+        jobs = {job_id: self.store.get(job_id) for job_id in ("old", "legacy", "fresh", "queued")}
+        self.assertEqual({job_id: job["status"] for job_id, job in jobs.items()},
+                         {"old": "failed", "legacy": "failed", "fresh": "running", "queued": "queued"})
+        self.assertEqual(jobs["old"]["error"], INTERRUPTED)
+        self.assertIsNotNone(jobs["legacy"]["finished_at"])
+
+        self.store.heartbeat(["fresh"], now + timedelta(minutes=2))
+        JobQueue(self.store, None, lease_s=60, retention_s=0).purge()
+        self.assertEqual(sorted(SimulationJob.objects.values_list("JobId", flat=True)), ["fresh", "queued"])
@@ -0,0 +1,61 @@
+import numpy as np
+from django.test import TestCase
+
+from ..loader import simulation_records
+from ..models import Connection, Device, FirewallRule, Port, System, TrafficProfile
+from ..sim.compiled import load_system
+from ..simulation import compute_simulation
+from . import ASSETS, api_client, clear_simulation_caches, import_config
+from .test_simulation import _normalized
+
+
+def _objects(system, version):
+    """The same inputs as model instances, the way the views used to load them."""
+    rows = {"System": system, "SystemVersion": version}
+    return (
+        list(Device.objects.filter(**rows).order_by("id").prefetch_related("ports")),
+        list(Connection.objects.filter(**rows).order_by("id")),
+        list(TrafficProfile.objects.filter(**rows).order_by("id").select_related("Device")),
+        list(FirewallRule.objects.filter(**rows).order_by("id")),
+    )
+
+
+class SimulationRecordsTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+
+    def assertSameInputs(self, system, version=1):
+        objects = _objects(system, version)
+        with self.assertNumQueries(5):
+            records = load_system(*simulation_records(system, version))
+        instances = load_system(*objects)
+        self.assertEqual(records.digest(), instances.digest())
+        for name in ("error_rate", "jitter", "failure"):
+            np.testing.assert_array_equal(getattr(records.topology, name), getattr(instances.topology, name))
+        self.assertEqual(
+            _normalized(compute_simulation(*simulation_records(system, version))),
+            _normalized(compute_simulation(*objects)),
+        )
+
+    def test_sample_configs(self):
+        for path in sorted(ASSETS.glob("ethernet_*")):
+            with self.subTest(config=path.name):
+                self.assertSameInputs(System.objects.get(id=import_config(self.client, path.name)))
+
+    def test_json_keys_and_ports(self):
+        system = System.objects.get(id=import_config(self.client, "ethernet_office.yaml"))
+        device, other = Device.objects.filter(System=system).order_by("id")[:2]
+        device.AdditionalAsJson = {"TrafficRateMbps": 33, "DeviceType": "Router", "notes": "ignored"}
+        device.save()
+        other.AdditionalAsJson = {"deviceType": "firewall"}
+        other.save()
+        Port.objects.create(System=system, Device=device, Name="access", AccessVlan=30)
+        Port.objects.create(System=system, Device=device, Name="trunk", IsTrunk=True, AccessVlan=40)
+        connection, plain = Connection.objects.filter(System=system).order_by("id")[:2]
+        connection.ConnectionDetails = {"jitter_ms": 1.5, "failure_probability": 0.1, "media": "fiber"}
+        connection.ErrorRate = 0.01
+        connection.save()
+        plain.ConnectionDetails = {"media": "copper"}
+        plain.save()
+        self.assertSameInputs(system)
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from .. import views
+from ..models import TrafficProfile
+from ..sim.memo import FileResultStore, MemoryResultStore
+from ..simulation import invalidate_simulation_cache
+from . import api_client, clear_simulation_caches, import_config
+
+
+class SimulationMemoTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+        self.system_id = import_config(self.client, "ethernet_office.yaml")
+        patcher = mock.patch.object(views, "simulation_results", MemoryResultStore(64 * 1024 * 1024))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def simulate(self, **options):
+        response = self.client.post("/api/v1/simulate/", {"system_id": self.system_id, **options}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        body, flag = response.content.rsplit(b',"cache_hit":', 1)
+        return body, flag == b"true}"
+
+    def test_repeated_request_is_served_from_the_memo(self):
+        first, hit = self.simulate()
+        self.assertFalse(hit)
+        again, hit = self.simulate()
+        self.assertTrue(hit)
+        self.assertEqual(again, first)
+        # Other engine options are other results.
+        self.assertFalse(self.simulate(allocation="sequential")[1])
+
+    def test_content_change_misses(self):
+        first, _ = self.simulate()
+        profile = TrafficProfile.objects.filter(System_id=self.system_id).first()
+        for flow in profile.Profile["flows"]:
+            flow["rate_mbps"] = 1
+        profile.save()
+        invalidate_simulation_cache(self.system_id)
+        changed, hit = self.simulate()
+        self.assertFalse(hit)
+        self.assertNotEqual(changed, first)
+        self.assertTrue(self.simulate()[1])
+
+
+class ResultStoreTests(SimpleTestCase):
+    def test_memory_store_drops_the_least_recently_used(self):
+        store = MemoryResultStore(25)
+        store.set("a", b"a" * 10)
+        store.set("b", b"b" * 10)
+        self.assertEqual(store.get("a"), b"a" * 10)
+        store.set("c", b"c" * 10)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual((store.get("a"), store.get("c")), (b"a" * 10, b"c" * 10))
+        store.set("big", b"x" * 26)
+        self.assertIsNone(store.get("big"))
+
+    def test_file_store_drops_the_least_recently_used(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        store = FileResultStore(directory, 25)
+        store.set("a", b"a" * 10)
+        store.set("b", b"b" * 10)
+        os.utime(os.path.join(directory, "a.json"), (1000, 1000))
+        os.utime(os.path.join(directory, "b.json"), (2000, 2000))
+        # Reading refreshes ``a``, which leaves ``b`` the oldest.
+        self.assertEqual(store.get("a"), b"a" * 10)
+        store.set("c", b"c" * 10)
+        self.assertIsNone(store.get("b"))
+        self.assertEqual((store.get("a"), store.get("c")), (b"a" * 10, b"c" * 10))
+        store.set("big", b"x" * 26)
+        self.assertIsNone(store.get("big"))
+        self.assertEqual(sorted(os.listdir(directory)), ["a.json", "c.json"])
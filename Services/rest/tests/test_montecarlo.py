@@ -0,0 +1,40 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ..sim.compiled import load_system
+from ..sim.montecarlo import monte_carlo
+from .test_simulation import random_system
+
+
+class MonteCarloTests(SimpleTestCase):
+    def setUp(self):
+        devices, connections, traffic_profiles, firewall_rules = random_system(4, n_devices=30, n_flows=80)
+        rnd = random.Random(4)
+        for connection in connections:
+            connection.ErrorRate = rnd.choice([None, 0.001, 0.01])
+            connection.ConnectionDetails = {"jitter_ms": rnd.choice([0, 0.5, 2])}
+        self.system = load_system(devices, connections, traffic_profiles, firewall_rules)
+
+    def run_trials(self, **options):
+        report = monte_carlo(self.system, trials=200, failure_probability=0.05, time_budget_s=None, **options)
+        report.pop("elapsed_s")
+        return report
+
+    def test_fixed_seed_is_reproducible(self):
+        report = self.run_trials(seed=7)
+        self.assertEqual((report["trials"], report["truncated"], report["seed"]), (200, False, 7))
+        self.assertTrue(report["flows"])
+        self.assertEqual(self.run_trials(seed=7), report)
+        # The samples do not depend on how the chunks are spread over workers.
+        self.assertEqual(self.run_trials(seed=7, workers=2), report)
+        self.assertNotEqual(self.run_trials(seed=8)["flows"], report["flows"])
+
+    def test_generated_seed_is_reported(self):
+        report = self.run_trials()
+        self.assertEqual(self.run_trials(seed=report["seed"]), report)
+
+    def test_invalid_options(self):
+        for options in ({"trials": 0}, {"failure_probability": 1.5}, {"time_budget_s": 0}):
+            with self.subTest(**options), self.assertRaises(ValueError):
+                monte_carlo(self.system, **options)
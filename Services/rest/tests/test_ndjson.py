@@ -0,0 +1,56 @@
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from .. import simulation
+from ..simulation import compute_simulation, simulation_ndjson
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import _normalized, random_system
+
+
+def _parsed(chunks):
+    """The records of an NDJSON stream, grouped by ``type``."""
+    records = {"flow": [], "link": [], "summary": []}
+    for line in b"".join(chunks).decode().splitlines():
+        record = json.loads(line)
+        records[record.pop("type")].append(record)
+    return records
+
+
+class NdjsonTests(SimpleTestCase):
+    def test_stream_matches_the_snapshot(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                inputs = random_system(seed)
+                snapshot = _normalized(compute_simulation(*inputs))
+                with mock.patch.object(simulation, "NDJSON_BATCH", 7):
+                    chunks = list(simulation_ndjson(*inputs))
+                self.assertGreater(len(chunks), 1)
+                self.assertTrue(all(chunk.endswith(b"\n") for chunk in chunks))
+                records = _parsed(chunks)
+                self.assertEqual(records["flow"], snapshot["flows"])
+                self.assertEqual(records["link"], snapshot["links"])
+                (summary,) = records["summary"]
+                self.assertEqual(
+                    (summary["flows"], summary["links"]), (len(snapshot["flows"]), len(snapshot["links"]))
+                )
+                self.assertEqual(
+                    summary["ok"], sum(flow["status"] == "ok" for flow in snapshot["flows"])
+                )
+
+
+class NdjsonViewTests(TestCase):
+    def test_stream_matches_the_json_response(self):
+        clear_simulation_caches()
+        _, client = api_client()
+        request = {"system_id": import_config(client, "ethernet_office.yaml"), "metric": "latency"}
+        snapshot = client.post("/api/v1/simulate/", request, format="json").json()
+
+        response = client.post("/api/v1/simulate/", {**request, "format": "ndjson"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = _parsed(response.streaming_content)
+        self.assertEqual(records["flow"], snapshot["flows"])
+        self.assertEqual(records["link"], snapshot["links"])
+        self.assertEqual(len(records["summary"]), 1)
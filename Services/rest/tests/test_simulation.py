@@ -0,0 +1,263 @@
+import json
+import random
+from types import SimpleNamespace
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Connection, Device, FirewallRule, System, TrafficProfile
+from ..sim.allocation import max_min_allocation
+from ..sim.incidence import Incidence
+from ..simulation import compute_simulation
+from . import ASSETS, api_client, clear_simulation_caches, import_config
+from .baseline import compute_simulation as baseline_simulation
+
+
+def _normalized(result):
+    return json.loads(json.dumps(result, sort_keys=True))
+
+
+def _device(id, label, device_type="switch", online=True, rate=None):
+    extra = {"TrafficRateMbps": rate} if rate is not None else None
+    return SimpleNamespace(
+        id=id, AssetId=label, AssetName=None, DeviceType=device_type, IsOnline=online, AdditionalAsJson=extra
+    )
+
+
+def _link(id, source, target, bandwidth=None, latency=None):
+    return SimpleNamespace(
+        id=id,
+        Source_id=source.id,
+        Target_id=target.id,
+        BandwidthMbps=bandwidth,
+        LatencyMs=latency,
+        IsTrunk=False,
+        AllowedVlans=None,
+        ErrorRate=None,
+        ConnectionDetails=None,
+    )
+
+
+def _profile(device, flows):
+    return SimpleNamespace(Device=device, Device_id=device.id, Profile={"flows": flows})
+
+
+def random_system(seed, n_devices=40, n_flows=200, profiles=True):
+    """Devices, connections, traffic profiles and firewall rules of a random
+    tree with extra links, some offline devices and one isolated host."""
+    rnd = random.Random(seed)
+    devices = [
+        _device(
+            1000 + i,
+            f"d{i}",
+            "host" if i % 3 == 0 else "firewall" if i % 7 == 0 else "switch",
+            online=rnd.random() > 0.05,
+            rate=rnd.choice([5, 10, 50]),
+        )
+        for i in range(n_devices)
+    ]
+    connections = [
+        _link(
+            i,
+            devices[rnd.randrange(i)],
+            devices[i],
+            rnd.choice([None, 40, 100, 1000]),
+            rnd.choice([None, 0.5, 1, 2]),
+        )
+        for i in range(1, n_devices)
+    ]
+    for i in range(n_devices, n_devices + n_devices // 2):
+        source, target = rnd.sample(devices, 2)
+        connections.append(_link(i, source, target, rnd.choice([None, 100, 1000]), rnd.choice([None, 1, 3])))
+    devices.append(_device(99999, "isolated", "host"))
+
+    traffic_profiles = []
+    if profiles:
+        by_source = {}
+        for _ in range(n_flows):
+            flow = {
+                "to": rnd.choice(devices).AssetId if rnd.random() > 0.02 else "missing",
+                "protocol": rnd.choice(["tcp", "udp", "TCP"]),
+                "dst_port": rnd.choice([443, 22, 80, None]),
+                "rate_mbps": rnd.choice([1, 10, 100, 300]),
+            }
+            if rnd.random() < 0.2:
+                flow["src_port"] = rnd.choice([1000, 2000])
+            source = rnd.randrange(n_devices)
+            by_source.setdefault(source, []).append(flow)
+        traffic_profiles = [_profile(devices[source], flows) for source, flows in by_source.items()]
+
+    firewall_rules = [
+        SimpleNamespace(
+            Device_id=rnd.choice(devices).id,
+            Action=rnd.choice(["deny", "allow", "Deny"]),
+            Protocol=rnd.choice([None, "tcp", "udp"]),
+            Src=rnd.choice([None, None, rnd.choice(devices).AssetId]),
+            Dst=rnd.choice([None, None, rnd.choice(devices).AssetId]),
+            SrcPort=rnd.choice([None, None, 1000]),
+            DstPort=rnd.choice([None, 22, 443, 80]),
+            Vlan=None,
+        )
+        for _ in range(n_devices // 2)
+    ]
+    return devices, connections, traffic_profiles, firewall_rules
+
+
+class SequentialAllocationTests(SimpleTestCase):
+    def test_matches_the_baseline(self):
+        for seed in range(12):
+            for profiles in (True, False):
+                with self.subTest(seed=seed, profiles=profiles):
+                    inputs = random_system(seed, n_devices=30 + seed, profiles=profiles)
+                    self.assertEqual(
+                        _normalized(compute_simulation(*inputs, allocation="sequential")),
+                        _normalized(baseline_simulation(*inputs)),
+                    )
+
+
+class SampleConfigTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+
+    def test_sequential_allocation_matches_the_baseline(self):
+        for path in sorted(ASSETS.glob("ethernet_*")):
+            with self.subTest(config=path.name):
+                system = System.objects.get(id=import_config(self.client, path.name))
+                inputs = (
+                    list(Device.objects.filter(System=system)),
+                    list(Connection.objects.filter(System=system)),
+                    list(TrafficProfile.objects.filter(System=system).select_related("Device")),
+                    list(FirewallRule.objects.filter(System=system)),
+                )
+                self.assertEqual(
+                    _normalized(compute_simulation(*inputs, allocation="sequential")),
+                    _normalized(baseline_simulation(*inputs)),
+                )
+
+
+def progressive_filling(paths, demand, capacity):
+    """Max-min fair rates the textbook way: raise every unfrozen row by the
+    same amount until a row reaches its demand or a link fills up."""
+    allocated = np.zeros(len(paths))
+    active = [row for row, path in enumerate(paths) if demand[row] > 0]
+    for row in list(active):
+        if not paths[row]:
+            allocated[row] = demand[row]
+            active.remove(row)
+    remaining = capacity.astype(float)
+    while active:
+        users = np.zeros(len(capacity))
+        for row in active:
+            users[paths[row]] += 1
+        step = min(
+            [remaining[link] / users[link] for link in range(len(capacity)) if users[link]]
+            + [demand[row] - allocated[row] for row in active]
+        )
+        allocated[active] += step
+        remaining -= step * users
+        active = [
+            row
+            for row in active
+            if demand[row] - allocated[row] > 1e-9 * max(1, demand[row])
+            and all(remaining[link] > 1e-9 * max(1, capacity[link]) for link in paths[row])
+        ]
+    return allocated
+
+
+def _random_incidence(rng):
+    n_links = int(rng.integers(1, 12))
+    n_rows = int(rng.integers(1, 30))
+    paths = [
+        [int(link) for link in rng.choice(n_links, size=rng.integers(0, min(n_links, 4) + 1), replace=False)]
+        for _ in range(n_rows)
+    ]
+    demand = rng.choice([0, 1, 5, 10, 50, 100], size=n_rows).astype(float)
+    capacity = rng.choice([10, 40, 100], size=n_links).astype(float)
+    return paths, demand, capacity
+
+
+class MaxMinAllocationTests(SimpleTestCase):
+    def allocate(self, paths, demand, capacity):
+        incidence = Incidence.from_paths(paths, len(capacity))
+        return max_min_allocation(incidence, demand, capacity, np.ones(len(paths), dtype=bool))
+
+    def test_matches_progressive_filling(self):
+        rng = np.random.default_rng(0)
+        for trial in range(200):
+            paths, demand, capacity = _random_incidence(rng)
+            with self.subTest(trial=trial):
+                np.testing.assert_allclose(
+                    self.allocate(paths, demand, capacity), progressive_filling(paths, demand, capacity), rtol=1e-6
+                )
+
+    def test_row_order_does_not_matter(self):
+        rng = np.random.default_rng(1)
+        for trial in range(100):
+            paths, demand, capacity = _random_incidence(rng)
+            order = rng.permutation(len(paths))
+            with self.subTest(trial=trial):
+                np.testing.assert_allclose(
+                    self.allocate([paths[row] for row in order], demand[order], capacity),
+                    self.allocate(paths, demand, capacity)[order],
+                    rtol=1e-12,
+                )
+
+    def test_flow_order_does_not_change_the_simulation(self):
+        for seed in range(5):
+            devices, connections, traffic_profiles, firewall_rules = random_system(seed)
+            reordered = [
+                _profile(profile.Device, list(reversed(profile.Profile["flows"])))
+                for profile in reversed(traffic_profiles)
+            ]
+            with self.subTest(seed=seed):
+                result = _normalized(compute_simulation(devices, connections, traffic_profiles, firewall_rules))
+                other = _normalized(compute_simulation(devices, connections, reordered, firewall_rules))
+                self.assertEqual(other["links"], result["links"])
+                self.assertCountEqual(other["flows"], result["flows"])
+
+
+class RoutingTests(SimpleTestCase):
+    """``a`` reaches ``d`` through ``b`` or through ``c``."""
+
+    def simulate(self, upper, lower, metric, rate=100):
+        a, b, c, d = _device(1, "a", "host"), _device(2, "b"), _device(3, "c"), _device(4, "d", "host")
+        connections = [
+            _link(1, a, b, *upper),
+            _link(2, b, d, *upper),
+            _link(3, a, c, *lower),
+            _link(4, c, d, *lower),
+        ]
+        result = compute_simulation(
+            [a, b, c, d], connections, [_profile(a, [{"to": "d", "rate_mbps": rate}])], [], metric=metric
+        )
+        (flow,) = result["flows"]
+        return flow, [link["utilization"] for link in result["links"]]
+
+    def test_hops_takes_one_shortest_path(self):
+        flow, utilization = self.simulate((None, 1), (None, 1), "hops")
+        self.assertEqual([hop["to"] for hop in flow["path"]], ["b", "d"])
+        self.assertNotIn("ecmp_paths", flow)
+        self.assertEqual(utilization, [0.1, 0.1, 0, 0])
+
+    def test_equal_cost_paths_share_the_flow(self):
+        for metric in ("latency", "bandwidth"):
+            with self.subTest(metric=metric):
+                flow, utilization = self.simulate((None, 1), (None, 1), metric)
+                self.assertEqual(flow["ecmp_paths"], 2)
+                self.assertEqual(utilization, [0.05] * 4)
+
+    def test_equal_cost_paths_are_allocated_separately(self):
+        flow, _ = self.simulate((60, 1), (60, 1), "latency")
+        self.assertEqual(flow["achieved_mbps"], 100.0)
+        flow, _ = self.simulate((60, 1), (60, 1), "hops")
+        self.assertEqual(flow["achieved_mbps"], 60.0)
+
+    def test_weighted_metrics_pick_the_cheapest_path(self):
+        # The upper path is slow but wide, the lower one fast but narrow.
+        upper, lower = (1000, 5), (100, 1)
+        flow, _ = self.simulate(upper, lower, "latency")
+        self.assertEqual(([hop["to"] for hop in flow["path"]], flow["latency_ms"]), (["c", "d"], 2.0))
+        flow, _ = self.simulate(upper, lower, "bandwidth")
+        self.assertEqual(([hop["to"] for hop in flow["path"]], flow["latency_ms"]), (["b", "d"], 10.0))
+        self.assertNotIn("ecmp_paths", flow)
@@ -0,0 +1,50 @@
+import io
+
+from django.test import SimpleTestCase
+
+from ..sysml_import import SKIPPED_REPORTED, read_sysml
+
+
+def _read(text):
+    return read_sysml(io.BytesIO(text.encode()))
+
+
+class ReadSysMLTests(SimpleTestCase):
+    def test_skipped_connections_are_returned_and_logged(self):
+        text = (
+            "package Devices {\n"
+            '  part instance 1: Device { assetName = "A"; }\n'
+            '  part instance 2: Device { assetName = "B"; }\n'
+            "}\n"
+            "package Connections {\n"
+            '  part instance 1 -> 2::DeviceConnection { connectionType = "ethernet"; }\n'
+            '  part instance 1 -> 9::DeviceConnection { connectionType = "ethernet"; }\n'
+            '  part instance 2 -> 1::DeviceConnection { connectionType = "' + "x" * 300 + '"; }\n'
+            "}\n"
+        )
+        with self.assertLogs("Services.rest.sysml_import", "WARNING") as logs:
+            parsed = _read(text)
+        self.assertIn("Skipped 2 of 3 SysML connections; first at line 7", logs.output[0])
+        self.assertEqual([(source, target) for source, target, _, _ in parsed.connections], [("1", "2")])
+        summary = parsed.summary()
+        self.assertEqual(summary["connections_skipped"], 2)
+        self.assertEqual(
+            [(s["source"], s["target"], s["line"]) for s in summary["skipped_connections"]],
+            [("1", "9", 7), ("2", "1", 8)],
+        )
+        self.assertEqual(summary["skipped_connections"][0]["error"], "Device with ID 9 not found")
+        self.assertTrue(summary["skipped_connections"][1]["error"].startswith("connectionType: "))
+
+    def test_skipped_connections_listed_are_capped(self):
+        lines = ['part instance 1: Device { assetName = "A"; }']
+        lines += [f"part instance 1 -> {k}::DeviceConnection {{ }}" for k in range(2, SKIPPED_REPORTED + 12)]
+        with self.assertLogs("Services.rest.sysml_import", "WARNING"):
+            summary = _read("\n".join(lines)).summary()
+        self.assertEqual(summary["connections_skipped"], SKIPPED_REPORTED + 10)
+        self.assertEqual(len(summary["skipped_connections"]), SKIPPED_REPORTED)
+
+    def test_invalid_device_field(self):
+        with self.assertRaisesMessage(ValueError, "Error creating device with ID 1 (line 1): assetCostAmount:"):
+            _read('part instance 1: Device { assetCostAmount = "lots"; }')
+        with self.assertRaisesMessage(ValueError, "No valid device definitions found"):
+            _read("package Empty { }")
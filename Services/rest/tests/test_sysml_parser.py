@@ -0,0 +1,85 @@
+import io
+
+from django.test import SimpleTestCase
+
+from ..sysml_parser import ConnectionBlock, DeviceBlock, SysMLSyntaxError, parse_sysml, tokenize
+from . import ASSETS
+
+
+def _parse(text, chunk_size=64 * 1024):
+    return list(parse_sysml(io.BytesIO(text.encode()), chunk_size))
+
+
+def _tokens(text, chunk_size=64 * 1024):
+    return [(token.kind, token.text, token.line, token.column) for token in tokenize(io.BytesIO(text.encode()), chunk_size)]
+
+
+class ParseSysMLTests(SimpleTestCase):
+    def test_devices_and_connections(self):
+        blocks = _parse(
+            'package Devices {\n'
+            '  part instance 1: Device { assetName = "A"; weight = 1.5; online = true; }\n'
+            '  part def Other { x = 1; }\n'
+            '  part instance 1 -> 2::DeviceConnection { nested = { list = [1, "two"]; }; }\n'
+            '}\n'
+        )
+        self.assertEqual([type(block) for block in blocks], [DeviceBlock, ConnectionBlock])
+        self.assertEqual(blocks[0].attributes, {"assetName": "A", "weight": 1.5, "online": True})
+        self.assertEqual((blocks[0].line, blocks[0].column), (2, 3))
+        self.assertEqual((blocks[1].source, blocks[1].target), ("1", "2"))
+        self.assertEqual(blocks[1].attributes, {"nested": {"list": [1, "two"]}})
+
+    def test_chunk_size_does_not_change_the_result(self):
+        raw = (ASSETS / "t2.sysml").read_bytes()
+        whole = list(parse_sysml(io.BytesIO(raw)))
+        chunked = list(parse_sysml(io.BytesIO(raw), 7))
+        self.assertGreater(len(whole), 0)
+        self.assertEqual(
+            [(type(b), b.attributes, b.line, b.column) for b in whole],
+            [(type(b), b.attributes, b.line, b.column) for b in chunked],
+        )
+
+    def test_syntax_errors_have_positions(self):
+        cases = [
+            ('package A { part instance 1: Device { a = "x"; b = ; } }', 1, 52, "expected a value for 'b'"),
+            ('package A {\n  part instance 1: Device {\n    a = "open;\n  }\n}', 3, 9, "unterminated string"),
+            ("package A { } }", 1, 15, "unmatched '}'"),
+            ("/* open comment", 1, 1, "unterminated comment"),
+        ]
+        for text, line, column, message in cases:
+            with self.subTest(text=text), self.assertRaises(SysMLSyntaxError) as caught:
+                _parse(text, 5)
+            self.assertEqual((caught.exception.line, caught.exception.column), (line, column))
+            self.assertIn(message, caught.exception.message)
+
+
+class WhitespaceTests(SimpleTestCase):
+    """Long whitespace runs once made a failed token match backtrack
+    exponentially; these inputs would not finish."""
+
+    def test_long_whitespace_before_an_invalid_character(self):
+        for space in (" " * 64, "\n    " * 64, "\t \n" * 2000):
+            with self.subTest(length=len(space)), self.assertRaises(SysMLSyntaxError) as caught:
+                _parse("package A {" + space + "$ }")
+            self.assertIn("unexpected character '$'", caught.exception.message)
+
+    def test_trailing_blank_lines(self):
+        raw = (ASSETS / "t1.sysml").read_text()
+        blocks = _parse(raw)
+        self.assertEqual(len(_parse(raw + "\n" * 5000)), len(blocks))
+        self.assertEqual(len(_parse(raw + "\n    " * 5000, 1024)), len(blocks))
+
+    def test_chunk_boundary_inside_whitespace(self):
+        text = "package A {" + " " * 100000 + "part instance 1: Device { a = 1; }\n" + "\n" * 1000 + "}"
+        for chunk_size in (1, 7, 1000, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                tokens = _tokens(text, chunk_size)
+                self.assertEqual(tokens[3], ("name", "part", 1, 100012))
+                self.assertEqual(tokens[-2], ("punct", "}", 1002, 1))
+                self.assertEqual(len(_parse(text, chunk_size)), 1)
+
+    def test_chunk_boundary_inside_comments(self):
+        text = "package A {" + "\n  // note\n  /* block */" * 2000 + "\n  // last" + "\n}"
+        for chunk_size in (3, 64):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(_tokens(text, chunk_size)[-2], ("punct", "}", 4003, 1))
@@ -0,0 +1,66 @@
+from django.test import SimpleTestCase, TestCase
+
+from ..sim.compiled import load_system
+from ..sim.timeseries import simulate_time_series
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import _device, _link, _profile
+
+
+class TimeSeriesTests(SimpleTestCase):
+    def simulate(self, flows, **options):
+        a, x, b = _device(1, "a", "host"), _device(2, "x"), _device(3, "b", "host")
+        system = load_system([a, x, b], [_link(1, a, x, 100), _link(2, x, b, 1000)], [_profile(a, flows)], [])
+        return simulate_time_series(system, **options)
+
+    def test_step_count(self):
+        for step, hours, steps in ((1, 24, 1440), (15, 24, 96), (60, 2, 2), (30, 168, 336)):
+            with self.subTest(step=step, hours=hours):
+                result = self.simulate([{"to": "b", "rate_mbps": 10}], step_minutes=step, duration_hours=hours)
+                self.assertEqual((result["step_minutes"], result["steps"]), (step, steps))
+                self.assertEqual([len(link["utilization"]) for link in result["links"]], [steps, steps])
+                self.assertEqual(len(result["peak_hours"]["network"]["hourly_offered_mbps"]), hours)
+
+    def test_diurnal_profile(self):
+        result = self.simulate(
+            [
+                {"to": "b", "rate_mbps": 10},
+                {"to": "b", "rate_mbps": 80, "diurnal": {"min_mbps": 0, "peak_hour": 18}},
+            ],
+            step_minutes=15,
+        )
+        utilization = result["links"][0]["utilization"]
+        # 10 Mbps constant plus a cosine from 0 at 06:00 to 80 at 18:00.
+        self.assertEqual((utilization[6 * 4], utilization[12 * 4], utilization[18 * 4]), (0.1, 0.5, 0.9))
+        self.assertEqual(max(utilization), 0.9)
+        busiest = result["peak_hours"]["links"][0]
+        self.assertEqual(
+            (busiest["from"], busiest["peak_minute"], busiest["busiest_hour"], busiest["overloaded_minutes"]),
+            ("a", 18 * 60, 18, 0),
+        )
+        self.assertEqual(result["peak_hours"]["network"]["peak_hour"], 18)
+
+    def test_invalid_grid(self):
+        for options in ({"step_minutes": 7}, {"duration_hours": 0}, {"duration_hours": 7 * 24 + 1}):
+            with self.subTest(**options), self.assertRaises(ValueError):
+                self.simulate([{"to": "b", "rate_mbps": 10}], **options)
+
+    def test_peak_report_only(self):
+        result = self.simulate([{"to": "b", "rate_mbps": 10}], include_series=False)
+        self.assertNotIn("links", result)
+        self.assertEqual(result["steps"], 1440)
+
+
+class TimeSeriesViewTests(TestCase):
+    def test_mode(self):
+        clear_simulation_caches()
+        _, client = api_client()
+        system_id = import_config(client, "ethernet_office.yaml")
+        response = client.post(
+            "/api/v1/simulate/",
+            {"system_id": system_id, "mode": "time_series", "step_minutes": 30, "duration_hours": 48},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        result = response.json()
+        self.assertEqual(result["steps"], 96)
+        self.assertTrue(all(len(link["utilization"]) == 96 for link in result["links"]))
@@ -0,0 +1,50 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase
+
+from ..upload_import import parse_uploads
+from . import ASSETS, use_temporary_media
+
+
+def _outcome(parsed):
+    """A comparable view of ``parse_uploads`` results."""
+    return [
+        (
+            result,
+            None
+            if sysml is None
+            else (
+                [(device.AssetId, device.AssetName, device.DeviceType) for device in sysml.devices],
+                sysml.connections,
+                sysml.skipped,
+            ),
+        )
+        for result, sysml in parsed
+    ]
+
+
+class ParseUploadsTests(SimpleTestCase):
+    def setUp(self):
+        use_temporary_media(self)
+        files = [(f"t{index}.sysml", (ASSETS / f"t{index}.sysml").read_bytes()) for index in range(1, 6)]
+        files[2:2] = [
+            ("broken.sysml", b"package Devices {\n  part instance 1: Device {\n"),
+            ("devices.csv", b"id,name\n1,a\n2,b\n"),
+            ("notes.txt", b"not an upload"),
+        ]
+        self.uploads = [
+            (name, default_storage.save(f"uploads/{name}", ContentFile(data)), len(data)) for name, data in files
+        ]
+
+    def test_workers_keep_the_upload_order(self):
+        serial = parse_uploads(self.uploads)
+        self.assertEqual([result["file_name"] for result, _ in serial], [name for name, _, _ in self.uploads])
+        self.assertEqual(
+            [result["status"] for result, _ in serial],
+            ["success", "success", "error", "success", "error", "success", "success", "success"],
+        )
+        progress = []
+        pooled = parse_uploads(self.uploads, workers=2, progress=progress.append)
+        self.assertEqual(_outcome(pooled), _outcome(serial))
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1.0)
@@ -0,0 +1,143 @@
+import copy
+import random
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Connection, Device, FirewallRule, System, TrafficProfile
+from ..sim.compiled import load_system
+from ..sim.engine import run_simulation
+from ..sim.versiondiff import VersionDiff, version_result
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import _device, _link, _normalized, _profile, random_system
+
+
+def _deny(device, **match):
+    fields = {"Protocol": None, "Src": None, "Dst": None, "SrcPort": None, "DstPort": None, "Vlan": None, **match}
+    return SimpleNamespace(Device_id=device.id, Action="deny", **fields)
+
+
+def _mutated(inputs, seed, kinds):
+    """A copy of ``inputs`` with random changes of the given ``kinds``."""
+    rnd = random.Random(seed)
+    devices, connections, traffic_profiles, firewall_rules = copy.deepcopy(inputs)
+    if "rules" in kinds:
+        for _ in range(3):
+            if firewall_rules:
+                firewall_rules.pop(rnd.randrange(len(firewall_rules)))
+        firewall_rules += [_deny(rnd.choice(devices)) for _ in range(2)]
+    if "rates" in kinds:
+        for profile in traffic_profiles:
+            for flow in profile.Profile["flows"]:
+                if rnd.random() < 0.1:
+                    flow["rate_mbps"] = rnd.choice([1, 50, 500])
+    if "capacity" in kinds:
+        for connection in connections:
+            if rnd.random() < 0.1:
+                connection.BandwidthMbps = rnd.choice([10, 100, 1000])
+    if "links" in kinds:
+        connections.pop(rnd.randrange(len(connections)))
+        source, target = rnd.sample(devices[:-1], 2)
+        connections.append(_link(10 ** 6, source, target, 1000, 1))
+    return devices, connections, traffic_profiles, firewall_rules
+
+
+class DerivedResultTests(SimpleTestCase):
+    def assertDerivedMatchesFullRun(self, old_inputs, new_inputs, metric="hops", allocation="max_min"):
+        old_system = load_system(*old_inputs)
+        system = load_system(*new_inputs)
+        baseline = version_result(old_system, metric, allocation)
+        derived = VersionDiff(old_system, baseline, system, metric, allocation)
+        full = run_simulation(
+            system.topology, system.flows.copy(), system.firewall, metric=metric, allocation=allocation
+        )
+        self.assertTrue(derived.incremental)
+        self.assertEqual(_normalized(derived.current.as_dict()), _normalized(full.as_dict()))
+        return derived
+
+    def test_blocked_flow_releases_its_links(self):
+        # a and b share the 100 Mbps x -> d link until a is denied.
+        a, b, x, d = _device(1, "a", "host"), _device(2, "b", "host"), _device(3, "x"), _device(4, "d", "host")
+        inputs = (
+            [a, b, x, d],
+            [_link(1, a, x), _link(2, b, x), _link(3, x, d, 100)],
+            [_profile(a, [{"to": "d", "rate_mbps": 100}]), _profile(b, [{"to": "d", "rate_mbps": 100}])],
+            [],
+        )
+        blocked = (*inputs[:3], [_deny(a)])
+        for allocation in ("max_min", "sequential"):
+            with self.subTest(allocation=allocation):
+                derived = self.assertDerivedMatchesFullRun(inputs, blocked, allocation=allocation)
+                self.assertEqual([flow["achieved_mbps"] for flow in derived.current.as_dict()["flows"]], [0, 100.0])
+                # And back: the unblocked flow takes its share again.
+                self.assertDerivedMatchesFullRun(blocked, inputs, allocation=allocation)
+
+    def test_matches_a_full_run(self):
+        for kinds in (("rules",), ("rates",), ("capacity",), ("links",), ("rules", "rates", "capacity", "links")):
+            for metric in ("hops", "latency"):
+                for allocation in ("max_min", "sequential"):
+                    for seed in range(8):
+                        with self.subTest(kinds=kinds, metric=metric, allocation=allocation, seed=seed):
+                            inputs = random_system(seed)
+                            self.assertDerivedMatchesFullRun(
+                                inputs, _mutated(inputs, seed, kinds), metric, allocation
+                            )
+
+
+class VersionDiffViewTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+        self.system = System.objects.get(id=import_config(self.client, "ethernet_office.yaml"))
+
+    def copy_version(self, version):
+        """Copy version 1 of the system to ``version``; returns the new devices by label."""
+        devices = {}
+        for device in Device.objects.filter(System=self.system, SystemVersion=1):
+            old_id = device.id
+            device.pk = None
+            device.SystemVersion = version
+            device.save()
+            devices[old_id] = device
+        for connection in Connection.objects.filter(System=self.system, SystemVersion=1):
+            connection.pk = None
+            connection.SystemVersion = version
+            connection.Source = devices[connection.Source_id]
+            connection.Target = devices[connection.Target_id]
+            connection.save()
+        for model in (TrafficProfile, FirewallRule):
+            for row in model.objects.filter(System=self.system, SystemVersion=1):
+                row.pk = None
+                row.SystemVersion = version
+                row.Device = devices[row.Device_id]
+                row.save()
+        return {device.AssetId: device for device in devices.values()}
+
+    def test_reports_the_flows_a_new_rule_blocks(self):
+        devices = self.copy_version(2)
+        FirewallRule.objects.create(System=self.system, SystemVersion=2, Device=devices["core-sw1"], Action="deny")
+        response = self.client.post(
+            "/api/v1/simulate/diff/", {"system_id": self.system.id, "from_version": 1, "to_version": 2}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertEqual((report["from_version"], report["to_version"], report["incremental"]), (1, 2, True))
+        changed = report["flows"]["changed"]
+        self.assertTrue(changed)
+        self.assertEqual(report["summary"]["flows_lost"], len(changed))
+        self.assertEqual({change["after"]["blocked_by"] for change in changed}, {"core-sw1"})
+
+        response = self.client.post(
+            "/api/v1/simulate/", {"system_id": self.system.id, "version": 2}, format="json"
+        )
+        flows = response.json()["flows"]
+        for change in changed:
+            self.assertIn(change["after"], flows)
+
+    def test_identical_versions_have_no_changes(self):
+        self.copy_version(2)
+        response = self.client.post(
+            "/api/v1/simulate/diff/", {"system_id": self.system.id, "from_version": 1, "to_version": 2}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.json()["summary"].values()), {0})
@@ -0,0 +1,93 @@
+from django.test import SimpleTestCase, TestCase
+
+from ..models import Connection, Device, Port, System, TrafficProfile
+from ..simulation import compute_simulation
+from . import api_client, clear_simulation_caches
+from .test_simulation import _device, _link, _profile
+
+
+class VlanRoutingTests(SimpleTestCase):
+    """``a`` reaches ``d`` in two hops through ``b`` or in three through ``c`` and ``x``."""
+
+    def setUp(self):
+        self.a, self.b, self.c, self.x, self.d = (
+            _device(1, "a", "host"),
+            _device(2, "b"),
+            _device(3, "c"),
+            _device(4, "x"),
+            _device(5, "d", "host"),
+        )
+        self.short = [_link(1, self.a, self.b), _link(2, self.b, self.d)]
+        self.long = [_link(3, self.a, self.c), _link(4, self.c, self.x), _link(5, self.x, self.d)]
+
+    def paths(self, *vlans, metric="hops"):
+        """The hops of one flow ``a`` -> ``d`` per VLAN (None untagged), or its status."""
+        flows = [{"to": "d", "rate_mbps": 10, **({"vlan": vlan} if vlan is not None else {})} for vlan in vlans]
+        result = compute_simulation(
+            [self.a, self.b, self.c, self.x, self.d],
+            self.short + self.long,
+            [_profile(self.a, flows)],
+            [],
+            metric=metric,
+        )
+        return [
+            [hop["to"] for hop in flow["path"]] if flow["status"] == "ok" else flow["reason"]
+            for flow in result["flows"]
+        ]
+
+    def test_tagged_flow_avoids_links_not_allowed_for_its_vlan(self):
+        for link in self.short:
+            link.AllowedVlans = [20]
+        for metric in ("hops", "latency"):
+            with self.subTest(metric=metric):
+                self.assertEqual(
+                    self.paths(10, 20, None, metric=metric),
+                    [["c", "x", "d"], ["b", "d"], ["b", "d"]],
+                )
+
+    def test_trunk_without_a_list_carries_every_vlan(self):
+        for link in self.short + self.long:
+            link.AllowedVlans = [20]
+        self.short[0].AllowedVlans = None
+        self.short[0].IsTrunk = True
+        self.assertEqual(self.paths(20, 10), [["b", "d"], "no_path"])
+
+    def test_access_links_take_the_access_vlans_of_their_ends(self):
+        self.b.access_vlans = frozenset({20})
+        self.assertEqual(self.paths(10, 20, None), [["c", "x", "d"], ["b", "d"], ["b", "d"]])
+        # Neither end declaring any: the link carries every VLAN.
+        self.b.access_vlans = frozenset()
+        self.assertEqual(self.paths(10, 20), [["b", "d"], ["b", "d"]])
+
+    def test_untagged_flows_use_every_link(self):
+        for link in self.short + self.long:
+            link.AllowedVlans = [30]
+        self.assertEqual(self.paths(None, 10), [["b", "d"], "no_path"])
+
+
+class StoredVlanRoutingTests(TestCase):
+    def test_access_vlans_come_from_the_ports(self):
+        clear_simulation_caches()
+        user, client = api_client()
+        system = System.objects.create(Name="vlans", User=user, Version=1)
+        devices = {
+            label: Device.objects.create(System=system, AssetId=label, DeviceType=kind)
+            for label, kind in (("a", "host"), ("b", "switch"), ("c", "switch"), ("x", "switch"), ("d", "host"))
+        }
+        Port.objects.create(System=system, Device=devices["b"], Name="1", AccessVlan=20)
+        for source, target in (("a", "b"), ("b", "d"), ("a", "c"), ("c", "x"), ("x", "d")):
+            Connection.objects.create(
+                System=system, Source=devices[source], Target=devices[target], ConnectionType="ethernet"
+            )
+        TrafficProfile.objects.create(
+            System=system,
+            Device=devices["a"],
+            Name="vlans",
+            Profile={"flows": [{"to": "d", "vlan": 10}, {"to": "d", "vlan": 20}, {"to": "d"}]},
+        )
+        response = client.post("/api/v1/simulate/", {"system_id": system.id, "version": 1}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [[hop["to"] for hop in flow["path"]] for flow in response.json()["flows"]],
+            [["c", "x", "d"], ["b", "d"], ["b", "d"]],
+        )
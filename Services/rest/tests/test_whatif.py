@@ -0,0 +1,108 @@
+import copy
+import random
+
+from django.test import SimpleTestCase, TestCase
+
+from ..sim.compiled import load_system
+from ..sim.whatif import Scenario
+from ..simulation import compute_simulation
+from . import api_client, clear_simulation_caches, import_config
+from .test_simulation import _normalized, random_system
+
+
+def _failed(inputs, device, link, source, rate):
+    """``inputs`` as a stored version: ``device`` offline with its links gone,
+    ``link`` gone and every flow of ``source`` at ``rate``."""
+    devices, connections, traffic_profiles, firewall_rules = copy.deepcopy(inputs)
+    for candidate in devices:
+        if candidate.id == device.id:
+            candidate.IsOnline = False
+    connections = [
+        connection
+        for connection in connections
+        if connection.id != link.id and device.id not in (connection.Source_id, connection.Target_id)
+    ]
+    for profile in traffic_profiles:
+        if profile.Device_id == source.id:
+            for flow in profile.Profile["flows"]:
+                flow["rate_mbps"] = rate
+    return devices, connections, traffic_profiles, firewall_rules
+
+
+class ScenarioTests(SimpleTestCase):
+    def test_apply_and_reset_match_a_full_run(self):
+        for allocation in ("max_min", "sequential"):
+            for seed in range(8):
+                with self.subTest(allocation=allocation, seed=seed):
+                    inputs = random_system(seed)
+                    devices, connections, traffic_profiles, _ = inputs
+                    rnd = random.Random(seed)
+                    device, link = rnd.choice(devices[:-1]), rnd.choice(connections)
+                    source = rnd.choice(traffic_profiles).Device
+                    scenario = Scenario(load_system(*inputs), allocation=allocation)
+                    scenario.apply(
+                        [
+                            {"type": "device_down", "device": device.AssetId},
+                            {"type": "link_down", "link_id": link.id},
+                            {"type": "rate", "source": source.AssetId, "rate_mbps": 7},
+                        ]
+                    )
+
+                    current = _normalized(scenario.current.as_dict())
+                    full = _normalized(
+                        compute_simulation(*_failed(inputs, device, link, source, 7), allocation=allocation)
+                    )
+                    self.assertEqual(current["flows"], full["flows"])
+                    # Down links stay in the scenario, idle; the full run drops them.
+                    up = [record for record, down in zip(current["links"], scenario.link_down) if not down]
+                    self.assertEqual(up, full["links"])
+
+                    scenario.reset()
+                    self.assertEqual(
+                        _normalized(scenario.current.as_dict()),
+                        _normalized(compute_simulation(*inputs, allocation=allocation)),
+                    )
+
+    def test_changes_accumulate(self):
+        inputs = random_system(3)
+        devices, connections, _, _ = inputs
+        scenario = Scenario(load_system(*inputs))
+        together = Scenario(load_system(*inputs))
+        first = {"type": "link_down", "link_id": connections[5].id}
+        second = {"type": "device_down", "device": devices[4].AssetId}
+        scenario.apply([first])
+        scenario.apply([second])
+        together.apply([first, second])
+        self.assertEqual(_normalized(scenario.current.as_dict()), _normalized(together.current.as_dict()))
+        self.assertEqual(scenario.diff(), together.diff())
+
+
+class WhatIfViewTests(TestCase):
+    def setUp(self):
+        clear_simulation_caches()
+        self.user, self.client = api_client()
+        self.system_id = import_config(self.client, "ethernet_office.yaml")
+
+    def test_apply_and_undo(self):
+        response = self.client.post("/api/v1/simulate/what-if/", {"system_id": self.system_id}, format="json")
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"/api/v1/simulate/what-if/{response.json()['session_id']}/"
+
+        response = self.client.post(
+            url, {"changes": [{"type": "device_down", "device": "core-sw1"}]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        report = response.json()
+        self.assertGreater(report["rerouted_flows"], 0)
+        self.assertTrue(report["flows"])
+        self.assertTrue(all(link["down"] for link in report["links"] if "core-sw1" in (link["from"], link["to"])))
+
+        response = self.client.post(url, {"reset": True}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            {key: response.json()[key] for key in ("changes", "flows", "links")},
+            {"changes": [], "flows": [], "links": []},
+        )
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.post(url, {"changes": []}, format="json").status_code, 404)
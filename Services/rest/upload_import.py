@@ -0,0 +1,158 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from django.core.files.storage import default_storage
+
+from .jobs import JobCancelled
+from .sysml_import import read_sysml, write_sysml
+from .sysml_parser import SysMLSyntaxError
+
+
+FILE_TYPES = (
+    (".sysml", "sysml"),
+    (".csv", "csv"),
+    (".xls", "excel"),
+    (".xlsx", "excel"),
+)
+
+FILE_LABELS = {"sysml": "SysML", "csv": "CSV", "excel": "Excel"}
+
+
+def file_type(file_name):
+    for suffix, kind in FILE_TYPES:
+        if file_name.endswith(suffix):
+            return kind
+    return None
+
+
+class ProgressReader:
+    """A binary stream that reports ``progress(bytes read)`` on every read."""
+
+    def __init__(self, stream, progress):
+        self.stream = stream
+        self.progress = progress
+        self.position = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.position += len(data)
+        self.progress(self.position)
+        return data
+
+
+def parse_upload(file_name, path, progress=None):
+    """Parse one stored upload; returns its ``processing_results`` entry and
+    its ``SysMLImport`` (None unless a SysML file parsed).
+
+    Only reads ``path`` from storage, so it can run in a worker process.
+    ``progress(bytes read)`` follows the parse of a SysML file.
+    """
+    kind = file_type(file_name)
+    result = {"file_name": file_name, "type": kind or "unknown"}
+    if kind is None:
+        result.update(status="error", error="Invalid file format. Please upload a CSV, Excel, or SysML file.")
+        return result, None
+    try:
+        with default_storage.open(path, "rb") as stream:
+            if kind == "sysml":
+                parsed = read_sysml(ProgressReader(stream, progress) if progress is not None else stream)
+                result["status"] = "success"
+                return result, parsed
+            if kind == "csv":
+                df = pd.read_csv(stream, encoding="utf-8")
+            else:
+                df = pd.read_excel(stream)
+            # Process CSV/Excel data...
+            result.update(status="success", rows_processed=len(df))
+    except SysMLSyntaxError as e:
+        result.update(status="error", error=f"Error processing SysML file: {str(e)}", line=e.line, column=e.column)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        result.update(status="error", error=f"Error processing {FILE_LABELS[kind]} file: {str(e)}")
+    return result, None
+
+
+def parse_uploads(uploads, workers=0, progress=None):
+    """``parse_upload`` for every ``(file_name, path, size)``, in order.
+
+    With ``workers > 1`` files are parsed one per task in a process pool,
+    largest first, so a batch takes about as long as its largest file.
+    ``progress(fraction)`` follows the bytes parsed; from a pool it moves
+    as each file finishes.
+    """
+    total = sum(size for _, _, size in uploads) or 1
+    done = 0
+
+    def advance(size):
+        nonlocal done
+        done += size
+        if progress is not None:
+            progress(min(done / total, 1.0))
+
+    parseable = [upload for upload in uploads if file_type(upload[0]) is not None]
+    if workers <= 1 or len(parseable) < 2:
+        parsed = []
+        for file_name, path, size in uploads:
+            reader_progress = None
+            if progress is not None:
+                def reader_progress(position, start=done, size=size):
+                    progress(min((start + min(position, size)) / total, 1.0))
+            parsed.append(parse_upload(file_name, path, reader_progress))
+            advance(size)
+        return parsed
+
+    parsed = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(parseable))) as executor:
+        futures = {
+            executor.submit(parse_upload, file_name, path): (path, size)
+            for file_name, path, size in sorted(parseable, key=lambda upload: -upload[2])
+        }
+        for future in as_completed(futures):
+            path, size = futures[future]
+            parsed[path] = future.result()
+            advance(size)
+    results = []
+    for file_name, path, size in uploads:
+        if path not in parsed:
+            parsed[path] = parse_upload(file_name, path)
+            advance(size)
+        results.append(parsed[path])
+    return results
+
+
+def write_uploads(parsed, system, version, progress=None):
+    """Write the SysML files among ``parse_uploads`` results into ``system``.
+
+    Returns the ``processing_results`` entries and the node and edge totals.
+    Every SysML file that parsed is written in a single transaction; if that
+    write fails, all of them are reported as errors and nothing is kept.
+    """
+    results = [result for result, _ in parsed]
+    imports = [(result, sysml) for result, sysml in parsed if sysml is not None]
+    if not imports:
+        return results, 0, 0
+
+    try:
+        write_sysml([sysml for _, sysml in imports], system, version, progress)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        for result, _ in imports:
+            result.update(status="error", error=f"Error processing SysML file: {str(e)}")
+        return results, 0, 0
+    for result, sysml in imports:
+        result.update(sysml.summary())
+    total_nodes = sum(len(sysml.devices) for _, sysml in imports)
+    total_edges = sum(len(sysml.connections) for _, sysml in imports)
+    return results, total_nodes, total_edges
+
+
+def import_uploads(uploads, system, version, workers=0):
+    """Parse stored uploads and write their devices and connections.
+
+    ``uploads`` holds ``(file_name, storage path, size)``. Returns the
+    ``processing_results`` entries in upload order and the node and edge
+    totals (see ``write_uploads``).
+    """
+    return write_uploads(parse_uploads(uploads, workers), system, version)
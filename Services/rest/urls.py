@@ -6,9 +6,25 @@ from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 urlpatterns = [
     path('devices/', views.DeviceListCreate.as_view(), name='device-list-create'),
     path('upload/', views.FileUploadView.as_view(), name='upload_file'),
+    path('upload/chunked/', views.ChunkedUploadListView.as_view(), name='upload-chunked'),
+    path('upload/chunked/<str:uploadId>/', views.ChunkedUploadView.as_view(), name='upload-chunked-detail'),
+    path('upload/chunked/<str:uploadId>/chunks/<int:index>/', views.ChunkedUploadChunkView.as_view(), name='upload-chunk'),
     path('get-devices/', views.GetAllDevices.as_view(), name='get_devices'),
     path('config/import/', views.ConfigImportView.as_view(), name='config-import'),
+    path('import/jobs/', views.ImportJobListView.as_view(), name='import-jobs'),
+    path('import/jobs/<str:jobId>/', views.ImportJobView.as_view(), name='import-job'),
+    path('import/jobs/<str:jobId>/result/', views.ImportJobResultView.as_view(), name='import-job-result'),
+    path('import/jobs/<str:jobId>/events/', views.ImportJobEventsView.as_view(), name='import-job-events'),
     path('simulate/', views.SimulationView.as_view(), name='simulate'),
+    path('simulate/jobs/', views.SimulationJobListView.as_view(), name='simulate-jobs'),
+    path('simulate/jobs/<str:jobId>/', views.SimulationJobView.as_view(), name='simulate-job'),
+    path('simulate/jobs/<str:jobId>/result/', views.SimulationJobResultView.as_view(), name='simulate-job-result'),
+    path('simulate/jobs/<str:jobId>/events/', views.SimulationJobEventsView.as_view(), name='simulate-job-events'),
+    path('simulate/components/', views.ComponentsView.as_view(), name='simulate-components'),
+    path('simulate/diff/', views.VersionDiffView.as_view(), name='simulate-diff'),
+    path('simulate/contingency/', views.ContingencyView.as_view(), name='simulate-contingency'),
+    path('simulate/what-if/', views.WhatIfView.as_view(), name='simulate-what-if'),
+    path('simulate/what-if/<str:sessionId>/', views.WhatIfSessionView.as_view(), name='simulate-what-if-session'),
     path('validate/', views.ValidateTopologyView.as_view(), name='validate'),
     path('register/', auth.RegisterView.as_view(), name='register'),
     path('login/', auth.LoginView.as_view(), name='login'),
@@ -14,8 +14,8 @@ from .serializers import (
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -24,22 +24,53 @@ from .models import (
     Device,
     System,
     Port,
-    TrafficProfile,
-    FirewallRule,
-    ConfigFile,
     TelemetrySession,
     TelemetrySample,
 )
-from .simulation import compute_simulation
+from .loader import simulation_records
+from .upload_import import import_uploads
+from .config_import import import_config
+from .chunked_upload import (
+    UploadError,
+    create_upload,
+    delete_upload,
+    get_upload,
+    purge_uploads,
+    touch_upload,
+    upload_record,
+    write_chunk,
+)
+from .import_jobs import IMPORT_MODES, active_uploads, run_import_job
+from .jobs import ACTIVE_STATES, JobLimitError, JobQueue, job_record, make_job_store
+from .simulation import (
+    ALLOCATIONS,
+    ELEMENT_TYPES,
+    ROUTING_METRICS,
+    NO_DIAGNOSTICS,
+    SIMULATION_MODES,
+    Diagnostics,
+    close_what_if,
+    compute_contingency,
+    compute_components,
+    compute_mode,
+    compute_version_diff,
+    get_what_if,
+    invalidate_simulation_cache,
+    make_result_store,
+    open_what_if,
+    simulation_cache_key,
+    simulation_ndjson,
+    simulation_payload,
+)
 from rest_framework.permissions import IsAuthenticated
+from contextlib import nullcontext
 from functools import wraps
+from django.db import connection as db_connection
 from django.http import HttpResponse, StreamingHttpResponse
 import json
 import csv
 import io
-import yaml
 import re
-import pandas as pd
 from django.contrib.auth.models import User
 # import time
 from rest_framework import viewsets
@@ -114,6 +145,7 @@ class DeleteSystemView(APIView):
             # Fetch the System for the given userId and systemId
             system = System.objects.get(id=systemId, User_id=user_id)
             system.delete()  # Cascades to Devices and Connections
+            invalidate_simulation_cache(systemId)
             return Response(
                 {"message": "System and associated devices/connections deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT
@@ -170,92 +202,39 @@ class FileUploadView(APIView):
                 return Response({"error": f"Error creating system: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
 
             uploaded_files = []
-            processing_results = []
-            total_nodes = 0
-            total_edges = 0
+            uploads = []
+            save_errors = {}
 
-            for file in request.FILES.getlist('files'):
+            # Save every file first; storage copies it in chunks
+            for position, file in enumerate(request.FILES.getlist('files')):
                 try:
-                    # Save file
-                    file_path = default_storage.save(f"uploads/{file.name}", ContentFile(file.read()))
-                    uploaded_files.append({
-                        "file_name": file.name,
-                        "file_size": file.size,
-                        "file_path": file_path
-                    })
-                    
-                    # Reset file pointer for processing
-                    file.seek(0)
-                    
-                    # Process file based on type
-                    if file.name.endswith('.sysml'):
-                        try:
-                            result = self.parse_sysml_file(file, system, version or 1)
-                            if result.get('devices_created'):
-                                total_nodes += result.get('devices_created', 0)
-                            if result.get('connections_created'):
-                                total_edges += result.get('connections_created', 0)
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'sysml',
-                                'status': 'success',
-                                **result
-                            })
-                        except ValueError as e:
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'sysml',
-                                'status': 'error',
-                                'error': str(e)
-                            })
-                    elif file.name.endswith('.csv'):
-                        try:
-                            df = pd.read_csv(file, encoding="utf-8")
-                            # Process CSV data...
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'csv',
-                                'status': 'success',
-                                'rows_processed': len(df)
-                            })
-                        except Exception as e:
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'csv',
-                                'status': 'error',
-                                'error': f"Error processing CSV file: {str(e)}"
-                            })
-                    elif file.name.endswith('.xls') or file.name.endswith('.xlsx'):
-                        try:
-                            df = pd.read_excel(file)
-                            # Process Excel data...
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'excel',
-                                'status': 'success',
-                                'rows_processed': len(df)
-                            })
-                        except Exception as e:
-                            processing_results.append({
-                                'file_name': file.name,
-                                'type': 'excel',
-                                'status': 'error',
-                                'error': f"Error processing Excel file: {str(e)}"
-                            })
-                    else:
-                        processing_results.append({
-                            'file_name': file.name,
-                            'type': 'unknown',
-                            'status': 'error',
-                            'error': "Invalid file format. Please upload a CSV, Excel, or SysML file."
-                        })
+                    file_path = default_storage.save(f"uploads/{file.name}", file)
                 except Exception as e:
-                    processing_results.append({
+                    save_errors[position] = {
                         'file_name': file.name,
                         'type': 'unknown',
                         'status': 'error',
                         'error': f"Error processing file: {str(e)}"
-                    })
+                    }
+                    continue
+                uploaded_files.append({
+                    "file_name": file.name,
+                    "file_size": file.size,
+                    "file_path": file_path
+                })
+                uploads.append((position, file.name, file_path, file.size))
+
+            # Parse the saved files (in parallel with UPLOAD_WORKERS > 1),
+            # then write every SysML file in one transaction
+            results, total_nodes, total_edges = import_uploads(
+                [(file_name, file_path, size) for _, file_name, file_path, size in uploads],
+                system,
+                version or 1,
+                workers=settings.UPLOAD_WORKERS,
+            )
+            by_position = dict(save_errors)
+            by_position.update(zip((upload[0] for upload in uploads), results))
+            processing_results = [by_position[position] for position in sorted(by_position)]
 
             # Check if any files were processed successfully
             if not any(result['status'] == 'success' for result in processing_results):
@@ -271,6 +250,7 @@ class FileUploadView(APIView):
             system.EdgeCount = total_edges
             print(f"System {system.id} has {system.NodeCount} nodes and {system.EdgeCount} edges")
             system.save()
+            invalidate_simulation_cache(system.id)
 
             # end_time = time.time()
             # print(f"Time taken for file upload: {end_time - start_time} seconds")
@@ -293,195 +273,6 @@ class FileUploadView(APIView):
                 "error": f"Error processing upload: {str(e)}"
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def parse_sysml_file(self, file, system, version):
-        try:
-            # Read the file content
-            try:
-                sysml_content = file.read().decode('utf-8')
-            except UnicodeDecodeError:
-                raise ValueError("Invalid file encoding. The SysML file must be UTF-8 encoded.")
-            except Exception as e:
-                raise ValueError(f"Error reading SysML file: {str(e)}")
-            
-            # Standard fields that map directly to Device model
-            STANDARD_FIELDS = {
-                "assetIdentifier": "AssetId",
-                "manufacturer": "Manufacturer",
-                "modelNumber": "ModelNumber",
-                "assetName": "AssetName",
-                "serialNumber": "SerialNumber",
-                "comments": "Comments",
-                "assetCostAmount": "AssetCostAmount",
-                "netBookValueAmount": "NetBookValueAmount",
-                "ownership": "Ownership",
-                "inventoryDate": "InventoryDate",
-                "datePlacedInService": "DatePlacedInService",
-                "usefulLifePeriods": "UsefulLifePeriods",
-                "assetType": "AssetType",
-                "locationID": "LocationID",
-                "buildingNumber": "BuildingNumber",
-                "buildingName": "BuildingName",
-                "floor": "Floor",
-                "roomNumber": "RoomNumber",
-                "xPosition": "Xposition",
-                "yPosition": "Yposition",
-            }
-
-            # Parse device instances
-            device_pattern = r"part instance (\d+): Device\s*{([^}]*)}"
-            device_matches = re.findall(device_pattern, sysml_content)
-            
-            if not device_matches:
-                raise ValueError("No valid device definitions found in the SysML file.")
-            
-            # Store mapping of SysML ID to Django Device object
-            sysml_id_to_device = {}
-            created_devices = []
-            created_connections = []
-            
-            # Process each device
-            for sysml_id, attributes in device_matches:
-                try:
-                    device_data = {
-                        'System': system,
-                        'SystemVersion': version
-                    }
-                    additional_data = {}
-                    
-                    # Process each attribute line
-                    for line in attributes.strip().splitlines():
-                        line = line.strip()
-                        if '=' in line:
-                            try:
-                                field_name, field_value = line.split('=', 1)
-                                field_name = field_name.strip()
-                                field_value = field_value.strip().strip('";')
-                                
-                                # Convert numeric strings to proper types
-                                if field_value.replace('.', '', 1).replace('-', '', 1).isdigit():
-                                    try:
-                                        if '.' in field_value:
-                                            field_value = float(field_value)
-                                        else:
-                                            field_value = int(field_value)
-                                    except ValueError:
-                                        print(f"Warning: Could not convert value '{field_value}' to number for field '{field_name}'")
-                                        
-                                # Map to standard field if exists
-                                if field_name in STANDARD_FIELDS:
-                                    device_data[STANDARD_FIELDS[field_name]] = field_value
-                                else:
-                                    # Store non-standard fields in additional_data
-                                    additional_data[field_name] = field_value
-                            except Exception as e:
-                                print(f"Warning: Error processing line '{line}': {str(e)}")
-                                continue
-                    
-                    # Store additional data as JSON
-                    if additional_data:
-                        device_data['AdditionalAsJson'] = additional_data
-                        
-                    # Create and save the device
-                    try:
-                        device = Device.objects.create(**device_data)
-                        sysml_id_to_device[sysml_id] = device
-                        created_devices.append(device)
-                    except Exception as e:
-                        raise ValueError(f"Error creating device with ID {sysml_id}: {str(e)}")
-                        
-                except Exception as e:
-                    print(f"Error processing device {sysml_id}: {str(e)}")
-                    # Clean up any devices created so far if we encounter an error
-                    for device in created_devices:
-                        try:
-                            device.delete()
-                        except:
-                            pass
-                    raise
-            
-            # Parse connections
-            try:
-                connection_pattern = r"part instance (\d+) -> (\d+)::DeviceConnection\s*{([^}]*)}"
-                connection_matches = re.findall(connection_pattern, sysml_content)
-                
-                # Process each connection
-                for source_id, target_id, attributes in connection_matches:
-                    try:
-                        if source_id not in sysml_id_to_device or target_id not in sysml_id_to_device:
-                            raise ValueError(f"Invalid connection: Device with ID {source_id if source_id not in sysml_id_to_device else target_id} not found")
-                            
-                        connection_data = {
-                            'System': system,
-                            'SystemVersion': version,
-                            'Source': sysml_id_to_device[source_id],
-                            'Target': sysml_id_to_device[target_id]
-                        }
-                        
-                        # Extract connection type
-                        connection_type_match = re.search(r'connectionType = "([^"]*)"', attributes)
-                        if connection_type_match:
-                            connection_data['ConnectionType'] = connection_type_match.group(1)
-                        else:
-                            connection_data['ConnectionType'] = 'default'  # Provide a default type if none specified
-                            
-                        # Extract connection details
-                        connection_details = {}
-                        for line in attributes.strip().splitlines():
-                            line = line.strip()
-                            if '=' in line:
-                                field_name, field_value = line.split('=', 1)
-                                field_name = field_name.strip()
-                                field_value = field_value.strip().strip('";')
-                                
-                                # Skip standard fields
-                                if field_name in ['connectionType', 'source', 'target']:
-                                    continue
-                                    
-                                # Add to connection details
-                                connection_details[field_name] = field_value
-                                
-                        if connection_details:
-                            connection_data['ConnectionDetails'] = connection_details
-
-                        # Create the connection
-                        connection = Connection.objects.create(**connection_data)
-                        created_connections.append(connection)
-                    except Exception as e:
-                        print(f"Error creating connection {source_id}->{target_id}: {str(e)}")
-                        # If connection creation fails, continue with other connections
-                        continue
-                        
-            except Exception as e:
-                # If connection parsing fails entirely, clean up devices and re-raise
-                for device in created_devices:
-                    try:
-                        device.delete()
-                    except:
-                        pass
-                raise ValueError(f"Error parsing connections: {str(e)}")
-
-            return {
-                'devices_created': len(created_devices),
-                'connections_created': len(created_connections),
-                'message': 'Successfully parsed SysML file'
-            }
-
-        except Exception as e:
-            # Clean up any created objects in case of error
-            try:
-                for device in created_devices:
-                    device.delete()
-            except:
-                pass
-            
-            try:
-                for connection in created_connections:
-                    connection.delete()
-            except:
-                pass
-                
-            raise ValueError(f"Error processing SysML file: {str(e)}")
-
 class GetAllSystems(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request, *args, **kwargs):
@@ -619,6 +410,7 @@ class SaveSystem(APIView):
             system.EdgeCount = len(created_connections)
             print(f"System {system.id} has {system.NodeCount} nodes and {system.EdgeCount} edges")
             system.save()
+            invalidate_simulation_cache(system.id, version)
 
             return Response({"message": "System saved successfully."},
                             status=status.HTTP_200_OK)
@@ -926,12 +718,6 @@ class TelemetryStreamView(APIView):
         return response
 
 
-def _parse_config_text(format_hint, raw_text):
-    if format_hint == "json":
-        return json.loads(raw_text)
-    return yaml.safe_load(raw_text)
-
-
 def _get_device_by_label(system, version, label):
     return Device.objects.filter(
         System=system,
@@ -961,133 +747,631 @@ class ConfigImportView(APIView):
             if not raw_text:
                 return Response({"error": "Config text or file is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-            config = _parse_config_text(format_hint or "yaml", raw_text)
-            system_name = config.get("system", {}).get("name") or request.data.get("name") or "Ethernet System"
-            version = config.get("system", {}).get("version") or int(request.data.get("version") or 1)
+            system = import_config(
+                raw_text,
+                format_hint or "yaml",
+                request.user,
+                name=request.data.get("name"),
+                version=request.data.get("version"),
+            )
+            invalidate_simulation_cache(system.id)
+
+            return Response({"system_id": system.id}, status=status.HTTP_201_CREATED)
+        except Exception as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+simulation_results = make_result_store(
+    settings.SIMULATION_CACHE_BACKEND,
+    settings.SIMULATION_CACHE_BYTES,
+    settings.SIMULATION_CACHE_DIR,
+)
+
+
+def _simulation_options(request):
+    """Look up the system and validate the engine options of a simulation request.
+
+    Returns ``(options, None)`` or ``(None, error_response)``.
+    """
+    system_id = request.data.get("system_id")
+    version = int(request.data.get("version") or 1)
+    if not system_id:
+        return None, Response({"error": "system_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        system = System.objects.get(id=system_id, User_id=request.user.id)
+    except System.DoesNotExist:
+        return None, Response({"error": "System not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    metric = request.data.get("routing_metric") or "hops"
+    if metric not in ROUTING_METRICS:
+        return None, Response(
+            {"error": f"routing_metric must be one of {', '.join(ROUTING_METRICS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    allocation = request.data.get("allocation") or "max_min"
+    if allocation not in ALLOCATIONS:
+        return None, Response(
+            {"error": f"allocation must be one of {', '.join(ALLOCATIONS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return {"system": system, "version": version, "metric": metric, "allocation": allocation}, None
+
+
+def _simulation_inputs(system, version):
+    # Records stay lazy: a cached compiled version never queries them.
+    return simulation_records(system, version)
+
+
+def _diagnostics(request):
+    """Diagnostics for a request that sets ``diagnostics``, else the no-op stand-in."""
+    if request.data.get("diagnostics") in (True, "true", "1", 1):
+        return Diagnostics()
+    return NO_DIAGNOSTICS
+
+
+def _counting_queries(diagnostics):
+    if not diagnostics.enabled:
+        return nullcontext()
+
+    def count(execute, sql, params, many, context):
+        diagnostics.count("queries")
+        return execute(sql, params, many, context)
+
+    return db_connection.execute_wrapper(count)
+
+
+def _mode_options(data, mode, options):
+    """Engine options of one simulation ``mode`` from a request body.
+
+    Raises ValueError (or TypeError for values of the wrong type) with a
+    message for the client.
+    """
+    metric = options["metric"]
+    allocation = options["allocation"]
+    if mode == "snapshot":
+        return {"metric": metric, "allocation": allocation}
+    if mode == "time_series":
+        return {
+            "metric": metric,
+            "step_minutes": int(data.get("step_minutes") or 1),
+            "duration_hours": int(data.get("duration_hours") or 24),
+            "include_series": data.get("include_series", True) not in (False, "false", "0"),
+        }
+    if mode == "monte_carlo":
+        trials = data.get("trials")
+        seed = data.get("seed")
+        budget = data.get("time_budget_s")
+        return {
+            "metric": metric,
+            "allocation": allocation,
+            "trials": int(trials) if trials is not None else 1000,
+            "seed": int(seed) if seed is not None else None,
+            "failure_probability": float(data.get("failure_probability") or 0),
+            "time_budget_s": float(budget) if budget is not None else 30.0,
+        }
+    if mode == "contingency":
+        elements = data.get("elements") or list(ELEMENT_TYPES)
+        if not isinstance(elements, list) or not set(elements) <= set(ELEMENT_TYPES):
+            raise ValueError(f"elements must be a list of {', '.join(ELEMENT_TYPES)}")
+        try:
+            k = int(data.get("k") or 1)
+            samples = int(data.get("samples") or 0)
+            top = int(data["top"]) if data.get("top") is not None else None
+            seed = int(data["seed"]) if data.get("seed") is not None else None
+        except (TypeError, ValueError):
+            raise ValueError("k, samples, top and seed must be integers")
+        if k < 1 or samples < 0 or (top is not None and top < 0):
+            raise ValueError("k must be positive, samples and top not negative")
+        return {
+            "metric": metric,
+            "allocation": allocation,
+            "elements": elements,
+            "k": k,
+            "samples": samples,
+            "seed": seed,
+            "top": top,
+        }
+    raise ValueError(f"mode must be one of {', '.join(SIMULATION_MODES)}")
+
 
-            system = System.objects.create(
-                Name=system_name,
-                User=request.user,
-                Version=version,
+class SimulationView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        version = options["version"]
+
+        mode = request.data.get("mode") or "snapshot"
+        if mode not in ("snapshot", "time_series", "monte_carlo"):
+            return Response(
+                {"error": "mode must be snapshot, time_series or monte_carlo"}, status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            engine_options = _mode_options(request.data, mode, options)
+        except (TypeError, ValueError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-            device_map = {}
-            for device_data in config.get("devices", []):
-                asset_id = device_data.get("id") or device_data.get("name")
-                attributes = device_data.get("attributes") or {}
-                device = Device.objects.create(
-                    System=system,
-                    SystemVersion=version,
-                    AssetId=asset_id,
-                    AssetName=device_data.get("name"),
-                    Manufacturer=device_data.get("vendor"),
-                    ModelNumber=device_data.get("model"),
-                    DeviceType=device_data.get("type", "generic"),
-                    IpAddress=device_data.get("ip") or attributes.get("ip"),
-                    IsOnline=device_data.get("online", True),
-                    AdditionalAsJson=attributes,
-                )
-                device_map[asset_id] = device
-                for idx, port in enumerate(device_data.get("ports", [])):
-                    Port.objects.create(
-                        System=system,
-                        SystemVersion=version,
-                        Device=device,
-                        Name=port.get("name", f"eth{idx}"),
-                        Index=port.get("index", idx),
-                        SpeedMbps=port.get("speed_mbps", 1000),
-                        Duplex=port.get("duplex", "full"),
-                        IsTrunk=port.get("trunk", False),
-                        AllowedVlans=port.get("allowed_vlans"),
-                        AccessVlan=port.get("access_vlan"),
-                        AdminUp=port.get("admin_up", True),
+        diagnostics = _diagnostics(request)
+        if mode != "snapshot":
+            try:
+                with _counting_queries(diagnostics), diagnostics.phase(mode):
+                    payload = compute_mode(
+                        mode,
+                        *_simulation_inputs(system, version),
+                        simulation_results,
+                        engine_options,
+                        workers=settings.SIMULATION_WORKERS,
+                        cache_key=simulation_cache_key(system, version),
                     )
-
-            for link_data in config.get("links", []):
-                src = device_map.get(link_data.get("from"))
-                dst = device_map.get(link_data.get("to"))
-                if not src or not dst:
-                    continue
-                Connection.objects.create(
-                    System=system,
-                    SystemVersion=version,
-                    Source=src,
-                    Target=dst,
-                    ConnectionType=link_data.get("type", "ethernet"),
-                    ConnectionDetails=link_data.get("details"),
-                    BandwidthMbps=link_data.get("bandwidth_mbps"),
-                    LatencyMs=link_data.get("latency_ms"),
-                    IsTrunk=link_data.get("trunk", False),
-                    AllowedVlans=link_data.get("allowed_vlans"),
-                    ErrorRate=link_data.get("error_rate"),
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            response = HttpResponse(payload, content_type="application/json", status=status.HTTP_200_OK)
+        elif request.data.get("format") == "ndjson":
+            with _counting_queries(diagnostics):
+                chunks = simulation_ndjson(
+                    *_simulation_inputs(system, version),
+                    workers=settings.SIMULATION_WORKERS,
+                    cache_key=simulation_cache_key(system, version),
+                    diagnostics=diagnostics,
+                    **engine_options,
                 )
-
-            for profile in config.get("traffic_profiles", []):
-                device = device_map.get(profile.get("device"))
-                if not device:
-                    continue
-                TrafficProfile.objects.create(
-                    System=system,
-                    SystemVersion=version,
-                    Device=device,
-                    Name=profile.get("name", "default"),
-                    Profile=profile,
+            response = StreamingHttpResponse(chunks, content_type="application/x-ndjson")
+            response["X-Accel-Buffering"] = "no"
+        else:
+            with _counting_queries(diagnostics):
+                payload, cache_hit = simulation_payload(
+                    *_simulation_inputs(system, version),
+                    simulation_results,
+                    workers=settings.SIMULATION_WORKERS,
+                    cache_key=simulation_cache_key(system, version),
+                    diagnostics=diagnostics,
+                    **engine_options,
                 )
+            # The memoized payload is already JSON; append the flag without re-rendering.
+            tail = b',"cache_hit":true' if cache_hit else b',"cache_hit":false'
+            if diagnostics.enabled:
+                tail += b',"diagnostics":' + json.dumps(diagnostics.as_dict(), separators=(",", ":")).encode()
+            response = HttpResponse(payload[:-1] + tail + b"}", content_type="application/json", status=status.HTTP_200_OK)
+        if diagnostics.enabled:
+            response["Server-Timing"] = diagnostics.server_timing()
+        return response
+
+
+class WhatIfView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        version = options["version"]
+
+        session_id, scenario = open_what_if(
+            *_simulation_inputs(system, version),
+            metric=options["metric"],
+            allocation=options["allocation"],
+            owner=request.user.id,
+            cache_key=simulation_cache_key(system, version),
+        )
+        return Response(
+            {
+                "session_id": session_id,
+                "flows": len(scenario.flows),
+                "links": scenario.topology.n_links,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
-            for rule in config.get("firewall_rules", []):
-                device = device_map.get(rule.get("device"))
-                if not device:
-                    continue
-                FirewallRule.objects.create(
-                    System=system,
-                    SystemVersion=version,
-                    Device=device,
-                    Action=rule.get("action", "allow"),
-                    Protocol=rule.get("protocol"),
-                    Src=rule.get("src"),
-                    Dst=rule.get("dst"),
-                    SrcPort=rule.get("src_port"),
-                    DstPort=rule.get("dst_port"),
-                    Vlan=rule.get("vlan"),
-                )
 
-            ConfigFile.objects.create(
-                System=system,
-                Name=system_name,
-                Format=format_hint or "yaml",
-                RawText=raw_text,
-                ParsedData=config,
+class WhatIfSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def _scenario(self, request, sessionId):
+        scenario = get_what_if(sessionId)
+        if scenario is None or scenario.owner != request.user.id:
+            return None
+        return scenario
+
+    def post(self, request, sessionId, *args, **kwargs):
+        scenario = self._scenario(request, sessionId)
+        if scenario is None:
+            return Response({"error": "What-if session not found"}, status=status.HTTP_404_NOT_FOUND)
+        changes = request.data.get("changes") or []
+        if not isinstance(changes, list) or not all(isinstance(change, dict) for change in changes):
+            return Response({"error": "changes must be a list of objects"}, status=status.HTTP_400_BAD_REQUEST)
+
+        with scenario.lock:
+            if request.data.get("reset"):
+                scenario.reset()
+            try:
+                rerouted, reallocated = scenario.apply(changes)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            result = scenario.diff()
+        result["rerouted_flows"] = rerouted
+        result["reallocated_flows"] = reallocated
+        return Response(result, status=status.HTTP_200_OK)
+
+    def delete(self, request, sessionId, *args, **kwargs):
+        if self._scenario(request, sessionId) is None:
+            return Response({"error": "What-if session not found"}, status=status.HTTP_404_NOT_FOUND)
+        close_what_if(sessionId)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ContingencyView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        version = options["version"]
+        try:
+            engine_options = _mode_options(request.data, "contingency", options)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = compute_contingency(
+            *_simulation_inputs(system, version),
+            workers=settings.SIMULATION_WORKERS,
+            cache_key=simulation_cache_key(system, version),
+            **engine_options,
+        )
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ComponentsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        version = options["version"]
+        try:
+            top = int(request.data.get("top", 20))
+        except (TypeError, ValueError):
+            return Response({"error": "top must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if top < 0:
+            return Response({"error": "top must not be negative"}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = compute_components(
+            *_simulation_inputs(system, version), top=top, cache_key=simulation_cache_key(system, version)
+        )
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class VersionDiffView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        try:
+            to_version = int(request.data.get("to_version") or system.Version or 1)
+            from_version = int(request.data.get("from_version") or to_version - 1)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "from_version and to_version must be integers"}, status=status.HTTP_400_BAD_REQUEST
             )
+        if from_version == to_version:
+            return Response({"error": "from_version and to_version must differ"}, status=status.HTTP_400_BAD_REQUEST)
+        for version in (from_version, to_version):
+            if not Device.objects.filter(System=system, SystemVersion=version).exists():
+                return Response({"error": f"Version {version} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        report = compute_version_diff(
+            _simulation_inputs(system, from_version),
+            _simulation_inputs(system, to_version),
+            metric=options["metric"],
+            allocation=options["allocation"],
+            workers=settings.SIMULATION_WORKERS,
+            old_key=simulation_cache_key(system, from_version),
+            cache_key=simulation_cache_key(system, to_version),
+        )
+        return Response({"from_version": from_version, "to_version": to_version, **report}, status=status.HTTP_200_OK)
+
+
+def _run_simulation_job(job, progress):
+    system = System.objects.get(id=job["system_id"])
+    return compute_mode(
+        job["mode"],
+        *_simulation_inputs(system, job["version"]),
+        simulation_results,
+        job["options"],
+        workers=settings.SIMULATION_WORKERS,
+        cache_key=simulation_cache_key(system, job["version"]),
+        progress=progress,
+    )
+
+
+simulation_jobs = JobQueue(
+    make_job_store(settings.SIMULATION_JOB_STORE),
+    _run_simulation_job,
+    workers=settings.SIMULATION_JOB_WORKERS,
+    per_user=settings.SIMULATION_JOB_USER_LIMIT,
+    max_queued=settings.SIMULATION_JOB_USER_QUEUE,
+    retention_s=settings.SIMULATION_JOB_RETENTION_S,
+    heartbeat_s=settings.SIMULATION_JOB_HEARTBEAT_S,
+    lease_s=settings.SIMULATION_JOB_LEASE_S,
+)
 
-            system.NodeCount = Device.objects.filter(System=system).count()
-            system.EdgeCount = Connection.objects.filter(System=system).count()
-            system.save()
 
-            return Response({"system_id": system.id}, status=status.HTTP_201_CREATED)
-        except Exception as exc:
+class JobListView(APIView):
+    permission_classes = [IsAuthenticated]
+    queue = None
+
+    def get(self, request, *args, **kwargs):
+        return Response([job_record(job) for job in self.queue.jobs(request.user.id)], status=status.HTTP_200_OK)
+
+
+class JobView(APIView):
+    permission_classes = [IsAuthenticated]
+    queue = None
+    label = "Job"
+
+    def get(self, request, jobId, *args, **kwargs):
+        job = self.queue.get(jobId, request.user.id)
+        if job is None:
+            return Response({"error": f"{self.label} not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_record(job), status=status.HTTP_200_OK)
+
+    def delete(self, request, jobId, *args, **kwargs):
+        """Cancel an active job, or remove a finished one."""
+        job = self.queue.get(jobId, request.user.id)
+        if job is None:
+            return Response({"error": f"{self.label} not found"}, status=status.HTTP_404_NOT_FOUND)
+        if self.queue.cancel(jobId):
+            return Response(job_record(self.queue.get(jobId, request.user.id)), status=status.HTTP_200_OK)
+        self.queue.delete(jobId)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobResultView(APIView):
+    permission_classes = [IsAuthenticated]
+    queue = None
+    label = "Job"
+
+    def get(self, request, jobId, *args, **kwargs):
+        job = self.queue.get(jobId, request.user.id)
+        if job is None:
+            return Response({"error": f"{self.label} not found"}, status=status.HTTP_404_NOT_FOUND)
+        if job["status"] != "succeeded":
+            return Response(
+                {"error": f"{self.label} has no result", "status": job["status"]},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return HttpResponse(self.queue.result(jobId), content_type="application/json", status=status.HTTP_200_OK)
+
+
+class JobEventsView(APIView):
+    queue = None
+    label = "Job"
+
+    def get(self, request, jobId, *args, **kwargs):
+        # EventSource cannot send headers, so a token query parameter works too.
+        user = _authenticate_request_from_query(request)
+        if not user and request.user.is_authenticated:
+            user = request.user
+        if not user:
+            return Response({"error": "Unauthorized."}, status=status.HTTP_401_UNAUTHORIZED)
+        if self.queue.get(jobId, user.id) is None:
+            return Response({"error": f"{self.label} not found"}, status=status.HTTP_404_NOT_FOUND)
+        queue = self.queue
+
+        def event_stream():
+            last = None
+            while True:
+                job = queue.get(jobId, user.id)
+                if job is None:
+                    return
+                state = (job["status"], job["progress"])
+                if state != last:
+                    last = state
+                    yield f"data: {json.dumps(job_record(job))}\n\n"
+                if job["status"] not in ACTIVE_STATES:
+                    return
+                time.sleep(1)
+
+        response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class SimulationJobListView(JobListView):
+    queue = simulation_jobs
+
+    def post(self, request, *args, **kwargs):
+        options, error = _simulation_options(request)
+        if error:
+            return error
+        system = options["system"]
+        version = options["version"]
+
+        mode = request.data.get("mode") or "snapshot"
+        try:
+            engine_options = _mode_options(request.data, mode, options)
+        except (TypeError, ValueError) as exc:
             return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = simulation_jobs.submit(request.user.id, system.id, version, mode, engine_options)
+        except JobLimitError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        return Response(job_record(job), status=status.HTTP_202_ACCEPTED)
 
 
-class SimulationView(APIView):
+class SimulationJobView(JobView):
+    queue = simulation_jobs
+    label = "Simulation job"
+
+
+class SimulationJobResultView(JobResultView):
+    queue = simulation_jobs
+    label = "Simulation job"
+
+
+class SimulationJobEventsView(JobEventsView):
+    queue = simulation_jobs
+    label = "Simulation job"
+
+
+class ChunkedUploadListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        system_id = request.data.get("system_id")
-        version = int(request.data.get("version") or 1)
-        if not system_id:
-            return Response({"error": "system_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        """Start a chunked upload of ``file_name`` (``size`` bytes)."""
+        purge_uploads(keep=active_uploads(import_jobs.store))
         try:
-            system = System.objects.get(id=system_id, User_id=request.user.id)
-        except System.DoesNotExist:
-            return Response({"error": "System not found"}, status=status.HTTP_404_NOT_FOUND)
+            upload = create_upload(
+                request.user.id,
+                request.data.get("file_name"),
+                request.data.get("size"),
+                request.data.get("chunk_size"),
+            )
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(upload_record(upload), status=status.HTTP_201_CREATED)
 
-        devices = Device.objects.filter(System=system, SystemVersion=version)
-        connections = Connection.objects.filter(System=system, SystemVersion=version)
-        profiles = TrafficProfile.objects.filter(System=system, SystemVersion=version)
-        rules = FirewallRule.objects.filter(System=system, SystemVersion=version)
 
-        result = compute_simulation(devices, connections, profiles, rules)
-        return Response(result, status=status.HTTP_200_OK)
+class ChunkedUploadView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, uploadId, *args, **kwargs):
+        upload = get_upload(uploadId, request.user.id)
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(upload_record(upload), status=status.HTTP_200_OK)
+
+    def delete(self, request, uploadId, *args, **kwargs):
+        upload = get_upload(uploadId, request.user.id)
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if upload["upload_id"] in active_uploads(import_jobs.store):
+            return Response({"error": "Upload is being imported"}, status=status.HTTP_409_CONFLICT)
+        delete_upload(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChunkedUploadChunkView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, uploadId, index, *args, **kwargs):
+        """Store one chunk, sent as the raw request body.
+
+        An optional ``X-Chunk-Sha256`` header is checked against the body.
+        """
+        upload = get_upload(uploadId, request.user.id)
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            record = write_chunk(upload, index, request.stream, request.headers.get("X-Chunk-Sha256"))
+        except UploadError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(record, status=status.HTTP_200_OK)
+
+
+def _run_import_job(job, progress):
+    result, system = run_import_job(job, progress, workers=settings.UPLOAD_WORKERS)
+    invalidate_simulation_cache(system.id)
+    import_jobs.store.update(job["job_id"], expect=("running",), system_id=system.id)
+    return result
+
+
+import_jobs = JobQueue(
+    make_job_store(settings.SIMULATION_JOB_STORE, "ImportJob"),
+    _run_import_job,
+    workers=settings.IMPORT_JOB_WORKERS,
+    per_user=settings.SIMULATION_JOB_USER_LIMIT,
+    max_queued=settings.SIMULATION_JOB_USER_QUEUE,
+    retention_s=settings.SIMULATION_JOB_RETENTION_S,
+    heartbeat_s=settings.SIMULATION_JOB_HEARTBEAT_S,
+    lease_s=settings.SIMULATION_JOB_LEASE_S,
+    name="import",
+)
+
+
+class ImportJobListView(JobListView):
+    queue = import_jobs
+
+    def post(self, request, *args, **kwargs):
+        """Import complete chunked uploads in the background.
+
+        ``mode`` is ``upload`` (SysML/CSV/Excel files, as ``upload/``) or
+        ``config`` (one YAML/JSON file, as ``config/import/``).
+        """
+        mode = request.data.get("mode") or "upload"
+        if mode not in IMPORT_MODES:
+            return Response(
+                {"error": f"mode must be one of {', '.join(IMPORT_MODES)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        upload_ids = request.data.get("uploads")
+        if not isinstance(upload_ids, list) or not upload_ids:
+            return Response({"error": "uploads must be a list of upload ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if mode == "config" and len(upload_ids) != 1:
+            return Response({"error": "A config import takes exactly one upload"}, status=status.HTTP_400_BAD_REQUEST)
+        name = request.data.get("name")
+        if mode == "upload" and name is None:
+            return Response({"error": "System name is required"}, status=status.HTTP_400_BAD_REQUEST)
+        version = request.data.get("version")
+        try:
+            version = int(version) if version not in (None, "") else None
+        except (TypeError, ValueError):
+            return Response({"error": "version must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One import job at a time per upload; assemble() also refuses a
+        # second one that gets past this check in another process.
+        busy = active_uploads(import_jobs.store)
+        uploads = []
+        for upload_id in upload_ids:
+            upload = get_upload(str(upload_id), request.user.id)
+            if upload is None:
+                return Response({"error": f"Upload {upload_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+            record = upload_record(upload)
+            if not record["complete"]:
+                return Response(
+                    {"error": f"Upload {upload_id} is incomplete", "missing": record["missing"]},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if record["assembling"] or upload["upload_id"] in busy:
+                return Response({"error": f"Upload {upload_id} is being imported"}, status=status.HTTP_409_CONFLICT)
+            uploads.append(upload)
+
+        options = {"uploads": [str(upload_id) for upload_id in upload_ids], "name": name, "version": version}
+        if mode == "config":
+            options["format"] = request.data.get("format")
+        try:
+            job = import_jobs.submit(request.user.id, None, version or 1, mode, options)
+        except JobLimitError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        for upload in uploads:
+            touch_upload(upload)
+        return Response(job_record(job), status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobView(JobView):
+    queue = import_jobs
+    label = "Import job"
+
+
+class ImportJobResultView(JobResultView):
+    queue = import_jobs
+    label = "Import job"
+
+
+class ImportJobEventsView(JobEventsView):
+    queue = import_jobs
+    label = "Import job"
 
 
 class ValidateTopologyView(APIView):
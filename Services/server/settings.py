@@ -190,6 +190,43 @@ STATIC_URL = 'static/'
 # In Docker we set MEDIA_ROOT=/data so files stay inside a volume.
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "uploads"))
+# Worker processes that parse the files of one upload in parallel, one file
+# each (0 or 1 parses them in the request process).
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "0"))
+# Chunked uploads: chunks of at most UPLOAD_CHUNK_BYTES (also the default)
+# are kept under MEDIA_ROOT/uploads/chunks until the file is assembled; files
+# are limited to UPLOAD_MAX_BYTES and uploads idle for UPLOAD_RETENTION_S are
+# dropped.
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+UPLOAD_RETENTION_S = int(os.getenv("UPLOAD_RETENTION_S", str(24 * 3600)))
+
+# Ethernet simulation.
+# Worker processes used to build per-source routing trees on large meshes
+# (0 or 1 keeps routing in the request process).
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", "0"))
+# Memoized simulation results: "memory" (per process) or "file" (shared
+# directory), evicted least recently used beyond SIMULATION_CACHE_BYTES.
+SIMULATION_CACHE_BACKEND = os.getenv("SIMULATION_CACHE_BACKEND", "memory")
+SIMULATION_CACHE_BYTES = int(os.getenv("SIMULATION_CACHE_BYTES", str(256 * 1024 * 1024)))
+SIMULATION_CACHE_DIR = os.getenv("SIMULATION_CACHE_DIR", str(BASE_DIR / "simulation_cache"))
+# Background simulation jobs: "database" (shared by all processes) or
+# "memory". Jobs run on SIMULATION_JOB_WORKERS threads per process, with at
+# most SIMULATION_JOB_USER_LIMIT running and SIMULATION_JOB_USER_QUEUE
+# waiting per user; finished jobs are kept for SIMULATION_JOB_RETENTION_S.
+SIMULATION_JOB_STORE = os.getenv("SIMULATION_JOB_STORE", "database")
+SIMULATION_JOB_WORKERS = int(os.getenv("SIMULATION_JOB_WORKERS", "2"))
+SIMULATION_JOB_USER_LIMIT = int(os.getenv("SIMULATION_JOB_USER_LIMIT", "1"))
+SIMULATION_JOB_USER_QUEUE = int(os.getenv("SIMULATION_JOB_USER_QUEUE", "10"))
+SIMULATION_JOB_RETENTION_S = int(os.getenv("SIMULATION_JOB_RETENTION_S", "3600"))
+# Each process refreshes the heartbeat of the jobs it runs every
+# SIMULATION_JOB_HEARTBEAT_S and picks up queued jobs; running jobs without a
+# heartbeat for SIMULATION_JOB_LEASE_S (their process died) are failed.
+SIMULATION_JOB_HEARTBEAT_S = int(os.getenv("SIMULATION_JOB_HEARTBEAT_S", "10"))
+SIMULATION_JOB_LEASE_S = int(os.getenv("SIMULATION_JOB_LEASE_S", "60"))
+# Background imports of chunked uploads run on IMPORT_JOB_WORKERS threads per
+# process and share the job store and per-user limits above.
+IMPORT_JOB_WORKERS = int(os.getenv("IMPORT_JOB_WORKERS", "1"))
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field